@@ -0,0 +1,179 @@
+"""
+Compare the HTTP/1.1 and HTTP/2 (--http2) transports against a local TLS
+server that answers every request after a fixed delay, as a slow host would.
+
+    python benchmarks/http2_benchmark.py --threads 32 --delay 0.05
+
+The server runs in a child process, so it does not compete with the client
+for the GIL. It speaks h2 or http/1.1, whichever ALPN picks, and needs the
+h2 package; the client side needs httpx[http2]. A throwaway self-signed
+certificate is made with the openssl command.
+"""
+import os
+import sys
+import ssl
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http2_transport import Http2Adapter
+
+def make_certificate(folder):
+    cert, key = os.path.join(folder, 'cert.pem'), os.path.join(folder, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+                    '-keyout', key, '-out', cert], check=True, capture_output=True)
+    return cert, key
+
+class DelayServer:
+    """asyncio TLS server sending body_size bytes delay seconds after each request"""
+    def __init__(self, cert, key, body_size, delay):
+        self.body = b'x' * body_size
+        self.delay = delay
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(cert, key)
+        self.context.set_alpn_protocols(['h2', 'http/1.1'])
+        self.loop = asyncio.new_event_loop()
+        self.port = None
+
+    def start(self):
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self.handle, '127.0.0.1', 0, ssl=self.context, backlog=512), self.loop).result()
+        self.port = server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        protocol = writer.get_extra_info('ssl_object').selected_alpn_protocol()
+        try:
+            await (self.serve_h2 if protocol == 'h2' else self.serve_h1)(reader, writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        writer.close()
+
+    async def serve_h1(self, reader, writer):
+        while True:
+            await reader.readuntil(b'\r\n\r\n')
+            await asyncio.sleep(self.delay)
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\nContent-Type: application/octet-stream\r\n\r\n'
+                         % len(self.body) + self.body)
+            await writer.drain()
+
+    async def serve_h2(self, reader, writer):
+        import h2.config
+        import h2.connection
+        import h2.events
+        import h2.exceptions
+        connection = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False))
+        connection.initiate_connection()
+        writer.write(connection.data_to_send())
+        lock = asyncio.Lock()
+        window_updated = asyncio.Event()
+
+        async def respond(stream_id):
+            await asyncio.sleep(self.delay)
+            try:
+                await send_response(stream_id)
+            except (h2.exceptions.ProtocolError, ConnectionError):
+                # The client went away before the response was due
+                pass
+
+        async def send_response(stream_id):
+            async with lock:
+                connection.send_headers(stream_id, [(':status', '200'), ('content-length', str(len(self.body))),
+                                                    ('content-type', 'application/octet-stream')])
+                remaining = self.body
+                while remaining:
+                    while connection.local_flow_control_window(stream_id) < 1:
+                        # Let the other streams go while this one waits for the client's window
+                        writer.write(connection.data_to_send())
+                        await writer.drain()
+                        lock.release()
+                        await window_updated.wait()
+                        await lock.acquire()
+                    size = min(len(remaining), connection.local_flow_control_window(stream_id),
+                               connection.max_outbound_frame_size)
+                    connection.send_data(stream_id, remaining[:size], end_stream=size == len(remaining))
+                    remaining = remaining[size:]
+                writer.write(connection.data_to_send())
+                await writer.drain()
+
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            for event in connection.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    asyncio.ensure_future(respond(event.stream_id))
+                elif isinstance(event, h2.events.WindowUpdated):
+                    window_updated.set()
+                    window_updated.clear()
+            writer.write(connection.data_to_send())
+            await writer.drain()
+
+def run(transport, url, cert, count, threads):
+    """Fetch url count times from threads threads; returns (requests per second, HTTP version)"""
+    session = requests.Session()
+    session.trust_env = False
+    session.verify = cert
+    if transport == 'h2':
+        session.mount('https://', Http2Adapter(threads))
+    else:
+        session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=threads, pool_maxsize=threads))
+
+    def fetch(n):
+        response = session.get(f'{url}/asset/{n}', timeout=30)
+        response.raise_for_status()
+        return getattr(response, 'http_version', 'HTTP/1.1')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        versions = set(executor.map(fetch, range(count)))
+    elapsed = time.perf_counter() - started
+    session.close()
+    return count / elapsed, ', '.join(sorted(versions))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the HTTP/2 transport against HTTP/1.1")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per run (default: 2000)")
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent fetchers (default: 8)")
+    parser.add_argument("--delay", type=float, default=0.02, help="Server delay per response in seconds (default: 0.02)")
+    parser.add_argument("--size", type=int, default=16384, help="Response body size in bytes (default: 16384)")
+    parser.add_argument("--rounds", type=int, default=3, help="Runs of each transport, interleaved (default: 3)")
+    parser.add_argument("--serve", nargs=2, metavar=("CERT", "KEY"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        server = DelayServer(*args.serve, args.size, args.delay)
+        server.start()
+        print(server.port, flush=True)
+        sys.stdin.read()
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        cert, key = make_certificate(folder)
+        # The server lives until its stdin closes
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', cert, key,
+                                   '--size', str(args.size), '--delay', str(args.delay)],
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        try:
+            url = f'https://127.0.0.1:{server.stdout.readline().strip()}'
+            print(f"{args.requests} requests of {args.size} bytes, {args.threads} threads, "
+                  f"{args.delay * 1000:.0f} ms server delay")
+            for _ in range(args.rounds):
+                for transport in ('h1', 'h2'):
+                    rate, version = run(transport, url, cert, args.requests, args.threads)
+                    print(f"{transport}  {version:<9} {rate:7.0f} req/s")
+        finally:
+            server.stdin.close()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
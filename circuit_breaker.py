@@ -0,0 +1,109 @@
+import time
+import logging
+import threading
+
+import requests
+
+logger = logging.getLogger('website_cloner')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request to a host whose circuit is open"""
+    def __init__(self, host, retry_after):
+        super().__init__(f"circuit open for {host}, next probe in {retry_after:.0f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+class HostCircuit:
+    def __init__(self, host):
+        self.host = host
+        self.state = CLOSED
+        self.failures = 0
+        self.open_for = 0.0
+        self.opened_at = None
+        self.probe_at = None
+        self.times_opened = 0
+        self.open_seconds = 0.0
+
+class CircuitBreaker:
+    """
+    Per-host health tracker. `failures` consecutive failed requests (network
+    errors and timeouts, 429 or 5xx) open a host's circuit: requests to it
+    fail at once with CircuitOpenError for open_seconds. After that a single
+    probe request is let through (half-open); if it succeeds the circuit
+    closes, if not it opens again for twice as long, up to max_open_seconds.
+    """
+    def __init__(self, failures=5, open_seconds=30.0, max_open_seconds=600.0):
+        self.threshold = failures
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.circuits = {}
+        self.lock = threading.Lock()
+
+    def circuit(self, host):
+        if host not in self.circuits:
+            self.circuits[host] = HostCircuit(host)
+        return self.circuits[host]
+
+    def allow(self, host):
+        """Whether a request to host may go out now; raises CircuitOpenError if not"""
+        with self.lock:
+            circuit = self.circuits.get(host)
+            if circuit is None or circuit.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if circuit.state == OPEN and now >= circuit.probe_at:
+                # Everything else waits another period while the probe finds out
+                circuit.state = HALF_OPEN
+                circuit.probe_at = now + circuit.open_for
+                logger.info("Circuit for %s half-open, probing", host)
+                return True
+            retry_after = max(circuit.probe_at - now, 0.0)
+        raise CircuitOpenError(host, retry_after)
+
+    def record(self, host, status=None):
+        """Feed the outcome of a request to host (status None for a network error or timeout)"""
+        failed = status is None or status == 429 or status >= 500
+        with self.lock:
+            circuit = self.circuit(host)
+            now = time.monotonic()
+            if not failed:
+                if circuit.state != CLOSED:
+                    circuit.open_seconds += now - circuit.opened_at
+                    logger.info("Circuit for %s closed after %.0fs", host, now - circuit.opened_at)
+                circuit.state = CLOSED
+                circuit.failures = 0
+                circuit.open_for = 0.0
+                return
+            circuit.failures += 1
+            if circuit.state == HALF_OPEN:
+                circuit.open_for = min(circuit.open_for * 2, self.max_open_seconds)
+            elif circuit.state == CLOSED and circuit.failures >= self.threshold:
+                circuit.open_for = self.open_seconds
+                circuit.opened_at = now
+                circuit.times_opened += 1
+            else:
+                return
+            circuit.state = OPEN
+            circuit.probe_at = now + circuit.open_for
+        logger.warning("Circuit for %s open after %s consecutive failures, next probe in %.0fs",
+                       host, circuit.failures, circuit.open_for)
+
+    def open_circuits(self):
+        """[(host, state, seconds open so far, seconds until the next probe)] of hosts not closed"""
+        now = time.monotonic()
+        with self.lock:
+            return [(circuit.host, circuit.state, now - circuit.opened_at, max(circuit.probe_at - now, 0.0))
+                    for circuit in self.circuits.values() if circuit.state != CLOSED]
+
+    def summary(self):
+        """[(host, times opened, seconds spent open, state)] of every host whose circuit ever opened"""
+        now = time.monotonic()
+        with self.lock:
+            return [(circuit.host, circuit.times_opened,
+                     circuit.open_seconds + (now - circuit.opened_at if circuit.state != CLOSED else 0.0),
+                     circuit.state)
+                    for circuit in self.circuits.values() if circuit.times_opened]
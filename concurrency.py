@@ -0,0 +1,149 @@
+import time
+from collections import deque
+import logging
+import threading
+
+logger = logging.getLogger('website_cloner')
+
+class HostWindow:
+    """In-flight request window of one host, resized by AdaptiveConcurrency"""
+    def __init__(self, host, limit):
+        self.host = host
+        self.limit = float(limit)
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        # (time, latency) pairs of the last baseline_window seconds, latencies increasing
+        self.recent = deque()
+        self.smoothed = None
+        self.last_decrease = 0.0
+        self.completed = 0
+        self.window_start = time.monotonic()
+        self.throughput = 0.0
+
+    @property
+    def slots(self):
+        return max(1, int(self.limit))
+
+    def baseline(self, now, latency, period):
+        """Lowest latency of the last period seconds, including this one (a sliding-window minimum)"""
+        while self.recent and self.recent[-1][1] >= latency:
+            self.recent.pop()
+        self.recent.append((now, latency))
+        while self.recent[0][0] < now - period:
+            self.recent.popleft()
+        return self.recent[0][1]
+
+class AdaptiveConcurrency:
+    """
+    AIMD controller of how many requests may be in flight to each host.
+    Every response feeds observe(): a 429, a 5xx or a network error, or a
+    smoothed time-to-headers above latency_factor times the best seen for
+    the host in the last baseline_window seconds, cuts the window by `decrease` (at most once per smoothed
+    round trip, so one burst of failures counts once); any other response
+    grows it by 1/window, i.e. by one request per window's worth of
+    successes, up to maximum. Rising latency at a constant window means
+    throughput has stopped growing with it, so the latency rule is also
+    what keeps the window at the knee of the throughput curve. Every change
+    of the whole-request window is kept in `adjustments` and logged.
+    """
+    def __init__(self, initial=2, minimum=1, maximum=8, latency_factor=2.0, decrease=0.5, smoothing=0.2,
+                 latency_floor=0.01, baseline_window=1.0):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_factor = latency_factor
+        self.decrease = decrease
+        self.smoothing = smoothing
+        # Latency growth below this many seconds is noise, not queueing
+        self.latency_floor = latency_floor
+        # The best latency is re-learnt over this many seconds, so a few fast early responses do not pin it
+        self.baseline_window = baseline_window
+        self.windows = {}
+        self.adjustments = []
+        self.lock = threading.Lock()
+
+    def window(self, host):
+        with self.lock:
+            if host not in self.windows:
+                self.windows[host] = HostWindow(host, min(self.initial, self.maximum))
+            return self.windows[host]
+
+    def acquire(self, host, blocking=True):
+        """Wait for a free slot in host's window and take it; None if blocking is False and none is free"""
+        window = self.window(host)
+        with window.condition:
+            if not blocking and window.in_flight >= window.slots:
+                return None
+            window.condition.wait_for(lambda: window.in_flight < window.slots)
+            window.in_flight += 1
+        return window
+
+    def release(self, window):
+        with window.condition:
+            window.in_flight -= 1
+            window.condition.notify_all()
+
+    def observe(self, host, latency, status=None):
+        """Feed one response (status None for a network error) and its time to headers in seconds"""
+        window = self.window(host)
+        now = time.monotonic()
+        with window.condition:
+            window.completed += 1
+            elapsed = now - window.window_start
+            if elapsed >= 1.0:
+                window.throughput = window.completed / elapsed
+                window.completed = 0
+                window.window_start = now
+
+            if status is None:
+                reason = 'network error'
+            elif status == 429 or status >= 500:
+                reason = f'HTTP {status}'
+            else:
+                reason = None
+                baseline = window.baseline(now, latency, self.baseline_window)
+                window.smoothed = latency if window.smoothed is None else (
+                    window.smoothed + self.smoothing * (latency - window.smoothed))
+                if (window.smoothed > baseline * self.latency_factor
+                        and window.smoothed - baseline > self.latency_floor):
+                    reason = 'latency'
+
+            old_slots = window.slots
+            if reason:
+                if now - window.last_decrease < max(window.smoothed or latency, 0.1):
+                    return
+                window.limit = max(self.minimum, window.limit * self.decrease)
+                window.last_decrease = now
+            else:
+                window.limit = min(self.maximum, window.limit + 1 / window.limit)
+                reason = 'increase'
+            if window.slots != old_slots:
+                self.record(window, old_slots, reason)
+            window.condition.notify_all()
+
+    def record(self, window, old_slots, reason):
+        adjustment = {
+            'time': time.time(),
+            'host': window.host,
+            'from': old_slots,
+            'to': window.slots,
+            'reason': reason,
+            'latency_ms': round((window.smoothed or 0) * 1000, 1),
+            'throughput': round(window.throughput, 1),
+        }
+        with self.lock:
+            self.adjustments.append(adjustment)
+        logger.info("Concurrency for %s: %s -> %s (%s, latency %.1f ms, %.1f req/s)", window.host,
+                    old_slots, window.slots, reason, adjustment['latency_ms'], adjustment['throughput'])
+
+    def limits(self):
+        """{host: current window} for every host seen so far"""
+        with self.lock:
+            return {host: window.slots for host, window in self.windows.items()}
+
+    def snapshot(self):
+        """[(host, window, in flight)] for the busiest hosts first"""
+        with self.lock:
+            windows = list(self.windows.values())
+        return sorted(((window.host, window.slots, window.in_flight) for window in windows),
+                      key=lambda entry: entry[2], reverse=True)
@@ -0,0 +1,122 @@
+import re
+from collections import Counter
+from urllib.parse import urlparse, parse_qsl
+
+# Segment tokens that vary between otherwise identical URLs
+HASH_PATTERN = re.compile(r'^(?:[0-9a-f]{8,}|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})$', re.I)
+TOKEN_PATTERN = re.compile(r'^(?=.*\d)(?=.*[a-zA-Z])[\w-]{20,}$')
+NUMBER_PATTERN = re.compile(r'\d+')
+
+def generalise_segment(segment):
+    """Replace the variable parts of one path segment or query value with placeholders"""
+    if HASH_PATTERN.match(segment):
+        return '{hash}'
+    if TOKEN_PATTERN.match(segment):
+        return '{token}'
+    return NUMBER_PATTERN.sub('{n}', segment)
+
+def url_template(url):
+    """
+    Shape of a URL with numbers, hashes and long tokens generalised, e.g.
+    example.com/2024/01/page-3?sort=price -> example.com/{n}/{n}/page-{n}?sort={v}.
+    Query values are dropped entirely, only the sorted parameter names remain.
+    """
+    parsed = urlparse(url)
+    path = '/'.join(generalise_segment(segment) for segment in parsed.path.split('/'))
+    template = f"{parsed.netloc}{path}"
+    names = sorted({name for name, _ in parse_qsl(parsed.query, keep_blank_values=True)})
+    if names:
+        template += '?' + '&'.join(f"{name}={{v}}" for name in names)
+    return template
+
+def has_repeating_segments(segments, max_repeats=3, longest_block=4):
+    """True when some run of up to longest_block segments repeats max_repeats times in a row (a/b/a/b/a/b)"""
+    count = len(segments)
+    for size in range(1, longest_block + 1):
+        span = size * max_repeats
+        for start in range(count - span + 1):
+            block = segments[start:start + size]
+            if all(segments[start + size * repeat:start + size * (repeat + 1)] == block
+                   for repeat in range(1, max_repeats)):
+                return True
+    return False
+
+class TrapDetector:
+    """
+    Online analysis of the URLs a crawl is about to fetch, to keep crawler
+    traps (calendars, endlessly nesting relative links, pagination and
+    session-id loops) from keeping the frontier alive forever. URLs are
+    clustered by url_template(). A URL is refused when its path repeats a
+    block of segments or when it is deeper than max_depth. A template's
+    budget of distinct URLs only applies once the template shows a trap's
+    signature: its pages lead on to new pages of the same template for
+    min_chain hops in a row (next month, next page; see note_links), or they
+    keep turning out to be duplicates (see note_duplicate), which also cuts
+    the budget to what the template has used already. A large set of
+    ordinary pages, such as products linked from listings, is never capped.
+    A budget of 0 means no per-template limit.
+    """
+    def __init__(self, budget=500, max_repeats=3, max_depth=32, duplicate_sample=20, min_chain=10):
+        self.budget = budget
+        self.max_repeats = max_repeats
+        self.max_depth = max_depth
+        self.duplicate_sample = duplicate_sample
+        self.min_chain = min_chain
+        self.admitted = Counter()
+        self.duplicates = Counter()
+        self.budgets = {}
+        self.throttled = Counter()
+        self.reasons = {}
+        # Same-template hops that led to each queued URL, and the longest chain seen per template
+        self.chains = {}
+        self.longest_chain = Counter()
+
+    def refuse(self, url, template, reason):
+        self.chains.pop(url, None)
+        self.throttled[template] += 1
+        self.reasons.setdefault(template, reason)
+        return False
+
+    def looks_like_trap(self, template):
+        return template in self.budgets or self.longest_chain[template] >= self.min_chain
+
+    def admit(self, url):
+        """Whether url should be fetched; call once per distinct URL"""
+        template = url_template(url)
+        segments = [segment for segment in urlparse(url).path.split('/') if segment]
+        if len(segments) > self.max_depth:
+            return self.refuse(url, template, 'too deep')
+        if has_repeating_segments(segments, self.max_repeats):
+            return self.refuse(url, template, 'repeating path segments')
+
+        budget = self.budgets.get(template, self.budget)
+        if budget and self.admitted[template] >= budget and self.looks_like_trap(template):
+            return self.refuse(url, template, 'mostly duplicates' if template in self.budgets else 'self-linking pattern')
+        self.admitted[template] += 1
+        return True
+
+    def note_links(self, url, links):
+        """Record the new URLs queued from the page at url, to follow chains of pages of one template"""
+        template = url_template(url)
+        chain = self.chains.pop(url, 0) + 1
+        for link in links:
+            if url_template(link) == template and chain > self.chains.get(link, 0):
+                self.chains[link] = chain
+                if chain > self.longest_chain[template]:
+                    self.longest_chain[template] = chain
+
+    def note_duplicate(self, url):
+        """Record that url duplicated an earlier page; templates that mostly do are closed"""
+        template = url_template(url)
+        self.duplicates[template] += 1
+        fetched = self.admitted[template]
+        if fetched >= self.duplicate_sample and self.duplicates[template] * 2 > fetched:
+            self.budgets[template] = fetched
+
+    def throttled_patterns(self):
+        """[(template, refused URLs, reason)] with the most refused first"""
+        return [(template, count, self.reasons[template]) for template, count in self.throttled.most_common()]
+
+    @property
+    def refused(self):
+        return sum(self.throttled.values())
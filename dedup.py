@@ -0,0 +1,157 @@
+import re
+import html
+import hashlib
+from collections import deque
+
+SIMHASH_BITS = 64
+
+# Site chrome shared by every page of a template; its text would make distinct pages look alike
+BOILERPLATE_TAGS = ('nav', 'header', 'footer', 'aside')
+BOILERPLATE_PATTERN = re.compile(r'<(' + '|'.join(BOILERPLATE_TAGS) + r')\b.*?</\1\s*>', re.S | re.I)
+# Scripts, styles and tags carry no page text for the near-duplicate signature
+MARKUP_PATTERN = re.compile(r'<script\b.*?</script\s*>|<style\b.*?</style\s*>|<!--.*?-->|<[^>]*>', re.S | re.I)
+WORD_PATTERN = re.compile(r'\w+')
+
+def visible_text(html_content):
+    """Rough text of a page's own content for fingerprinting, without building a tree"""
+    return MARKUP_PATTERN.sub(' ', BOILERPLATE_PATTERN.sub(' ', html_content))
+
+class PageFingerprint:
+    """
+    Exact hash plus SimHash signature of one page, built incrementally so it
+    can be fed while a page streams in. update() takes the markup for the
+    exact hash, add_text() the visible text outside BOILERPLATE_TAGS, whose
+    word shingles make up the SimHash. Per-bit vote counts are kept bit-sliced (one integer per binary
+    digit of the counts), so adding a shingle costs a few integer operations
+    instead of one per signature bit.
+    """
+    def __init__(self, shingle_size=3):
+        self.digest = hashlib.sha1()
+        self.window = deque(maxlen=shingle_size)
+        self.partial_word = ''
+        self.planes = []
+        self.features = 0
+
+    def update(self, markup):
+        self.digest.update(markup.encode('utf-8', errors='replace'))
+
+    def add_text(self, text):
+        text = self.partial_word + text
+        words = WORD_PATTERN.findall(text)
+        # A word running up to the end of this piece may continue in the next one
+        self.partial_word = words.pop() if words and WORD_PATTERN.match(text[-1:]) else ''
+        for word in words:
+            self.add_word(word)
+
+    def add_word(self, word):
+        self.window.append(word.lower())
+        if len(self.window) == self.window.maxlen:
+            shingle = ' '.join(self.window).encode('utf-8')
+            self.add_feature(int.from_bytes(hashlib.blake2b(shingle, digest_size=8).digest(), 'big'))
+
+    def add_feature(self, feature_hash):
+        # Ripple-carry add of feature_hash's bits into the bit-sliced counters
+        carry = feature_hash
+        for index, plane in enumerate(self.planes):
+            if not carry:
+                break
+            self.planes[index], carry = plane ^ carry, plane & carry
+        if carry:
+            self.planes.append(carry)
+        self.features += 1
+
+    def finish(self):
+        if self.partial_word:
+            self.add_word(self.partial_word)
+            self.partial_word = ''
+
+    @property
+    def exact(self):
+        return self.digest.hexdigest()
+
+    @property
+    def simhash(self):
+        """Bit b is set when more than half the shingle hashes have bit b set"""
+        self.finish()
+        signature = 0
+        for bit in range(SIMHASH_BITS):
+            ones = sum(((plane >> bit) & 1) << index for index, plane in enumerate(self.planes))
+            if ones * 2 > self.features:
+                signature |= 1 << bit
+        return signature
+
+def fingerprint_html(html_content):
+    """Fingerprint a page that is already in memory"""
+    fingerprint = PageFingerprint()
+    fingerprint.update(html_content)
+    fingerprint.add_text(visible_text(html_content))
+    return fingerprint
+
+class DuplicateIndex:
+    """
+    Remembers the fingerprint of every canonical page of a crawl and tells
+    whether a new page repeats one, exactly or within max_distance differing
+    SimHash bits. Signatures are split into max_distance + 1 bands, so any
+    near duplicate shares at least one whole band with its original and only
+    pages in matching bands are compared. Pages with fewer than min_features
+    shingles are only matched exactly; their signatures say too little.
+    """
+    def __init__(self, max_distance=3, near=True, min_features=8):
+        self.max_distance = max_distance
+        self.near = near and max_distance >= 0
+        self.min_features = min_features
+        self.band_count = max_distance + 1
+        self.band_width = SIMHASH_BITS // self.band_count
+        self.exact_pages = {}
+        self.bands = [{} for _ in range(self.band_count)]
+        self.pages = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    def band_keys(self, signature):
+        mask = (1 << self.band_width) - 1
+        return [(signature >> (band * self.band_width)) & mask for band in range(self.band_count)]
+
+    def check(self, url, fingerprint):
+        """
+        Return the URL of the page that url duplicates, or None after
+        recording url as the canonical copy of its content.
+        """
+        self.pages += 1
+        canonical_url = self.exact_pages.get(fingerprint.exact)
+        if canonical_url:
+            self.exact_duplicates += 1
+            return canonical_url
+
+        signature = fingerprint.simhash
+        if not self.near or fingerprint.features < self.min_features:
+            self.exact_pages[fingerprint.exact] = url
+            return None
+
+        keys = self.band_keys(signature)
+        for band, key in zip(self.bands, keys):
+            for candidate_signature, candidate_url in band.get(key, ()):
+                if bin(candidate_signature ^ signature).count('1') <= self.max_distance:
+                    self.near_duplicates += 1
+                    # Later exact copies of this page point straight at the original too
+                    self.exact_pages[fingerprint.exact] = candidate_url
+                    return candidate_url
+        self.exact_pages[fingerprint.exact] = url
+        for band, key in zip(self.bands, keys):
+            band.setdefault(key, []).append((signature, url))
+        return None
+
+    @property
+    def duplicates(self):
+        return self.exact_duplicates + self.near_duplicates
+
+def duplicate_reference_html(canonical_url, relative_path):
+    """Small stand-in page that points at the canonical copy of a duplicate"""
+    canonical_url = html.escape(canonical_url, quote=True)
+    relative_path = html.escape(relative_path, quote=True)
+    return (
+        '<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+        f'<link rel="canonical" href="{canonical_url}">'
+        f'<meta http-equiv="refresh" content="0; url={relative_path}">'
+        f'</head><body><a href="{relative_path}">{canonical_url}</a></body></html>\n'
+    )
@@ -0,0 +1,239 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger('website_cloner')
+
+FSYNC_POLICIES = ['never', 'file', 'batch']
+
+# Files waiting for a batched fsync that start a round before fsync_interval is up
+SYNC_BATCH_FILES = 32
+
+class WriteHandle:
+    """
+    One file being written through a WriteBehindWriter, opened with
+    WriteBehindWriter.open(). write() only buffers; full write_size buffers
+    are handed to the writer threads, and close() waits until every byte is
+    on disk (and synced, as the fsync policy says). An error of a background
+    write is raised from the next write() or close().
+    """
+    def __init__(self, writer, path, mode='wb', position=None):
+        self.writer = writer
+        self.path = path
+        flags = os.O_WRONLY | os.O_CREAT | getattr(os, 'O_BINARY', 0)
+        if mode == 'wb':
+            flags |= os.O_TRUNC
+        self.fd = os.open(path, flags, 0o666)
+        if position is None:
+            position = os.fstat(self.fd).st_size if mode == 'ab' else 0
+        self.position = position
+        self.chunks = []
+        self.buffered = 0
+        # Buffers handed over but not yet written, in file order, and whether a writer thread has them
+        self.pending = deque()
+        self.scheduled = False
+        self.outstanding = 0
+        self.synced = False
+        self.error = None
+        # Without pwrite every write has to seek this handle's file offset first
+        self.seek_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Whatever arrived before a failure stays in the file, so the download can be resumed
+        self.close(sync=exc_type is None)
+
+    def write(self, data):
+        if self.error:
+            raise self.error
+        self.chunks.append(data)
+        self.buffered += len(data)
+        if self.buffered >= self.writer.write_size:
+            self.flush()
+
+    def flush(self):
+        """Hand the buffered data to the writer threads, waiting while the writer is full"""
+        if not self.buffered:
+            return
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.buffered = 0
+        self.writer.submit(self, data, self.position)
+        self.position += len(data)
+
+    def close(self, sync=True):
+        try:
+            self.flush()
+            self.writer.wait_for(self)
+            if sync and not self.error:
+                self.writer.sync(self)
+        finally:
+            os.close(self.fd)
+        if self.error:
+            raise self.error
+
+class WriteBehindWriter:
+    """
+    Write-behind stage between the network and the disk. Fetchers write
+    into per-file buffers that are coalesced to write_size bytes and written
+    by `threads` background threads, so a slow disk does not stall network
+    reads until buffer_bytes are queued; past that, submitting fetchers wait
+    (backpressure) and the wait is counted as stall time. The threads share
+    out handles, not buffers: one handle's buffers are written by one thread
+    at a time, in order, so a file interrupted at any point holds a prefix
+    of its data without holes and its size is a safe resume offset. fsync policy:
+    'never' leaves flushing to the OS, 'file' syncs each file as it is
+    closed, 'batch' syncs the files closed during the last fsync_interval
+    seconds (or the last SYNC_BATCH_FILES files) in one round, their close()
+    calls returning together.
+    Disk time and bytes are counted here, apart from the network side.
+    """
+    def __init__(self, buffer_bytes=32 * 1024 * 1024, write_size=1024 * 1024, fsync='never', fsync_interval=0.2,
+                 threads=2):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync} (choose from {', '.join(FSYNC_POLICIES)})")
+        self.buffer_bytes = buffer_bytes
+        self.write_size = write_size
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.queue = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.pending_bytes = 0
+        self.sync_waiting = []
+        self.sync_rounds = 0
+        self.bytes_written = 0
+        self.writes = 0
+        self.busy_seconds = 0.0
+        self.fsyncs = 0
+        self.fsync_seconds = 0.0
+        self.stall_seconds = 0.0
+        self.stalls = 0
+        for number in range(max(1, threads)):
+            threading.Thread(target=self.run, name=f"disk-writer-{number}", daemon=True).start()
+        if fsync == 'batch':
+            threading.Thread(target=self.run_sync_rounds, name="disk-sync", daemon=True).start()
+
+    def open(self, path, mode='wb', position=None):
+        """
+        A WriteHandle on path: 'wb' truncates, 'ab' appends, 'r+b' writes
+        into an existing file from `position` (as the byte ranges of a
+        segmented download do, several handles per file).
+        """
+        return WriteHandle(self, path, mode, position)
+
+    def submit(self, handle, data, position):
+        with self.changed:
+            if self.pending_bytes and self.pending_bytes + len(data) > self.buffer_bytes:
+                started = time.monotonic()
+                while self.pending_bytes and self.pending_bytes + len(data) > self.buffer_bytes:
+                    self.changed.wait()
+                self.stall_seconds += time.monotonic() - started
+                self.stalls += 1
+            self.pending_bytes += len(data)
+            handle.outstanding += 1
+            handle.pending.append((data, position))
+            if handle.scheduled:
+                return
+            handle.scheduled = True
+        self.queue.put(handle)
+
+    def run(self):
+        while True:
+            handle = self.queue.get()
+            while True:
+                with self.lock:
+                    if not handle.pending:
+                        handle.scheduled = False
+                        break
+                    data, position = handle.pending.popleft()
+                started = time.monotonic()
+                error = None
+                if not handle.error:
+                    try:
+                        self.write_at(handle, data, position)
+                    except OSError as e:
+                        error = e
+                elapsed = time.monotonic() - started
+                with self.changed:
+                    self.pending_bytes -= len(data)
+                    handle.outstanding -= 1
+                    if error:
+                        handle.error = error
+                    else:
+                        self.bytes_written += len(data)
+                        self.writes += 1
+                    self.busy_seconds += elapsed
+                    self.changed.notify_all()
+
+    @staticmethod
+    def write_at(handle, data, position):
+        view = memoryview(data)
+        while view:
+            if hasattr(os, 'pwrite'):
+                written = os.pwrite(handle.fd, view, position)
+            else:
+                with handle.seek_lock:
+                    os.lseek(handle.fd, position, os.SEEK_SET)
+                    written = os.write(handle.fd, view)
+            view = view[written:]
+            position += written
+
+    def wait_for(self, handle):
+        """Block until every buffer of handle has been written"""
+        with self.changed:
+            while handle.outstanding:
+                self.changed.wait()
+
+    def sync(self, handle):
+        if self.fsync == 'file':
+            started = time.monotonic()
+            os.fsync(handle.fd)
+            with self.lock:
+                self.fsyncs += 1
+                self.fsync_seconds += time.monotonic() - started
+        elif self.fsync == 'batch':
+            with self.changed:
+                self.sync_waiting.append(handle)
+                if len(self.sync_waiting) >= SYNC_BATCH_FILES:
+                    self.changed.notify_all()
+                while not handle.synced:
+                    self.changed.wait()
+            if handle.error:
+                raise handle.error
+
+    def run_sync_rounds(self):
+        while True:
+            with self.changed:
+                deadline = time.monotonic() + self.fsync_interval
+                while len(self.sync_waiting) < SYNC_BATCH_FILES and time.monotonic() < deadline:
+                    self.changed.wait(deadline - time.monotonic())
+                handles, self.sync_waiting = self.sync_waiting, []
+            started = time.monotonic()
+            for handle in handles:
+                try:
+                    os.fsync(handle.fd)
+                except OSError as e:
+                    handle.error = e
+            elapsed = time.monotonic() - started
+            with self.changed:
+                for handle in handles:
+                    handle.synced = True
+                self.fsyncs += len(handles)
+                self.fsync_seconds += elapsed
+                self.sync_rounds += 1
+                self.changed.notify_all()
+            if handles:
+                logger.debug("Synced %s files in %.3fs", len(handles), elapsed)
+
+    def counters(self):
+        """Running totals: bytes and write calls, seconds spent writing, syncing and stalled, fsyncs and stalls"""
+        with self.lock:
+            return {'bytes_written': self.bytes_written, 'writes': self.writes, 'busy_seconds': self.busy_seconds,
+                    'fsyncs': self.fsyncs, 'sync_rounds': self.sync_rounds, 'fsync_seconds': self.fsync_seconds,
+                    'stall_seconds': self.stall_seconds, 'stalls': self.stalls}
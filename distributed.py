@@ -0,0 +1,380 @@
+import os
+import sys
+import json
+import time
+import socket
+import zlib
+import argparse
+import threading
+import subprocess
+import socketserver
+from collections import Counter
+from urllib.parse import urlparse
+
+import website_cloner as cloner
+from output_backends import OUTPUT_FORMATS, create_output, ensure_directory
+from link_graph import LinkGraph
+from crawl_traps import TrapDetector
+from dedup import DuplicateIndex
+from frontier import Frontier, SeenSet, SpillDatabase
+
+logger = cloner.logger
+
+# Module-level settings of website_cloner that the coordinator hands to every worker
+SHARED_SETTINGS = ['download_settings', 'image_settings', 'html_settings', 'dedup_settings', 'size_settings',
+                   'concurrency_settings', 'circuit_settings', 'cache_settings',
+                   'frontier_settings', 'disk_settings']
+
+# Worker counters summed into the coordinator's report
+WORKER_TOTALS = ['pages_processed', 'resources_downloaded', 'errors', 'skipped', 'downloaded_size',
+                 'duplicates_exact', 'duplicates_near', 'cache_hits', 'cache_revalidated', 'cache_bytes_saved']
+
+def partition_of(url, partitions, mode='host'):
+    """
+    Worker partition of url: by host (each host is crawled, and rate limited,
+    by one worker) or by the whole URL (spreads the pages of one site over
+    every worker, each with its own rate limit).
+    """
+    key = urlparse(url).netloc if mode == 'host' else url
+    return zlib.crc32(key.encode('utf-8')) % partitions
+
+class Coordinator:
+    """
+    Owns the shared frontier of a distributed crawl. URLs are partitioned
+    over the workers with partition_of(); every URL is admitted once, after
+    trap detection, into its partition's queue. Workers claim URLs from their
+    own partition and report the links they found. URLs claimed by a worker
+    that disconnects are queued again for whoever takes its slot. The
+    coordinator is the only writer of the merged link graph: workers send
+    their link-graph records along with their reports.
+    """
+    def __init__(self, base_url, output_folder, workers, partition='host', link_graph_path=None,
+                 min_delay=1.0, max_delay=3.0, output_format='dir', debug=False, log_format='text'):
+        self.job = {
+            'base_url': base_url,
+            'output': output_folder,
+            'workers': workers,
+            'min_delay': min_delay,
+            'max_delay': max_delay,
+            'output_format': output_format,
+            'debug': debug,
+            'log_format': log_format,
+            'settings': {name: getattr(cloner, name) for name in SHARED_SETTINGS},
+        }
+        self.workers = workers
+        self.partition = partition
+        # The partitions' queues and the seen-set share the frontier memory budget
+        memory = cloner.frontier_settings['memory']
+        self.spill = SpillDatabase(cloner.frontier_settings['spill_dir'])
+        self.queues = [Frontier(self.spill, memory // (2 * workers), queue=worker) for worker in range(workers)]
+        self.seen = SeenSet(self.spill, memory // 2)
+        self.in_flight = [set() for _ in range(workers)]
+        self.connected = set()
+        self.finished = set()
+        self.totals = Counter()
+        self.trap_detector = TrapDetector(cloner.trap_settings['budget'], cloner.trap_settings['max_repeats'],
+                                          cloner.trap_settings['max_depth'])
+        self.link_graph = LinkGraph(link_graph_path) if link_graph_path else None
+        self.lock = threading.Condition()
+        for url in cloner.seed_urls(base_url):
+            self.enqueue(url)
+
+    def enqueue(self, url):
+        """Queue url if it is new and admitted; returns whether it was queued"""
+        if not self.seen.add(url) or not self.trap_detector.admit(url):
+            return False
+        self.queues[partition_of(url, self.workers, self.partition)].push(url)
+        return True
+
+    def idle(self):
+        return not any(self.queues) and not any(self.in_flight)
+
+    def handle(self, message):
+        """Answer one worker message"""
+        op = message.get('op')
+        with self.lock:
+            if op == 'hello':
+                free = [worker for worker in range(self.workers)
+                        if worker not in self.connected and worker not in self.finished]
+                if not free:
+                    return {'error': 'no free worker slot'}
+                worker = free[0]
+                self.connected.add(worker)
+                logger.info("Worker %s connected", worker)
+                return dict(self.job, worker=worker)
+
+            worker = message['worker']
+            if op == 'claim':
+                queue = self.queues[worker]
+                urls = [queue.pop()[0] for _ in range(min(message.get('max', 1), len(queue)))]
+                self.in_flight[worker].update(urls)
+                return {'urls': urls, 'done': not urls and self.idle()}
+
+            if op == 'report':
+                for method, args in message.get('graph', []):
+                    if self.link_graph and method in ('record_page', 'record_status'):
+                        getattr(self.link_graph, method)(*args)
+                if message.get('duplicate'):
+                    self.trap_detector.note_duplicate(message['url'])
+                queued = [link for link in message.get('links', []) if self.enqueue(link)]
+                self.trap_detector.note_links(message['url'], queued)
+                self.in_flight[worker].discard(message['url'])
+                self.lock.notify_all()
+                return {'ok': True}
+
+            if op == 'bye':
+                self.totals.update(message.get('totals', {}))
+                self.connected.discard(worker)
+                self.finished.add(worker)
+                logger.info("Worker %s finished: %s", worker, message.get('totals'))
+                self.lock.notify_all()
+                return {'ok': True}
+        return {'error': f"unknown op {op}"}
+
+    def disconnected(self, worker):
+        """Requeue the URLs of a worker that went away without saying bye"""
+        with self.lock:
+            if worker in self.connected:
+                self.connected.discard(worker)
+                self.queues[worker].push_front(self.in_flight[worker])
+                logger.warning("Worker %s disconnected, requeued %s URLs", worker, len(self.in_flight[worker]))
+                self.in_flight[worker].clear()
+                self.lock.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until every worker slot has finished the crawl, or timeout; returns whether it has"""
+        with self.lock:
+            return self.lock.wait_for(lambda: len(self.finished) >= self.workers, timeout)
+
+    def close(self):
+        if self.link_graph:
+            self.link_graph.close()
+        self.spill.close()
+
+class CoordinatorHandler(socketserver.StreamRequestHandler):
+    """One worker connection: JSON request per line, JSON reply per line"""
+    def handle(self):
+        coordinator = self.server.coordinator
+        worker = None
+        try:
+            for line in self.rfile:
+                message = json.loads(line)
+                reply = coordinator.handle(message)
+                if message.get('op') == 'hello' and 'worker' in reply:
+                    worker = reply['worker']
+                self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+                if message.get('op') == 'bye':
+                    worker = None
+                    break
+        except (OSError, ValueError) as e:
+            logger.warning("Worker connection error: %s", e)
+        finally:
+            if worker is not None:
+                coordinator.disconnected(worker)
+
+class CoordinatorServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, coordinator):
+        super().__init__(address, CoordinatorHandler)
+        self.coordinator = coordinator
+
+def run_coordinator(base_url, output_folder, workers=4, listen=('127.0.0.1', 0), spawn=True, partition='host',
+                    link_graph_path=None, min_delay=1.0, max_delay=3.0, output_format='dir', debug=False,
+                    log_format='text'):
+    """
+    Serve the frontier of base_url to `workers` workers and wait for them to
+    finish. With spawn, the workers are started as local processes; otherwise
+    they are expected to connect from other machines. Returns the summed
+    worker totals.
+    """
+    cloner.setup_logging(debug=debug, log_format=log_format)
+    coordinator = Coordinator(base_url, output_folder, workers, partition, link_graph_path,
+                              min_delay, max_delay, output_format, debug, log_format)
+    server = CoordinatorServer(listen, coordinator)
+    host, port = server.server_address
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Coordinator for %s listening on %s:%s, %s workers partitioned by %s",
+                base_url, host, port, workers, partition)
+
+    def start_worker():
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__), 'worker', f"{host}:{port}"],
+                                stdout=subprocess.DEVNULL)
+
+    processes = [start_worker() for _ in range(workers)] if spawn else []
+    restarts = 0
+    started = time.time()
+    try:
+        while not coordinator.wait(1):
+            for index, process in enumerate(processes):
+                if process.poll() not in (None, 0):
+                    # A crashed worker's slot and requeued URLs go to a replacement
+                    if restarts >= workers:
+                        raise RuntimeError("Too many worker processes failed, see logs/website_cloner.worker*.log")
+                    restarts += 1
+                    logger.warning("Worker process %s exited with %s, starting a replacement", process.pid, process.returncode)
+                    processes[index] = start_worker()
+    finally:
+        server.shutdown()
+        server.server_close()
+        for process in processes:
+            process.wait()
+        coordinator.close()
+
+    totals = dict(coordinator.totals)
+    logger.info("Distributed crawl of %s finished in %.1fs: %s pages, %s resources, %s errors, %s URLs throttled as traps",
+                base_url, time.time() - started, totals.get('pages_processed', 0),
+                totals.get('resources_downloaded', 0), totals.get('errors', 0), coordinator.trap_detector.refused)
+    if link_graph_path:
+        logger.info("Merged link graph: %s", link_graph_path)
+    return totals
+
+class CoordinatorClient:
+    """Worker side of the coordinator connection"""
+    def __init__(self, address):
+        host, port = address.rsplit(':', 1)
+        self.sock = socket.create_connection((host, int(port)))
+        self.stream = self.sock.makefile('rwb')
+
+    def call(self, op, **fields):
+        self.stream.write(json.dumps(dict(fields, op=op)).encode('utf-8') + b'\n')
+        self.stream.flush()
+        line = self.stream.readline()
+        if not line:
+            raise ConnectionError("Coordinator closed the connection")
+        return json.loads(line)
+
+    def close(self):
+        self.stream.close()
+        self.sock.close()
+
+class RemoteLinkGraph:
+    """
+    Stands in for LinkGraph in a worker: records are buffered and shipped
+    to the coordinator with the next page report.
+    """
+    def __init__(self):
+        self.records = []
+
+    def record_page(self, url, links=(), assets=None, status=200, local_path=None):
+        self.records.append(('record_page', [url, list(links), assets or {}, status, local_path]))
+
+    def record_status(self, url, status, local_path=None):
+        self.records.append(('record_status', [url, status, local_path]))
+
+    def take(self):
+        records, self.records = self.records, []
+        return records
+
+def run_worker(address, batch=4):
+    """
+    Crawl URLs handed out by the coordinator at address (host:port) until it
+    reports the crawl is done. Output goes to this worker's own shard,
+    OUTPUT/shard-NN in the chosen output format.
+    """
+    client = CoordinatorClient(address)
+    job = client.call('hello')
+    if 'error' in job:
+        client.close()
+        raise RuntimeError(job['error'])
+    worker = job['worker']
+    for name, values in job['settings'].items():
+        getattr(cloner, name).update(values)
+
+    cloner.setup_logging(log_file=f"website_cloner.worker{worker}.log", debug=job['debug'],
+                         log_format=job['log_format'])
+    cloner.install_dns_cache(cloner.dns_cache)
+    cloner.scheduler.configure(per_host=cloner.concurrency_settings['max'],
+                               adaptive=cloner.concurrency_settings['adaptive'])
+    base_url = job['base_url']
+    ensure_directory(job['output'])
+    shard_folder = os.path.join(job['output'], f"shard-{worker:02d}")
+    base_folder = cloner.get_base_folder_from_url(base_url, shard_folder)
+    output = create_output(job['output_format'], shard_folder)
+    output.makedirs(base_folder)
+
+    rate_limiter = cloner.RateLimiter(min_delay=job['min_delay'], max_delay=job['max_delay'], debug=job['debug'])
+    stats = cloner.WebsiteStats()
+    live = cloner.NullLive()
+    link_graph = RemoteLinkGraph()
+    duplicate_index = None
+    if cloner.dedup_settings['mode'] != 'off':
+        duplicate_index = DuplicateIndex(cloner.dedup_settings['max_distance'],
+                                         near=cloner.dedup_settings['mode'] == 'near')
+    logger.info("Worker %s crawling %s into %s", worker, base_url, shard_folder)
+
+    try:
+        while True:
+            reply = client.call('claim', worker=worker, max=batch)
+            if reply['done']:
+                break
+            if not reply['urls']:
+                # Other partitions are still busy and may send links our way
+                time.sleep(0.2)
+                continue
+            for url in reply['urls']:
+                stats.add_url(url)
+                duplicates = duplicate_index.duplicates if duplicate_index else 0
+                new_links = cloner.crawl_page(url, base_url, base_folder, rate_limiter, stats, live, output,
+                                              link_graph, duplicate_index)
+                client.call('report', worker=worker, url=url, links=new_links, graph=link_graph.take(),
+                            duplicate=bool(duplicate_index and duplicate_index.duplicates > duplicates))
+    finally:
+        output.close()
+
+    if duplicate_index:
+        stats.duplicates_exact = duplicate_index.exact_duplicates
+        stats.duplicates_near = duplicate_index.near_duplicates
+    totals = {name: getattr(stats, name) for name in WORKER_TOTALS}
+    client.call('bye', worker=worker, totals=totals)
+    client.close()
+    logger.info("Worker %s done: %s", worker, totals)
+    return totals
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Crawl one website with several worker processes or machines.")
+    subparsers = parser.add_subparsers(dest='role', required=True)
+
+    coordinator = subparsers.add_parser('coordinator', help="Serve the frontier and merge the link graph")
+    coordinator.add_argument("url", help="The URL of the website to clone")
+    coordinator.add_argument("-o", "--output", dest="output_folder", default="cloned_website",
+                             help="Folder that receives one shard-NN output per worker")
+    coordinator.add_argument("--workers", type=int, default=4, help="Number of worker partitions (default: 4)")
+    coordinator.add_argument("--listen", default="127.0.0.1:0",
+                             help="Address to accept workers on, HOST:PORT (default: 127.0.0.1 on a free port)")
+    coordinator.add_argument("--remote-workers", action="store_true",
+                             help="Wait for workers started elsewhere instead of spawning local worker processes")
+    coordinator.add_argument("--partition", choices=["host", "url"], default="host",
+                             help="Partition the frontier by host (default) or by whole URL to spread one large "
+                                  "host, at up to --workers times its request rate")
+    coordinator.add_argument("--link-graph", metavar="PATH",
+                             help="Merged link graph file (default: OUTPUT_FOLDER.links.sqlite)")
+    coordinator.add_argument("--min-delay", type=float, default=1.0,
+                             help="Minimum delay between requests of each worker in seconds (default: 1.0)")
+    coordinator.add_argument("--max-delay", type=float, default=3.0,
+                             help="Maximum delay between requests of each worker in seconds (default: 3.0)")
+    coordinator.add_argument("--output-format", choices=OUTPUT_FORMATS, default="dir",
+                             help="Output format of each worker shard (default: dir)")
+    coordinator.add_argument("--log-format", choices=["text", "json"], default="text",
+                             help="Write the log files as plain text or JSON lines (default: text)")
+    coordinator.add_argument("--frontier-memory", type=float, default=64,
+                             help="MB of queued and seen URLs the coordinator keeps in memory (default: 64)")
+    coordinator.add_argument("--debug", action="store_true", help="Enable debug output")
+
+    worker = subparsers.add_parser('worker', help="Crawl the URLs handed out by a coordinator")
+    worker.add_argument("coordinator", help="Coordinator address, HOST:PORT")
+    worker.add_argument("--batch", type=int, default=4, help="URLs claimed per request (default: 4)")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    cloner.log_settings['console'] = True
+    args = parse_arguments()
+    if args.role == 'worker':
+        run_worker(args.coordinator, args.batch)
+    else:
+        cloner.frontier_settings['memory'] = int(args.frontier_memory * 1024 * 1024)
+        host, port = args.listen.rsplit(':', 1)
+        run_coordinator(args.url, args.output_folder, args.workers, (host, int(port)), not args.remote_workers,
+                        args.partition, args.link_graph or f"{args.output_folder}.links.sqlite",
+                        args.min_delay, args.max_delay, args.output_format, args.debug, args.log_format)
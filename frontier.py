@@ -0,0 +1,218 @@
+import os
+import math
+import sqlite3
+import hashlib
+import tempfile
+from collections import deque
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    seq INTEGER PRIMARY KEY,
+    queue INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    depth INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS frontier_by_queue ON frontier (queue, seq);
+CREATE TABLE IF NOT EXISTS seen (
+    url TEXT PRIMARY KEY
+) WITHOUT ROWID;
+"""
+
+# Rough memory cost of one in-memory URL entry (str object plus its set or deque slot) besides its characters
+ENTRY_OVERHEAD = 100
+
+def entry_size(url):
+    return len(url) + ENTRY_OVERHEAD
+
+def item_hash(item):
+    """The two 64-bit hashes every Bloom filter position of item is derived from (double hashing)"""
+    digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter, sized for capacity items at error_rate false
+    positives. Items are given as their item_hash(), so several filters can
+    share one hashing of an item.
+    """
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def add(self, hashed):
+        first, second = hashed
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            position = (first + i * second) % size
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, hashed):
+        first, second = hashed
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            position = (first + i * second) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+class ScalableBloomFilter:
+    """
+    Bloom filter that grows with its contents: once the newest filter is
+    full a twice as large one with half the error rate is added, so the
+    overall false positive rate stays below error_rate however many items
+    arrive, at 1 to 2 bytes per item for the default rate. A false positive
+    only costs the caller a lookup on disk, hence the loose default.
+    """
+    def __init__(self, initial_capacity=65536, error_rate=0.01):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.filters = []
+
+    def add(self, item, hashed=None):
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            count = len(self.filters)
+            self.filters.append(BloomFilter(self.initial_capacity * 2 ** count, self.error_rate / 2 ** (count + 1)))
+        self.filters[-1].add(hashed or item_hash(item))
+
+    def __contains__(self, item):
+        return self.contains(item)
+
+    def contains(self, item, hashed=None):
+        hashed = hashed or item_hash(item)
+        return any(hashed in bloom for bloom in self.filters)
+
+    @property
+    def nbytes(self):
+        return sum(len(bloom.bits) for bloom in self.filters)
+
+class SpillDatabase:
+    """Temporary SQLite file that frontiers and seen-sets spill to; close() deletes it"""
+    def __init__(self, directory=None):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix='website_cloner.', suffix='.frontier.sqlite', dir=directory)
+        os.close(fd)
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        # Scratch data: a crash loses the crawl anyway, so skip the journal
+        self.db.execute('PRAGMA journal_mode=OFF')
+        self.db.execute('PRAGMA synchronous=OFF')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+class SeenSet:
+    """
+    Set of URLs under a memory budget. New URLs are kept in a set in RAM
+    until it outgrows memory_budget bytes, then written to the spill
+    database in one batch. A scalable Bloom filter of every URL stays in
+    RAM, so only URLs it cannot rule out are looked up on disk.
+    Not thread-safe.
+    """
+    def __init__(self, spill, memory_budget):
+        self.spill = spill
+        self.memory_budget = memory_budget
+        self.recent = set()
+        self.recent_bytes = 0
+        self.filter = ScalableBloomFilter()
+        self.count = 0
+        self.spilled = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, url):
+        return self.contains(url, item_hash(url))
+
+    def contains(self, url, hashed):
+        if url in self.recent:
+            return True
+        if not self.spilled or not self.filter.contains(url, hashed):
+            return False
+        return self.spill.db.execute('SELECT 1 FROM seen WHERE url = ?', (url,)).fetchone() is not None
+
+    def add(self, url):
+        """Add url; returns False if it was already in the set"""
+        hashed = item_hash(url)
+        if self.contains(url, hashed):
+            return False
+        self.recent.add(url)
+        self.filter.add(url, hashed)
+        self.count += 1
+        self.recent_bytes += entry_size(url)
+        if self.recent_bytes > self.memory_budget:
+            # In key order the batch is appended to B-tree pages rather than scattered over them
+            self.spill.db.executemany('INSERT OR IGNORE INTO seen (url) VALUES (?)',
+                                      ((url,) for url in sorted(self.recent)))
+            self.spill.db.commit()
+            self.spilled += len(self.recent)
+            self.recent = set()
+            self.recent_bytes = 0
+        return True
+
+class Frontier:
+    """
+    FIFO queue of (url, depth) under a memory budget, for breadth-first
+    crawls too large to queue in RAM. Entries sit in three runs that keep
+    their order: `head` is being popped, the spill database holds the
+    middle, and `tail` takes new entries until it outgrows half the budget
+    and is written to disk. An empty head is refilled from disk in batches,
+    or takes over the tail once the disk is empty. Several frontiers can
+    share one spill database under different queue numbers. Not thread-safe.
+    """
+    def __init__(self, spill, memory_budget, queue=0):
+        self.spill = spill
+        self.memory_budget = memory_budget
+        self.queue = queue
+        self.head = deque()
+        self.tail = deque()
+        self.tail_bytes = 0
+        self.on_disk = 0
+        self.spilled = 0
+
+    def __len__(self):
+        return len(self.head) + self.on_disk + len(self.tail)
+
+    def push(self, url, depth=0):
+        self.tail.append((url, depth))
+        self.tail_bytes += entry_size(url)
+        if self.tail_bytes > self.memory_budget // 2:
+            self.spill.db.executemany('INSERT INTO frontier (queue, url, depth) VALUES (?, ?, ?)',
+                                      ((self.queue, url, depth) for url, depth in self.tail))
+            self.spill.db.commit()
+            self.on_disk += len(self.tail)
+            self.spilled += len(self.tail)
+            self.tail = deque()
+            self.tail_bytes = 0
+
+    def push_front(self, urls, depth=0):
+        """Put urls back at the head, to be popped next"""
+        self.head.extendleft((url, depth) for url in reversed(list(urls)))
+
+    def pop(self):
+        """Oldest (url, depth); raises IndexError when empty"""
+        if not self.head:
+            self.refill()
+        return self.head.popleft()
+
+    def refill(self):
+        if not self.on_disk:
+            self.head, self.tail = self.tail, deque()
+            self.tail_bytes = 0
+            return
+        # Load about half the budget's worth of entries at a time
+        batch = max(100, self.memory_budget // (2 * (ENTRY_OVERHEAD + 100)))
+        rows = self.spill.db.execute('SELECT seq, url, depth FROM frontier WHERE queue = ? ORDER BY seq LIMIT ?',
+                                     (self.queue, batch)).fetchall()
+        self.spill.db.execute('DELETE FROM frontier WHERE queue = ? AND seq <= ?', (self.queue, rows[-1][0]))
+        self.spill.db.commit()
+        self.head.extend((url, depth) for _, url, depth in rows)
+        self.on_disk -= len(rows)
@@ -0,0 +1,180 @@
+import os
+import ssl
+import threading
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import DEFAULT_CA_BUNDLE_PATH, extract_zipped_paths, get_encoding_from_headers, select_proxy
+
+def ssl_context(verify=True, cert=None):
+    """ssl.SSLContext for the verify and cert arguments of a requests call"""
+    if verify is False:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    else:
+        ca_bundle = extract_zipped_paths(DEFAULT_CA_BUNDLE_PATH) if verify is True else verify
+        if os.path.isdir(ca_bundle):
+            context = ssl.create_default_context(capath=ca_bundle)
+        else:
+            context = ssl.create_default_context(cafile=ca_bundle)
+    if cert:
+        if isinstance(cert, str):
+            context.load_cert_chain(cert)
+        else:
+            context.load_cert_chain(*cert)
+    return context
+
+class Http2Body:
+    """
+    File-like stand-in for urllib3's response object, so a requests.Response
+    backed by httpx streams and decodes exactly like the HTTP/1.1 path.
+    httpx errors while reading the body are raised as the requests
+    exceptions the urllib3 path raises for them.
+    """
+    def __init__(self, response, request=None):
+        self.response = response
+        self.request = request
+        self.iterator = None
+        self.buffer = b''
+
+    def iter_bytes(self, chunk_size=None):
+        import httpx
+        try:
+            yield from self.response.iter_bytes(chunk_size)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.ReadTimeout(e, request=self.request)
+        except httpx.RemoteProtocolError as e:
+            raise requests.exceptions.ChunkedEncodingError(e, request=self.request)
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ConnectionError(e, request=self.request)
+
+    def stream(self, chunk_size=8192, decode_content=True):
+        yield from self.iter_bytes(chunk_size)
+
+    def read(self, amt=None, decode_content=True):
+        if self.iterator is None:
+            self.iterator = self.iter_bytes()
+        while amt is None or len(self.buffer) < amt:
+            try:
+                self.buffer += next(self.iterator)
+            except StopIteration:
+                break
+        if amt is None:
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:amt], self.buffer[amt:]
+        return data
+
+    def tell(self):
+        # Bytes received on the wire, before content decoding
+        return self.response.num_bytes_downloaded
+
+    def close(self):
+        self.response.close()
+
+    def release_conn(self):
+        self.response.close()
+
+class Http2Adapter(BaseAdapter):
+    """
+    requests transport adapter that sends requests through an httpx client with
+    HTTP/2 enabled. Requests to the same host are multiplexed over one
+    connection, and servers without HTTP/2 are spoken to over HTTP/1.1 by the
+    same client. Responses are ordinary requests.Response objects, so streaming,
+    retries, redirects and stats work unchanged. Requires httpx[http2].
+    Connections opened by httpx do not go through the urllib3 DNS cache hook.
+    httpx fixes TLS settings and the proxy per client, so there is one client
+    for each combination of verify, cert and proxy that requests passes in.
+    transport replaces the network for every client (tests use httpx.MockTransport).
+    """
+    def __init__(self, max_connections=100, transport=None):
+        super().__init__()
+        try:
+            import httpx
+        except ImportError:
+            raise RuntimeError("HTTP/2 transport requires httpx with HTTP/2 support (pip install 'httpx[http2]')")
+        self.httpx = httpx
+        self.max_connections = max_connections
+        self.transport = transport
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def client_for(self, url, verify=True, cert=None, proxies=None):
+        """The httpx client for the verify, cert and proxy settings requests resolved for url"""
+        httpx = self.httpx
+        proxy = select_proxy(url, proxies) if proxies else None
+        key = (verify, tuple(cert) if isinstance(cert, (list, tuple)) else cert, proxy)
+        with self.lock:
+            if key not in self.clients:
+                # requests has already applied the environment (REQUESTS_CA_BUNDLE, HTTPS_PROXY, ...)
+                self.clients[key] = httpx.Client(
+                    http2=True,
+                    follow_redirects=False,
+                    trust_env=False,
+                    verify=ssl_context(verify, cert),
+                    proxy=proxy,
+                    transport=self.transport,
+                    limits=httpx.Limits(max_connections=self.max_connections,
+                                        max_keepalive_connections=self.max_connections),
+                )
+            return self.clients[key]
+
+    def convert_timeout(self, timeout):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return self.httpx.Timeout(read, connect=connect)
+        return self.httpx.Timeout(timeout)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        httpx = self.httpx
+        try:
+            client = self.client_for(request.url, verify, cert, proxies)
+        except (ssl.SSLError, OSError) as e:
+            # A CA bundle or client certificate that cannot be loaded
+            raise requests.exceptions.SSLError(e, request=request)
+        try:
+            http2_request = client.build_request(
+                request.method, request.url,
+                headers=list(request.headers.items()),
+                content=request.body,
+                timeout=self.convert_timeout(timeout),
+            )
+            http2_response = client.send(http2_request, stream=True)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(e, request=request)
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+
+        response = requests.Response()
+        response.status_code = http2_response.status_code
+        response.reason = http2_response.reason_phrase
+        response.headers = CaseInsensitiveDict()
+        for name, value in http2_response.headers.multi_items():
+            if name in response.headers:
+                response.headers[name] += ', ' + value
+            else:
+                response.headers[name] = value
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = Http2Body(http2_response, request)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.http_version = http2_response.http_version
+
+        if not stream:
+            response.content
+        return response
+
+    def close(self):
+        with self.lock:
+            for client in self.clients.values():
+                client.close()
+            self.clients.clear()
+
+def mount_http2(session, max_connections=100):
+    """Send every https:// request made through session over HTTP/2"""
+    adapter = Http2Adapter(max_connections)
+    session.mount('https://', adapter)
+    return adapter
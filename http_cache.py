@@ -0,0 +1,275 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit, urlunsplit
+
+logger = logging.getLogger('website_cloner')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    vary TEXT NOT NULL,
+    vary_values TEXT NOT NULL,
+    headers TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_by_url ON entries (url);
+CREATE INDEX IF NOT EXISTS entries_by_use ON entries (last_used);
+"""
+
+# Longest freshness guessed from Last-Modified when a response states none
+MAX_HEURISTIC_FRESHNESS = 24 * 3600
+
+# Response headers kept with a cached body
+STORED_HEADERS = ['Content-Type', 'ETag', 'Last-Modified', 'Cache-Control', 'Expires', 'Date', 'Age', 'Vary']
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+def default_cache_dir():
+    """$XDG_CACHE_HOME/website_cloner/http, ~/.cache/website_cloner/http without it"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'website_cloner', 'http')
+
+def normalize_url(url):
+    """Cache key form of url: lower-case scheme and host, no default port, no fragment"""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    return urlunsplit((scheme, host, parts.path or '/', parts.query, ''))
+
+def cache_directives(value):
+    """{directive: argument or None} of a Cache-Control header"""
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, argument = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+def http_date(value):
+    """Unix time of an HTTP date header, or None"""
+    try:
+        return parsedate_to_datetime(value).timestamp() if value else None
+    except (TypeError, ValueError):
+        return None
+
+def freshness_lifetime(response_headers, now):
+    """
+    Seconds a response may be served without revalidation, as a private
+    cache sees it: max-age, else Expires minus Date, else a tenth of the time
+    since Last-Modified. None when it must not be stored at all.
+    """
+    directives = cache_directives(response_headers.get('Cache-Control'))
+    if 'no-store' in directives or response_headers.get('Vary', '').strip() == '*':
+        return None
+    if 'no-cache' in directives:
+        return 0
+    if 'max-age' in directives:
+        try:
+            return max(0, int(directives['max-age']))
+        except (TypeError, ValueError):
+            return 0
+    date = http_date(response_headers.get('Date')) or now
+    expires = response_headers.get('Expires')
+    if expires:
+        # An invalid Expires (such as "0") means already expired
+        return max(0, (http_date(expires) or 0) - date)
+    last_modified = http_date(response_headers.get('Last-Modified'))
+    if last_modified:
+        return min(max(0, date - last_modified) / 10, MAX_HEURISTIC_FRESHNESS)
+    return 0
+
+class CacheEntry:
+    """A cached response: its key, headers, body file and whether it is still fresh"""
+    def __init__(self, key, url, headers, size, expires_at, body_path):
+        self.key = key
+        self.url = url
+        self.headers = headers
+        self.size = size
+        self.expires_at = expires_at
+        self.body_path = body_path
+
+    @property
+    def fresh(self):
+        return time.time() < self.expires_at
+
+    def validators(self):
+        """Conditional request headers that revalidate this entry"""
+        conditional = {}
+        if self.headers.get('ETag'):
+            conditional['If-None-Match'] = self.headers['ETag']
+        if self.headers.get('Last-Modified'):
+            conditional['If-Modified-Since'] = self.headers['Last-Modified']
+        return conditional
+
+class HttpCache:
+    """
+    On-disk HTTP cache shared by every run and output folder. Bodies are
+    files under `directory`, indexed in SQLite by normalised URL plus the
+    values of the request headers named in the response's Vary. Freshness
+    follows Cache-Control and Expires (see freshness_lifetime()); stale
+    entries with an ETag or Last-Modified are kept for revalidation with a
+    conditional request. Least recently used entries are evicted once the
+    bodies exceed max_bytes. Safe to share between threads and processes.
+    """
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.bodies = os.path.join(directory, 'bodies')
+        os.makedirs(self.bodies, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(directory, 'index.sqlite'), timeout=30, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+        self.total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        self.evictions = 0
+
+    def body_path(self, key):
+        return os.path.join(self.bodies, key[:2], key)
+
+    @staticmethod
+    def vary_key(vary, request_headers):
+        """Values of the request headers a response varies on, in Vary's order"""
+        lowered = {name.lower(): value for name, value in request_headers.items()}
+        return json.dumps([lowered.get(name.lower()) for name in vary])
+
+    @staticmethod
+    def entry_key(url, vary_values):
+        return hashlib.sha256(f"{url}\n{vary_values}".encode('utf-8')).hexdigest()
+
+    def lookup(self, url, request_headers):
+        """The stored response for url matching request_headers, fresh or stale, or None"""
+        url = normalize_url(url)
+        with self.lock:
+            rows = self.db.execute('SELECT key, vary, vary_values, headers, size, expires_at FROM entries '
+                                   'WHERE url = ?', (url,)).fetchall()
+        for key, vary, vary_values, stored_headers, size, expires_at in rows:
+            if self.vary_key(json.loads(vary), request_headers) != vary_values:
+                continue
+            body_path = self.body_path(key)
+            if not os.path.exists(body_path):
+                self.remove(key)
+                return None
+            return CacheEntry(key, url, json.loads(stored_headers), size, expires_at, body_path)
+        return None
+
+    def copy_to(self, entry, path):
+        """Copy the body of entry to path and mark it used; False if the body is gone"""
+        try:
+            shutil.copyfile(entry.body_path, path)
+        except FileNotFoundError:
+            self.remove(entry.key)
+            return False
+        with self.lock:
+            self.db.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), entry.key))
+            self.db.commit()
+        return True
+
+    def store(self, url, request_headers, response_headers, body_path):
+        """
+        Cache the complete body at body_path as the response to url, if its
+        headers allow storing it and it is worth keeping (fresh for a while
+        or revalidatable). Returns whether it was stored.
+        """
+        now = time.time()
+        lifetime = freshness_lifetime(response_headers, now)
+        if lifetime is None:
+            return False
+        kept = {name: response_headers[name] for name in STORED_HEADERS if response_headers.get(name)}
+        if not lifetime and not ('ETag' in kept or 'Last-Modified' in kept):
+            return False
+        size = os.path.getsize(body_path)
+        if size > self.max_bytes:
+            return False
+        try:
+            age = max(0, int(response_headers.get('Age') or 0))
+        except ValueError:
+            age = 0
+        url = normalize_url(url)
+        vary = [name.strip() for name in response_headers.get('Vary', '').split(',') if name.strip()]
+        vary_values = self.vary_key(vary, request_headers)
+        key = self.entry_key(url, vary_values)
+        path = self.body_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staging = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(body_path, staging)
+        os.replace(staging, path)
+        with self.lock:
+            previous = self.db.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            self.db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                            (key, url, json.dumps(vary), vary_values, json.dumps(kept), size, now - age,
+                             now - age + lifetime, now))
+            self.db.commit()
+            self.total += size - (previous[0] if previous else 0)
+            if self.total > self.max_bytes:
+                self.evict()
+        return True
+
+    def refresh(self, entry, response_headers):
+        """Update entry from the headers of a 304 Not Modified that revalidated it"""
+        headers = dict(entry.headers)
+        headers.update({name: response_headers[name] for name in STORED_HEADERS if response_headers.get(name)})
+        now = time.time()
+        lifetime = freshness_lifetime(headers, now) or 0
+        with self.lock:
+            self.db.execute('UPDATE entries SET headers = ?, stored_at = ?, expires_at = ?, last_used = ? '
+                            'WHERE key = ?', (json.dumps(headers), now, now + lifetime, now, entry.key))
+            self.db.commit()
+        entry.headers = headers
+        entry.expires_at = now + lifetime
+
+    def remove(self, key):
+        with self.lock:
+            self.delete(key)
+            self.db.commit()
+
+    def delete(self, key):
+        """Drop one entry and its body; the caller holds the lock and commits"""
+        row = self.db.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return
+        self.db.execute('DELETE FROM entries WHERE key = ?', (key,))
+        self.total -= row[0]
+        try:
+            os.remove(self.body_path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Delete least recently used entries until the bodies fit max_bytes; the caller holds the lock"""
+        # Other processes sharing the cache may have added or evicted entries meanwhile
+        self.total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        while self.total > self.max_bytes:
+            oldest = self.db.execute('SELECT key FROM entries ORDER BY last_used LIMIT 64').fetchall()
+            if not oldest:
+                break
+            for (key,) in oldest:
+                if self.total <= self.max_bytes:
+                    break
+                self.delete(key)
+                self.evictions += 1
+        self.db.commit()
+        logger.debug("HTTP cache evicted down to %s bytes (%s evictions so far)", self.total, self.evictions)
+
+    def usage(self):
+        """(bytes stored, number of entries)"""
+        with self.lock:
+            count = self.db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+            return self.total, count
+
+    def close(self):
+        with self.lock:
+            self.db.close()
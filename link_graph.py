@@ -0,0 +1,179 @@
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from collections import OrderedDict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    status INTEGER,
+    is_page INTEGER NOT NULL DEFAULT 0,
+    local_path TEXT,
+    fetched_at REAL
+);
+CREATE TABLE IF NOT EXISTS links (
+    src INTEGER NOT NULL,
+    dst INTEGER NOT NULL,
+    PRIMARY KEY (src, dst)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS assets (
+    page INTEGER NOT NULL,
+    asset INTEGER NOT NULL,
+    PRIMARY KEY (page, asset)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS links_by_dst ON links (dst);
+CREATE INDEX IF NOT EXISTS assets_by_asset ON assets (asset);
+"""
+
+# Status stored for a URL whose fetch failed without an HTTP status
+FETCH_FAILED = 0
+
+# How many URL ids are cached in memory, least recently used dropped first;
+# others are looked up in the unique index of the urls table
+ID_CACHE_SIZE = 50000
+
+class LinkGraph:
+    """
+    On-disk link graph of a crawl, kept in SQLite. Every URL gets an integer
+    id in `urls`, and each page's outgoing links and assets are stored as
+    (page id, target id) rows in `links` and `assets`, indexed both ways.
+    Recording a page replaces its previous edges, so a recrawl into the same
+    file updates the graph in place. Status is the HTTP status of the last
+    fetch, FETCH_FAILED for network errors, or NULL when never fetched.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+        self.ids = OrderedDict()
+
+    def url_id(self, url):
+        """Integer id of url, allocating one if it is new"""
+        url_id = self.ids.get(url)
+        if url_id is not None:
+            self.ids.move_to_end(url)
+            return url_id
+        self.db.execute('INSERT OR IGNORE INTO urls (url) VALUES (?)', (url,))
+        url_id = self.db.execute('SELECT id FROM urls WHERE url = ?', (url,)).fetchone()[0]
+        self.ids[url] = url_id
+        if len(self.ids) > ID_CACHE_SIZE:
+            self.ids.popitem(last=False)
+        return url_id
+
+    def record_page(self, url, links=(), assets=None, status=200, local_path=None):
+        """
+        Store a fetched page and replace its outgoing link and asset edges,
+        all in one transaction. assets maps each asset URL to its fetch status.
+        """
+        assets = assets or {}
+        now = time.time()
+        with self.lock, self.db:
+            page_id = self.url_id(url)
+            self.db.execute('UPDATE urls SET status = ?, is_page = 1, local_path = ?, fetched_at = ? WHERE id = ?',
+                            (status, local_path, now, page_id))
+            self.db.execute('DELETE FROM links WHERE src = ?', (page_id,))
+            self.db.execute('DELETE FROM assets WHERE page = ?', (page_id,))
+            self.db.executemany('INSERT OR IGNORE INTO links (src, dst) VALUES (?, ?)',
+                                [(page_id, self.url_id(link)) for link in links])
+            asset_ids = [(self.url_id(asset), asset_status) for asset, asset_status in assets.items()]
+            self.db.executemany('INSERT OR IGNORE INTO assets (page, asset) VALUES (?, ?)',
+                                [(page_id, asset_id) for asset_id, _ in asset_ids])
+            self.db.executemany('UPDATE urls SET status = ?, fetched_at = ? WHERE id = ? AND is_page = 0',
+                                [(asset_status, now, asset_id) for asset_id, asset_status in asset_ids])
+
+    def record_status(self, url, status, local_path=None):
+        """Store the outcome of fetching url (a page that failed, or an asset)"""
+        with self.lock, self.db:
+            url_id = self.url_id(url)
+            self.db.execute('UPDATE urls SET status = ?, local_path = COALESCE(?, local_path), fetched_at = ? WHERE id = ?',
+                            (status, local_path, time.time(), url_id))
+
+    def broken_links(self):
+        """(source page, target, status) for every link or asset whose fetch failed"""
+        with self.lock:
+            return self.db.execute("""
+                SELECT src.url, dst.url, dst.status FROM (
+                    SELECT src, dst FROM links UNION SELECT page, asset FROM assets
+                ) AS edge
+                JOIN urls AS src ON src.id = edge.src
+                JOIN urls AS dst ON dst.id = edge.dst
+                WHERE dst.status = ? OR dst.status >= 400
+                ORDER BY src.url, dst.url
+            """, (FETCH_FAILED,)).fetchall()
+
+    def orphans(self, seeds=()):
+        """Fetched pages that no other page links to, apart from the seeds"""
+        seeds = set(seeds)
+        with self.lock:
+            rows = self.db.execute("""
+                SELECT url FROM urls
+                WHERE is_page = 1 AND status BETWEEN 200 AND 399
+                AND NOT EXISTS (SELECT 1 FROM links WHERE dst = urls.id AND src != urls.id)
+                ORDER BY url
+            """).fetchall()
+        return [url for (url,) in rows if url not in seeds]
+
+    def affected_pages(self, changed_urls):
+        """Pages that link to or embed any of changed_urls, i.e. the pages a recrawl must redo"""
+        with self.lock:
+            ids = [row[0] for url in changed_urls
+                   for row in self.db.execute('SELECT id FROM urls WHERE url = ?', (url,))]
+            if not ids:
+                return []
+            marks = ','.join('?' * len(ids))
+            rows = self.db.execute(f"""
+                SELECT DISTINCT urls.url FROM urls JOIN (
+                    SELECT src AS page FROM links WHERE dst IN ({marks})
+                    UNION SELECT page FROM assets WHERE asset IN ({marks})
+                ) AS edge ON edge.page = urls.id ORDER BY urls.url
+            """, ids + ids).fetchall()
+        return [url for (url,) in rows]
+
+    def urls(self):
+        """(url, is_page, local_path) of every URL in the graph; local_path is only known for pages"""
+        with self.lock:
+            return self.db.execute('SELECT url, is_page, local_path FROM urls').fetchall()
+
+    def counts(self):
+        """Number of fetched pages, link edges and asset edges"""
+        with self.lock:
+            pages = self.db.execute('SELECT COUNT(*) FROM urls WHERE is_page = 1').fetchone()[0]
+            links = self.db.execute('SELECT COUNT(*) FROM links').fetchone()[0]
+            assets = self.db.execute('SELECT COUNT(*) FROM assets').fetchone()[0]
+        return pages, links, assets
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+def main():
+    """Print link-graph reports without touching the network"""
+    parser = argparse.ArgumentParser(description="Report on a link graph written by website_cloner.py")
+    parser.add_argument("graph", help="The .links.sqlite file of a crawl")
+    parser.add_argument("report", choices=["broken", "orphans", "affected"],
+                        help="broken links, orphan pages, or pages affected by changes to the given URLs")
+    parser.add_argument("urls", nargs="*", help="Seed URLs (orphans) or changed URLs (affected)")
+    args = parser.parse_args()
+
+    graph = LinkGraph(args.graph)
+    try:
+        if args.report == 'broken':
+            for source, target, status in graph.broken_links():
+                print(f"{status}\t{source}\t{target}")
+        elif args.report == 'orphans':
+            for url in graph.orphans(args.urls):
+                print(url)
+        else:
+            for url in graph.affected_pages(args.urls):
+                print(url)
+    finally:
+        graph.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import os
+import re
+import json
+import html
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, unquote
+
+# Attributes process_html() rewrites to local relative paths
+REFERENCE_ATTRS = ['href', 'src', 'data-src', 'data', 'poster', 'srcset', 'data-srcset', 'data-bg', 'style']
+ATTRIBUTE_PATTERN = re.compile(rb'[\s"\'](' + b'|'.join(re.escape(name.encode()) for name in REFERENCE_ATTRS) +
+                               rb')\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+))', re.IGNORECASE)
+# Attributes are only looked for inside tags, which skips the text in between quickly
+TAG_PATTERN = re.compile(rb'<[a-zA-Z][^>"\']*(?:(?:"[^"]*"|\'[^\']*\')[^>"\']*)*>')
+CSS_URL_PATTERN = re.compile(rb'url\(\s*[\'"]?([^\'")]*?)[\'"]?\s*\)|@import\s+[\'"]([^\'"]+)[\'"]', re.IGNORECASE)
+# A srcset URL runs up to whitespace; without trailing commas it is followed by descriptors up to a comma
+SRCSET_URL = re.compile(r'[\s,]*(\S+)')
+SRCSET_DESCRIPTORS = re.compile(r'[^,(]*(?:\([^)]*\)[^,(]*)*')
+
+HTML_EXTENSIONS = ('.html', '.htm', '.xhtml')
+CSS_EXTENSIONS = ('.css',)
+
+# Documents handed to a worker process at a time
+BATCH_SIZE = 256
+
+def reference_values(data, is_css=False):
+    """Every URL referenced from an HTML or CSS document given as bytes"""
+    if is_css:
+        for match in CSS_URL_PATTERN.finditer(data):
+            yield (match.group(1) or match.group(2)).decode('utf-8', 'replace')
+        return
+    matches = (match for tag in TAG_PATTERN.finditer(data)
+               for match in ATTRIBUTE_PATTERN.finditer(data, tag.start(), tag.end()))
+    for match in matches:
+        name = match.group(1).lower()
+        value = html.unescape(next(group for group in match.groups()[1:] if group is not None)
+                              .decode('utf-8', 'replace'))
+        if name in (b'style', b'data-bg'):
+            for css_match in CSS_URL_PATTERN.finditer(value.encode('utf-8')):
+                yield (css_match.group(1) or css_match.group(2)).decode('utf-8')
+            if name == b'data-bg' and 'url(' not in value:
+                yield value
+        elif name.endswith(b'srcset'):
+            yield from srcset_urls(value)
+        else:
+            yield value
+
+def srcset_urls(value):
+    """The candidate URLs of a srcset value, split as website_cloner.parse_srcset() does"""
+    position = 0
+    while True:
+        match = SRCSET_URL.match(value, position)
+        if not match:
+            return
+        url, position = match.group(1), match.end()
+        if url.endswith(','):
+            url = url.rstrip(',')
+        else:
+            position = SRCSET_DESCRIPTORS.match(value, position).end()
+        if url:
+            yield url
+
+def local_target(document, reference):
+    """
+    The file a relative reference in document points at, or None for
+    references that do not resolve inside the mirror (absolute URLs and
+    paths, fragments, data: and other schemes).
+    """
+    reference = reference.strip()
+    if not reference or reference.startswith(('#', '/', '{')):
+        return None
+    parts = urlsplit(reference)
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    target = os.path.normpath(os.path.join(os.path.dirname(document), parts.path))
+    if parts.path.endswith('/'):
+        target = os.path.join(target, 'index.html')
+    return target
+
+def check_documents(documents):
+    """
+    Resolve the relative references of each document against the
+    filesystem. Runs in a worker process; each directory is listed once per
+    batch rather than stat'ing every target. Returns (documents read,
+    references checked, [(missing target, document)]).
+    """
+    listings = {}
+
+    def exists(path):
+        directory, name = os.path.split(path)
+        if directory not in listings:
+            try:
+                listings[directory] = set(os.listdir(directory))
+            except OSError:
+                listings[directory] = set()
+        return name in listings[directory]
+
+    read = references = 0
+    missing = []
+    for document in documents:
+        try:
+            with open(document, 'rb') as f:
+                data = f.read()
+        except OSError:
+            continue
+        read += 1
+        for reference in reference_values(data, document.lower().endswith(CSS_EXTENSIONS)):
+            target = local_target(document, reference)
+            if target is None:
+                continue
+            references += 1
+            # Names are saved as they appear in the URL, a browser looks for the decoded form
+            if not exists(target) and not exists(unquote(target)):
+                missing.append((target, document))
+    return read, references, missing
+
+def partial_download_url(temp_path):
+    """URL of a leftover download, from the resume metadata saved next to it"""
+    try:
+        with open(temp_path + '.meta', 'r', encoding='utf-8') as f:
+            return json.load(f).get('url')
+    except (OSError, ValueError):
+        return None
+
+class MirrorReport:
+    """
+    Problems found in a saved mirror: `missing` maps each referenced but
+    absent file to [number of references, first referring document],
+    `empty` lists zero-byte files and `leftovers` the (.tmp file, URL from
+    its resume metadata) of unfinished downloads. `repaired` holds the
+    paths fixed by a refetch.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.files = 0
+        self.documents = 0
+        self.references = 0
+        self.missing = {}
+        self.empty = []
+        self.leftovers = []
+        self.repaired = set()
+
+    @property
+    def problems(self):
+        return len(self.missing) + len(self.empty) + len(self.leftovers)
+
+    def add_missing(self, target, document):
+        entry = self.missing.get(target)
+        if entry is None:
+            self.missing[target] = [1, document]
+        else:
+            entry[0] += 1
+
+    def write(self, path):
+        """Write one JSON line per problem to path"""
+        with open(path, 'w', encoding='utf-8') as report:
+            for target, (count, document) in sorted(self.missing.items()):
+                report.write(json.dumps({'problem': 'missing', 'path': target, 'references': count,
+                                         'referrer': document, 'repaired': target in self.repaired}) + '\n')
+            for path in self.empty:
+                report.write(json.dumps({'problem': 'empty', 'path': path,
+                                         'repaired': path in self.repaired}) + '\n')
+            for path, url in self.leftovers:
+                report.write(json.dumps({'problem': 'partial', 'path': path, 'url': url,
+                                         'repaired': path in self.repaired}) + '\n')
+
+def scan_mirror(root, report):
+    """The HTML and CSS documents under root; zero-byte files and .tmp leftovers go into report"""
+    documents = []
+    directories = [root]
+    while directories:
+        directory = directories.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                    continue
+                name = entry.name.lower()
+                if name.endswith('.tmp.meta'):
+                    continue
+                report.files += 1
+                if name.endswith('.tmp'):
+                    report.leftovers.append((entry.path, partial_download_url(entry.path)))
+                    continue
+                try:
+                    if entry.stat().st_size == 0:
+                        report.empty.append(entry.path)
+                        continue
+                except OSError:
+                    continue
+                if name.endswith(HTML_EXTENSIONS + CSS_EXTENSIONS):
+                    documents.append(entry.path)
+    return documents
+
+def verify_mirror(root, workers=None):
+    """
+    Check the mirror saved under root: every relative reference in its HTML
+    and CSS files must name an existing file, and no file may be empty or an
+    unfinished .tmp download. Documents are parsed in a pool of `workers`
+    processes (default: one per CPU), in batches sorted by directory so each
+    worker lists a directory once per batch. Returns a MirrorReport.
+    """
+    report = MirrorReport(root)
+    documents = scan_mirror(root, report)
+    documents.sort()
+    batches = [documents[i:i + BATCH_SIZE] for i in range(0, len(documents), BATCH_SIZE)]
+    workers = min(workers or os.cpu_count() or 1, len(batches))
+    if workers <= 1:
+        results = map(check_documents, batches)
+    else:
+        # Spawned rather than forked: the crawler's logging and display threads must not be copied mid-write
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        results = executor.map(check_documents, batches)
+    try:
+        for read, references, missing in results:
+            report.documents += read
+            report.references += references
+            for target, document in missing:
+                report.add_missing(target, document)
+    finally:
+        if workers > 1:
+            executor.shutdown()
+    report.empty.sort()
+    report.leftovers.sort()
+    return report
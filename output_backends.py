@@ -0,0 +1,405 @@
+import os
+import io
+import json
+import time
+import shutil
+import hashlib
+import threading
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+
+logger = logging.getLogger('website_cloner')
+
+# Formats accepted by create_output()
+OUTPUT_FORMATS = ['dir', 'zip', 'tar.zst', 'warc']
+
+def ensure_directory(path):
+    """Ensure directory exists with proper permissions"""
+    try:
+        # If path is a directory that already exists, just return success
+        if os.path.isdir(path):
+            return True
+
+        # If path is a file that exists, create a similar directory
+        if os.path.isfile(path):
+            # Create a directory with a modified name
+            dir_path = path + '_dir'
+            os.makedirs(dir_path, exist_ok=True)
+            os.chmod(dir_path, 0o755)
+            logger.warning("File exists at %s, created directory at %s instead", path, dir_path)
+            return True
+
+        # Normal case - create the directory
+        os.makedirs(path, exist_ok=True)
+        # Set permissions to 755 (rwxr-xr-x)
+        os.chmod(path, 0o755)
+        return True
+    except Exception as e:
+        logger.error("Failed to create directory %s: %s", path, e)
+        return False
+
+class DirectoryOutput:
+    """
+    Write the mirror as loose files under the output folder (the default).
+    Every output backend takes the local paths produced by get_resource_path().
+    Directories are created once and then remembered. When root is given, the
+    tree already under it is read with a single scandir walk, so existence
+    checks below root are answered from memory and each new file costs one open.
+    """
+    def __init__(self, root=None):
+        self.root = os.path.normpath(root) if root else None
+        self.dirs = set()
+        self.files = set()
+        self.scanned = False
+        self.syscalls = Counter()
+        self.cache_hits = 0
+        if self.root:
+            self.scan()
+
+    def scan(self):
+        """Record every file and directory under root with one scandir walk"""
+        pending = [self.root]
+        while pending:
+            directory = pending.pop()
+            self.syscalls['scandir'] += 1
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        path = os.path.join(directory, entry.name)
+                        if entry.is_dir(follow_symlinks=False):
+                            self.dirs.add(path)
+                            pending.append(path)
+                        else:
+                            self.files.add(path)
+            except FileNotFoundError:
+                continue
+            self.dirs.add(directory)
+        self.scanned = True
+
+    def is_known(self, path):
+        """True when path lies under a scanned root, so the caches are authoritative"""
+        return self.scanned and (path == self.root or path.startswith(self.root + os.sep))
+
+    def exists(self, path):
+        path = os.path.normpath(path)
+        if path in self.files or path in self.dirs:
+            self.cache_hits += 1
+            return True
+        if self.is_known(path):
+            self.cache_hits += 1
+            return False
+        self.syscalls['stat'] += 1
+        return os.path.exists(path)
+
+    def staged_exists(self, path):
+        """exists() for staging files (temp downloads and their resume metadata)"""
+        return DirectoryOutput.exists(self, path)
+
+    def isdir(self, path):
+        path = os.path.normpath(path)
+        if path in self.dirs:
+            self.cache_hits += 1
+            return True
+        if path in self.files or self.is_known(path):
+            self.cache_hits += 1
+            return False
+        self.syscalls['stat'] += 1
+        return os.path.isdir(path)
+
+    def makedirs(self, path):
+        path = os.path.normpath(path)
+        if path in self.dirs:
+            self.cache_hits += 1
+            return True
+        self.syscalls['makedirs'] += 1
+        if not ensure_directory(path):
+            return False
+        if path in self.files:
+            # ensure_directory created a sibling directory instead
+            return True
+        # The directory and all of its parents exist now
+        while path and path not in self.dirs:
+            self.dirs.add(path)
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+        return True
+
+    def note_file(self, path):
+        """Record a file written outside the backend, such as a temp download"""
+        self.files.add(os.path.normpath(path))
+
+    def forget_file(self, path):
+        self.files.discard(os.path.normpath(path))
+
+    def temp_path(self, path):
+        """Where a download for path is staged before commit()"""
+        self.makedirs(os.path.dirname(path))
+        return path + '.tmp'
+
+    def commit(self, temp_path, path, url=None, content_type=None):
+        """Move a finished download from its staging file into place"""
+        self.syscalls['replace'] += 1
+        os.replace(temp_path, path)
+        self.forget_file(temp_path)
+        self.note_file(path)
+
+    def write(self, path, data, url=None, content_type=None):
+        """Write a whole file; str data is written as UTF-8"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.syscalls['open'] += 1
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.note_file(path)
+
+    def close(self):
+        pass
+
+class ArchiveOutput(DirectoryOutput):
+    """
+    Base class for backends that append every file to a single archive.
+    Downloads are staged in one scratch folder next to the archive and then
+    appended sequentially, so no per-file directories are created. Each
+    member gets a line in <archive>.index.jsonl with its byte offset and
+    length, allowing random access without scanning the archive. The archive
+    and then the index are flushed at least every flush_interval seconds, so
+    after a crash the index only lists members that reached the file.
+    """
+    extension = ''
+    flush_interval = 5.0
+
+    def __init__(self, output_folder):
+        super().__init__()
+        self.archive_path = output_folder.rstrip('/\\') + self.extension
+        self.index_path = self.archive_path + '.index.jsonl'
+        self.scratch_dir = self.archive_path + '.parts'
+        self.root = output_folder
+        self.lock = threading.Lock()
+        self.names = set()
+
+        parent = os.path.dirname(os.path.abspath(self.archive_path))
+        os.makedirs(parent, exist_ok=True)
+        os.makedirs(self.scratch_dir, exist_ok=True)
+
+        # Reopening an existing archive appends to it, its index tells us what it holds
+        entries = []
+        if os.path.exists(self.archive_path) and os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+            self.names.update(entry['path'] for entry in entries)
+        self.open_archive(entries)
+        self.index = open(self.index_path, 'a', encoding='utf-8')
+        self.last_flush = time.monotonic()
+
+    def name_for(self, path):
+        """Archive member name for a local output path"""
+        return os.path.relpath(path, self.root).replace('\\', '/')
+
+    def exists(self, path):
+        return self.name_for(path) in self.names
+
+    def isdir(self, path):
+        return False
+
+    def makedirs(self, path):
+        return True
+
+    def temp_path(self, path):
+        digest = hashlib.sha1(self.name_for(path).encode('utf-8')).hexdigest()
+        return os.path.join(self.scratch_dir, digest + '.tmp')
+
+    def commit(self, temp_path, path, url=None, content_type=None):
+        with open(temp_path, 'rb') as source:
+            self.add_member(self.name_for(path), source, os.path.getsize(temp_path), url, content_type)
+        os.remove(temp_path)
+
+    def write(self, path, data, url=None, content_type=None):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.add_member(self.name_for(path), io.BytesIO(data), len(data), url, content_type)
+
+    def add_member(self, name, source, size, url, content_type):
+        with self.lock:
+            if name in self.names:
+                return
+            offset, length = self.append_member(name, source, size, url, content_type)
+            self.names.add(name)
+            entry = {'path': name, 'offset': offset, 'length': length, 'size': size,
+                     'url': url, 'content_type': content_type}
+            self.index.write(json.dumps(entry) + '\n')
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush()
+
+    def flush(self):
+        """Hand the archive, then the index pointing into it, to the OS"""
+        self.flush_archive()
+        self.index.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self.close_archive()
+            self.index.close()
+        try:
+            os.rmdir(self.scratch_dir)
+        except OSError:
+            # Partial downloads left for a later resume
+            pass
+
+    def open_archive(self, entries):
+        raise NotImplementedError
+
+    def append_member(self, name, source, size, url, content_type):
+        """Append one file; returns (offset, length) of its bytes in the archive"""
+        raise NotImplementedError
+
+    def flush_archive(self):
+        raise NotImplementedError
+
+    def close_archive(self):
+        raise NotImplementedError
+
+class ZipOutput(ArchiveOutput):
+    """Write the mirror into a single .zip file"""
+    extension = '.zip'
+
+    def open_archive(self, entries):
+        import zipfile
+        self.zipfile = zipfile
+        mode = 'a' if entries else 'w'
+        if entries:
+            # Append mode would quietly start a second archive after anything it cannot read,
+            # such as the zip of a run that died before writing its central directory
+            try:
+                zipfile.ZipFile(self.archive_path).close()
+            except zipfile.BadZipFile as e:
+                raise ValueError(f"Cannot append to {self.archive_path}: {e}") from e
+        self.zip = zipfile.ZipFile(self.archive_path, mode, compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+
+    def append_member(self, name, source, size, url, content_type):
+        info = self.zipfile.ZipInfo(name, date_time=datetime.now().timetuple()[:6])
+        info.compress_type = self.zipfile.ZIP_DEFLATED
+        with self.zip.open(info, 'w', force_zip64=size > 0x7fffffff) as member:
+            shutil.copyfileobj(source, member, 1024 * 1024)
+        return info.header_offset, self.zip.fp.tell() - info.header_offset
+
+    def flush_archive(self):
+        self.zip.fp.flush()
+
+    def close_archive(self):
+        self.zip.close()
+
+class TarZstOutput(ArchiveOutput):
+    """
+    Write the mirror as a .tar.zst file. Each member (header, data and padding)
+    is its own Zstandard frame, so the whole file still decompresses to one
+    ordinary tar stream while the index can seek straight to any member.
+    Requires the zstandard package.
+    """
+    extension = '.tar.zst'
+
+    def open_archive(self, entries):
+        import tarfile
+        self.tarfile = tarfile
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("tar.zst output requires the 'zstandard' package (pip install zstandard)")
+        self.compressor = zstandard.ZstdCompressor(level=3)
+        self.flush_frame = zstandard.FLUSH_FRAME
+        self.file = open(self.archive_path, 'ab' if entries else 'wb')
+        if entries:
+            # Drop the end-of-archive frame written by the previous run
+            end = max(entry['offset'] + entry['length'] for entry in entries)
+            self.file.truncate(end)
+            self.file.seek(end)
+
+    def append_frame(self, write_payload):
+        offset = self.file.tell()
+        writer = self.compressor.stream_writer(self.file, closefd=False)
+        write_payload(writer)
+        writer.flush(self.flush_frame)
+        return offset, self.file.tell() - offset
+
+    def append_member(self, name, source, size, url, content_type):
+        tarfile = self.tarfile
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(datetime.now().timestamp())
+        info.mode = 0o644
+
+        def write_payload(writer):
+            writer.write(info.tobuf(format=tarfile.PAX_FORMAT))
+            shutil.copyfileobj(source, writer, 1024 * 1024)
+            remainder = size % tarfile.BLOCKSIZE
+            if remainder:
+                writer.write(b'\0' * (tarfile.BLOCKSIZE - remainder))
+        return self.append_frame(write_payload)
+
+    def flush_archive(self):
+        self.file.flush()
+
+    def close_archive(self):
+        self.append_frame(lambda writer: writer.write(b'\0' * self.tarfile.BLOCKSIZE * 2))
+        self.file.close()
+
+class WarcOutput(ArchiveOutput):
+    """
+    Write the mirror as a .warc.gz file of WARC/1.1 resource records, one gzip
+    member per record as is usual for WARC, keyed by the original URL.
+    """
+    extension = '.warc.gz'
+
+    def open_archive(self, entries):
+        import gzip
+        import uuid
+        self.gzip = gzip
+        self.uuid = uuid
+        self.file = open(self.archive_path, 'ab' if entries else 'wb')
+        if not entries:
+            info = b'software: website-cloner-enhanced\r\nformat: WARC File Format 1.1\r\n'
+            self.append_record({'WARC-Type': 'warcinfo', 'Content-Type': 'application/warc-fields',
+                                'WARC-Filename': os.path.basename(self.archive_path)},
+                               io.BytesIO(info), len(info))
+
+    def append_record(self, fields, source, size):
+        offset = self.file.tell()
+        record_headers = {
+            'WARC-Record-ID': f'<urn:uuid:{self.uuid.uuid4()}>',
+            'WARC-Date': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        }
+        record_headers.update(fields)
+        record_headers['Content-Length'] = str(size)
+        head = 'WARC/1.1\r\n' + ''.join(f'{key}: {value}\r\n' for key, value in record_headers.items()) + '\r\n'
+        with self.gzip.GzipFile(fileobj=self.file, mode='wb') as member:
+            member.write(head.encode('utf-8'))
+            shutil.copyfileobj(source, member, 1024 * 1024)
+            member.write(b'\r\n\r\n')
+        return offset, self.file.tell() - offset
+
+    def append_member(self, name, source, size, url, content_type):
+        fields = {
+            'WARC-Type': 'resource',
+            'WARC-Target-URI': url or f'urn:x-mirror-path:{name}',
+            'WARC-X-Mirror-Path': name,
+            'Content-Type': content_type or 'application/octet-stream',
+        }
+        return self.append_record(fields, source, size)
+
+    def flush_archive(self):
+        self.file.flush()
+
+    def close_archive(self):
+        self.file.close()
+
+def create_output(output_format, output_folder):
+    """Create the output backend for a clone written to output_folder"""
+    if output_format in (None, 'dir'):
+        return DirectoryOutput(output_folder)
+    backends = {'zip': ZipOutput, 'tar.zst': TarZstOutput, 'warc': WarcOutput}
+    if output_format not in backends:
+        raise ValueError(f"Unknown output format: {output_format} (choose from {', '.join(OUTPUT_FORMATS)})")
+    return backends[output_format](output_folder)
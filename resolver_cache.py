@@ -0,0 +1,178 @@
+import socket
+import ipaddress
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('website_cloner')
+
+# TTL used when the resolver cannot tell us one (the system resolver never does)
+DEFAULT_TTL = 300
+
+def system_resolver(host, port):
+    """
+    Resolve through the system resolver (honours /etc/hosts).
+    Returns (addresses, ttl) where ttl is None because getaddrinfo has no TTLs.
+    """
+    infos = socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM)
+    return [(family, sockaddr[0]) for family, _, _, _, sockaddr in infos], None
+
+def dnspython_resolver(host, port):
+    """
+    Resolve A and AAAA records with dnspython so the record TTL is known.
+    Falls back to the system resolver for names DNS cannot answer (e.g. localhost).
+    """
+    import dns.resolver
+    addresses = []
+    ttls = []
+    for record_type, family in (('A', socket.AF_INET), ('AAAA', socket.AF_INET6)):
+        try:
+            answer = dns.resolver.resolve(host, record_type)
+        except Exception:
+            continue
+        ttls.append(answer.rrset.ttl)
+        addresses.extend((family, record.address) for record in answer)
+    if not addresses:
+        return system_resolver(host, port)
+    return addresses, min(ttls)
+
+def default_resolver():
+    """dnspython when installed, otherwise the system resolver"""
+    try:
+        import dns.resolver  # noqa: F401
+        return dnspython_resolver
+    except ImportError:
+        return system_resolver
+
+class DnsCache:
+    """
+    Thread-safe, TTL-respecting cache of host name lookups shared by every
+    connection the process opens. Concurrent lookups of the same host wait
+    for a single resolution instead of all querying the resolver, and hosts
+    found while parsing pages can be resolved ahead of time with prefetch().
+    resolver(host, port) must return (addresses, ttl) where addresses is a list
+    of (family, ip) pairs and ttl is in seconds or None for DEFAULT_TTL.
+    """
+    def __init__(self, resolver=None, default_ttl=DEFAULT_TTL, prefetch_workers=4):
+        # None until the first lookup picks default_resolver(), so creating a cache imports nothing
+        self.resolver = resolver
+        self.default_ttl = default_ttl
+        self.prefetch_workers = prefetch_workers
+        self.enabled = True
+        self.entries = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.executor = None
+        self.hits = 0
+        self.lookups = 0
+
+    def cached(self, host):
+        """Unexpired addresses for host, or None"""
+        entry = self.entries.get(host)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+
+    def resolve(self, host, port=80):
+        """Return the [(family, ip), ...] list for host, resolving it if needed"""
+        with self.lock:
+            addresses = self.cached(host)
+            if addresses is not None:
+                self.hits += 1
+                return addresses
+            pending = self.pending.get(host)
+            owner = pending is None
+            if owner:
+                pending = self.pending[host] = threading.Event()
+
+        if not owner:
+            # Another thread is resolving this host already, share its answer
+            pending.wait(10)
+            with self.lock:
+                addresses = self.cached(host)
+                if addresses is not None:
+                    self.hits += 1
+                    return addresses
+            return self.lookup(host, port)
+
+        try:
+            return self.lookup(host, port)
+        finally:
+            with self.lock:
+                self.pending.pop(host, None)
+            pending.set()
+
+    def lookup(self, host, port):
+        if self.resolver is None:
+            self.resolver = default_resolver()
+        addresses, ttl = self.resolver(host, port)
+        # Keep the resolver's order but drop duplicates
+        addresses = list(dict.fromkeys(addresses))
+        if not addresses:
+            raise socket.gaierror(f"No addresses found for {host}")
+        ttl = self.default_ttl if ttl is None else ttl
+        with self.lock:
+            self.lookups += 1
+            self.entries[host] = (addresses, time.monotonic() + ttl)
+        return addresses
+
+    def invalidate(self, host):
+        with self.lock:
+            self.entries.pop(host, None)
+
+    def prefetch(self, hosts):
+        """Resolve hosts in the background so later connections find them cached"""
+        if not self.enabled:
+            return
+        with self.lock:
+            hosts = [host for host in set(hosts)
+                     if host and not is_ip_address(host)
+                     and self.cached(host) is None and host not in self.pending]
+            if hosts and self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.prefetch_workers,
+                                                   thread_name_prefix='dns-prefetch')
+        for host in hosts:
+            self.executor.submit(self.prefetch_one, host)
+
+    def prefetch_one(self, host):
+        try:
+            self.resolve(host)
+        except OSError as e:
+            logger.debug("DNS prefetch failed for %s: %s", host, e)
+
+def is_ip_address(host):
+    try:
+        ipaddress.ip_address(host.strip('[]'))
+        return True
+    except ValueError:
+        return False
+
+def install_dns_cache(cache):
+    """
+    Route urllib3's connection setup (and so every requests call) through cache.
+    Safe to call more than once.
+    """
+    from urllib3.util import connection
+
+    if getattr(connection.create_connection, 'dns_cache', None) is cache:
+        return
+    original = getattr(connection.create_connection, 'original', connection.create_connection)
+
+    def create_connection(address, *args, **kwargs):
+        host, port = address
+        if not cache.enabled or is_ip_address(host):
+            return original(address, *args, **kwargs)
+        last_error = None
+        for family, ip in cache.resolve(host, port):
+            try:
+                return original((ip, port), *args, **kwargs)
+            except OSError as e:
+                last_error = e
+        # Every cached address failed, the next connection resolves afresh
+        cache.invalidate(host)
+        raise last_error
+
+    create_connection.original = original
+    create_connection.dns_cache = cache
+    connection.create_connection = create_connection
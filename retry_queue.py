@@ -0,0 +1,162 @@
+import json
+import heapq
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Retries per status class: (attempts, base delay in seconds). The delay
+# doubles with every attempt; a Retry-After header can only lengthen it.
+DEFAULT_POLICY = {
+    '429': (5, 30.0),
+    '5xx': (3, 5.0),
+    'network': (3, 5.0),
+    '4xx': (0, 0.0),
+}
+
+def status_class(status):
+    """Policy class of a failed fetch; status is None when no response came back"""
+    if status is None or status == 408:
+        return 'network'
+    if status == 429:
+        return '429'
+    if status >= 500:
+        return '5xx'
+    return '4xx'
+
+def parse_retry_policy(values, policy=None):
+    """
+    Policy from CLASS=ATTEMPTS[:DELAY] strings (e.g. "5xx=4:10", "429=0"),
+    applied on top of policy or DEFAULT_POLICY.
+    """
+    policy = dict(policy or DEFAULT_POLICY)
+    for value in values or ():
+        name, _, setting = value.partition('=')
+        if name not in policy or not setting:
+            raise ValueError(f"Bad retry policy {value!r}, expected one of {', '.join(policy)}=ATTEMPTS[:DELAY]")
+        attempts, _, delay = setting.partition(':')
+        policy[name] = (int(attempts), float(delay) if delay else policy[name][1])
+    return policy
+
+def retry_after_seconds(value):
+    """Seconds asked for by a Retry-After header (delta seconds or an HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RetryQueue:
+    """
+    Failed fetches waiting for another attempt, ordered by the time they
+    become eligible, so a crawl keeps going with other URLs in the meantime.
+    schedule() takes a callable that repeats the fetch and returns the new
+    links it found; run_due() calls the ones whose time has come. Attempts
+    are counted per URL across reschedules. A URL that runs out of attempts
+    is kept in `unrecoverable`; failures of a class without retries (plain
+    4xx) are not queued at all. A deferral, a fetch that was never sent
+    (its host's circuit was open), comes back after retry_after without
+    using up an attempt. Thread-safe, assets fail from worker threads.
+    """
+    def __init__(self, policy=None):
+        self.policy = policy or DEFAULT_POLICY
+        self.heap = []
+        self.sequence = 0
+        self.attempts = {}
+        self.pending = set()
+        self.recovered = []
+        self.unrecoverable = []
+        self.scheduled = 0
+        self.lock = threading.Lock()
+
+    def waiting(self):
+        """Number of retries still queued"""
+        with self.lock:
+            return len(self.heap)
+
+    def schedule(self, url, retry, status=None, error=None, retry_after=None, kind='asset', referrer=None,
+                 deferral=False):
+        """
+        Queue retry() for another attempt at url after a failure with status
+        (None for a network error). Returns False, and records url as
+        unrecoverable if it was retried before, when the policy allows no
+        further attempt. With deferral the request never went out, so it is
+        queued again for retry_after seconds whatever the attempts so far.
+        """
+        status_name = status_class(status)
+        max_attempts, base_delay = self.policy.get(status_name, (0, 0.0))
+        with self.lock:
+            if deferral:
+                heapq.heappush(self.heap, (time.monotonic() + (retry_after or 0.0), self.sequence, url, retry))
+                self.sequence += 1
+                self.pending.add(url)
+                return True
+            attempt = self.attempts.get(url, 0) + 1
+            if attempt > max_attempts:
+                self.pending.discard(url)
+                if attempt > 1:
+                    self.unrecoverable.append({
+                        'url': url,
+                        'kind': kind,
+                        'referrer': referrer,
+                        'status': status,
+                        'class': status_name,
+                        'attempts': attempt,
+                        'error': str(error) if error else None,
+                    })
+                return False
+            self.attempts[url] = attempt
+            # Jitter keeps the retries of one burst of failures from all coming back together
+            delay = base_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.0)
+            delay = max(delay, retry_after or 0.0)
+            heapq.heappush(self.heap, (time.monotonic() + delay, self.sequence, url, retry))
+            self.sequence += 1
+            self.pending.add(url)
+            self.scheduled += 1
+        return True
+
+    def is_pending(self, url):
+        with self.lock:
+            return url in self.pending
+
+    def succeeded(self, url):
+        """Note that a fetch of url worked; counts as recovered if it had failed before"""
+        with self.lock:
+            if url in self.pending:
+                self.pending.discard(url)
+                self.recovered.append(url)
+
+    def wait_time(self):
+        """Seconds until the next retry is due (0 if one is due now, None if the queue is empty)"""
+        with self.lock:
+            if not self.heap:
+                return None
+            return max(0.0, self.heap[0][0] - time.monotonic())
+
+    def due(self):
+        """Pop every (url, retry) whose time has come"""
+        now = time.monotonic()
+        ready = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                _, _, url, retry = heapq.heappop(self.heap)
+                ready.append((url, retry))
+        return ready
+
+    def run_due(self):
+        """Run the retries that are due and return the links they found"""
+        links = []
+        for url, retry in self.due():
+            links.extend(retry() or [])
+        return links
+
+    def write_report(self, path):
+        """Write the unrecoverable URLs to path as JSON lines"""
+        with open(path, 'w', encoding='utf-8') as report:
+            for entry in self.unrecoverable:
+                report.write(json.dumps(entry) + '\n')
@@ -0,0 +1,57 @@
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import website_cloner
+
+
+class QuietHandler(BaseHTTPRequestHandler):
+    """Request handler base for the local test servers"""
+    protocol_version = 'HTTP/1.1'
+    # Headers and body leave in one write, so delayed ACKs do not add 40 ms to every response
+    wbufsize = -1
+
+    def log_message(self, *args):
+        pass
+
+    def send_body(self, body, content_type='text/html', status=200, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+
+@pytest.fixture
+def serve():
+    """Start a local HTTP server for a handler class; returns its base URL"""
+    servers = []
+
+    def start(handler):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def isolated_settings(monkeypatch):
+    """Keep tests off the user's HTTP cache and the adaptive limits of earlier tests"""
+    monkeypatch.setitem(website_cloner.cache_settings, 'enabled', False)
+    website_cloner.scheduler.configure()
+    yield
+    website_cloner.scheduler.configure()
@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "website_cloner.py")
+
+
+def run_cloner(*args, cwd):
+    return subprocess.run([sys.executable, SCRIPT, *args], cwd=cwd, capture_output=True, text=True, timeout=60)
+
+
+def test_invalid_option_exits_without_cloning_the_demo_site(tmp_path):
+    result = run_cloner("https://example.invalid/", "--retry", "bogus", cwd=tmp_path)
+
+    assert result.returncode == 2
+    assert "Bad retry policy" in result.stderr
+    assert "using default values" not in result.stdout
+    assert not (tmp_path / "cloned_website").exists()
+
+
+def test_missing_seeds_file_is_a_usage_error(tmp_path):
+    result = run_cloner("https://example.invalid/", "--seeds", "missing.jsonl", cwd=tmp_path)
+
+    assert result.returncode == 2
+    assert "Cannot read --seeds file missing.jsonl" in result.stderr
+    assert "using default values" not in result.stdout
+
+
+def test_unreadable_seeds_file_is_a_usage_error(tmp_path):
+    (tmp_path / "seeds.jsonl").write_text('{"kind": "page", "status": 200\n')
+    result = run_cloner("https://example.invalid/", "--seeds", "seeds.jsonl", cwd=tmp_path)
+
+    assert result.returncode == 2
+    assert "Cannot read --seeds file seeds.jsonl" in result.stderr
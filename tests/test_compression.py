@@ -0,0 +1,64 @@
+import gzip
+import zlib
+
+import pytest
+from conftest import QuietHandler
+
+import website_cloner
+
+BODY = b"".join(b".rule-%d { color: #%06x; margin: 0 auto }\n" % (n, n) for n in range(2000))
+
+
+def compress(coding, data):
+    if coding == "gzip":
+        return gzip.compress(data)
+    if coding == "deflate":
+        return zlib.compress(data)
+    if coding == "br":
+        import brotli
+        return brotli.compress(data)
+    import zstandard
+    return zstandard.ZstdCompressor().compress(data)
+
+
+def encoding_handler(coding):
+    """Handler serving BODY in coding when the request accepts it, recording each Accept-Encoding"""
+    accepted = []
+
+    class EncodingHandler(QuietHandler):
+        def do_GET(self):
+            accept = self.headers.get("Accept-Encoding", "")
+            accepted.append(accept)
+            if coding in [value.strip() for value in accept.split(",")]:
+                self.send_body(compress(coding, BODY), "text/css", headers={"Content-Encoding": coding})
+            else:
+                self.send_body(BODY, "text/css")
+
+    return EncodingHandler, accepted
+
+
+@pytest.mark.parametrize("coding", ["gzip", "deflate", "br", "zstd"])
+def test_negotiated_codings_are_decoded_and_counted(serve, tmp_path, coding):
+    if coding not in website_cloner.headers["Accept-Encoding"].split(","):
+        pytest.skip(f"urllib3 has no {coding} decoder here")
+    handler, accepted = encoding_handler(coding)
+    url = serve(handler) + "/site.css"
+    stats = website_cloner.WebsiteStats()
+
+    size = website_cloner.fetch_to_file(url, str(tmp_path / "site.css"), stats=stats)
+
+    assert accepted == [website_cloner.supported_encodings()]
+    assert (tmp_path / "site.css").read_bytes() == BODY
+    assert size == len(BODY)
+    assert stats.transfer_by_type["text/css"] == [len(compress(coding, BODY)), len(BODY)]
+
+
+def test_uncompressed_responses_count_the_same_bytes_twice(serve, tmp_path):
+    handler, _ = encoding_handler("identity-only")
+    url = serve(handler) + "/site.css"
+    stats = website_cloner.WebsiteStats()
+
+    website_cloner.fetch_to_file(url, str(tmp_path / "site.css"), stats=stats)
+
+    assert stats.transfer_by_type["text/css"] == [len(BODY), len(BODY)]
+    assert stats.get_transfer_totals() == (len(BODY), len(BODY))
@@ -0,0 +1,87 @@
+import statistics
+import threading
+import time
+
+import pytest
+from conftest import QuietHandler
+
+import website_cloner
+
+SERVICE_TIME = 0.02
+
+
+def capacity_handler(capacity, overload):
+    """Handler serving `capacity` requests at a time; the rest get a 503 ('reject') or wait their turn ('queue')"""
+    gate = threading.BoundedSemaphore(capacity)
+
+    class CapacityHandler(QuietHandler):
+        def do_GET(self):
+            if not gate.acquire(blocking=overload == 'queue'):
+                self.send_body(b'busy', 'text/plain', 503)
+                return
+            try:
+                time.sleep(SERVICE_TIME)
+                self.send_body(b'ok', 'text/plain')
+            finally:
+                gate.release()
+
+    return CapacityHandler
+
+
+def drive(url, clients=24, seconds=3.0):
+    """Load url from many threads through the scheduler; returns (limits sampled in the second half, OK responses/s there)"""
+    host = url.split('/')[2]
+    samples = []
+    successes = []
+    stop = threading.Event()
+
+    def client():
+        while not stop.is_set():
+            response = website_cloner.http_request('GET', url)
+            successes.append((time.monotonic(), response.status_code == 200))
+            response.close()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    started = time.monotonic()
+    while time.monotonic() - started < seconds:
+        samples.append(website_cloner.scheduler.controller.limits().get(host, 0))
+        time.sleep(0.02)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    settled = started + seconds / 2
+    throughput = sum(ok for at, ok in successes if at >= settled) / (seconds / 2)
+    return samples[len(samples) // 2:], throughput
+
+
+@pytest.mark.parametrize("capacity", [4, 8])
+def test_limit_settles_near_a_rejecting_servers_capacity(serve, monkeypatch, capacity):
+    monkeypatch.setitem(website_cloner.circuit_settings, 'failures', 0)
+    website_cloner.scheduler.configure(per_host=16, adaptive=True)
+    url = serve(capacity_handler(capacity, 'reject')) + "/item"
+
+    limits, throughput = drive(url)
+
+    assert capacity / 2 <= statistics.mean(limits) <= capacity + 2
+    assert throughput >= 0.6 * capacity / SERVICE_TIME
+    assert any(adjustment['reason'] == 'HTTP 503' for adjustment in website_cloner.scheduler.controller.adjustments)
+
+
+def test_limit_stops_growing_once_a_queueing_server_is_saturated(serve):
+    capacity = 4
+    website_cloner.scheduler.configure(per_host=16, adaptive=True)
+    url = serve(capacity_handler(capacity, 'queue')) + "/item"
+
+    limits, throughput = drive(url)
+
+    # Past capacity requests only queue; the latency rule stops the window at about latency_factor times capacity
+    latency_factor = website_cloner.concurrency_settings['latency_factor']
+    assert capacity <= statistics.mean(limits) <= latency_factor * capacity + 2
+    assert throughput >= 0.8 * capacity / SERVICE_TIME
+    assert any(adjustment['reason'] == 'latency' for adjustment in website_cloner.scheduler.controller.adjustments)
+
+
+def test_single_site_default_fetches_one_request_at_a_time():
+    assert website_cloner.concurrency_settings['max'] == 1
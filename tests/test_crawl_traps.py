@@ -0,0 +1,108 @@
+import os
+import re
+from collections import deque
+
+from conftest import QuietHandler
+
+import website_cloner
+from crawl_traps import TrapDetector, url_template
+
+SITE = "http://shop.test"
+
+
+def crawl(detector, start, links_of, limit=20000):
+    """Breadth-first crawl of a made-up site the way clone_website drives the detector; returns the fetched URLs"""
+    queue = deque([start])
+    visited = {start}
+    fetched = []
+    while queue and len(fetched) < limit:
+        url = queue.popleft()
+        if not detector.admit(url):
+            continue
+        fetched.append(url)
+        queued = [link for link in links_of(url) if link not in visited]
+        visited.update(queued)
+        queue.extend(queued)
+        detector.note_links(url, queued)
+    return fetched
+
+
+def calendar_links(url):
+    if url.endswith("/events"):
+        return [f"{SITE}/calendar/2024/05"]
+    year, month = map(int, url.rsplit("/", 2)[-2:])
+    after = (year + month // 12, month % 12 + 1)
+    before = (year - (month == 1), (month - 2) % 12 + 1)
+    return [f"{SITE}/calendar/{y}/{m:02d}" for y, m in (before, after)]
+
+
+def test_endless_calendar_is_cut_at_the_budget():
+    detector = TrapDetector(budget=50)
+    fetched = crawl(detector, f"{SITE}/events", calendar_links)
+
+    assert sum("/calendar/" in url for url in fetched) == 50
+    assert detector.throttled_patterns()[0][0] == "shop.test/calendar/{n}/{n}"
+    assert detector.throttled_patterns()[0][2] == "self-linking pattern"
+
+
+def test_endless_pagination_is_cut_but_its_items_are_not():
+    def links_of(url):
+        if "/item/" in url:
+            return []
+        page = int(url.split("=")[1])
+        return [f"{SITE}/list?page={page + 1}"] + [f"{SITE}/item/{page * 10 + n}" for n in range(10)]
+
+    detector = TrapDetector(budget=50)
+    fetched = crawl(detector, f"{SITE}/list?page=1", links_of)
+
+    assert sum("/list?" in url for url in fetched) == 50
+    assert sum("/item/" in url for url in fetched) == 500
+    assert [template for template, _, _ in detector.throttled_patterns()] == ["shop.test/list?page={v}"]
+
+
+def test_repeating_relative_path_is_refused():
+    detector = TrapDetector()
+    fetched = crawl(detector, f"{SITE}/a/b/", lambda url: [url + "a/b/"])
+
+    assert fetched == [f"{SITE}/a/b/", f"{SITE}/a/b/a/b/"]
+    assert detector.throttled_patterns() == [("shop.test/a/b/a/b/a/b/", 1, "repeating path segments")]
+
+
+def test_large_product_catalogue_is_not_capped():
+    def links_of(url):
+        if url == f"{SITE}/":
+            return [f"{SITE}/products?page={page}" for page in range(1, 41)]
+        if "/products?" in url:
+            page = int(url.split("=")[1])
+            return [f"{SITE}/item/{page * 100 + n}" for n in range(50)]
+        return []
+
+    detector = TrapDetector()
+    fetched = crawl(detector, f"{SITE}/", links_of)
+
+    assert sum(url_template(url) == "shop.test/item/{n}" for url in fetched) == 2000
+    assert detector.refused == 0
+
+
+class CalendarHandler(QuietHandler):
+    def do_GET(self):
+        match = re.fullmatch(r"/calendar/(\d+)/(\d+)\.html", self.path)
+        if self.path == "/index.html":
+            self.send_body(b'<html><body><a href="calendar/2024/05.html">Events</a></body></html>')
+        elif match:
+            year, month = map(int, match.groups())
+            after = (year + month // 12, month % 12 + 1)
+            self.send_body(f'<html><body><h1>{year}-{month}</h1>'
+                           f'<a href="/calendar/{after[0]}/{after[1]:02d}.html">Next month</a></body></html>'.encode())
+        else:
+            self.send_body(b"Not found", "text/plain", 404)
+
+
+def test_clone_stops_following_an_endless_calendar(serve, tmp_path, monkeypatch):
+    monkeypatch.setitem(website_cloner.trap_settings, "budget", 15)
+    base_url = serve(CalendarHandler) + "/index.html"
+
+    website_cloner.clone_website(base_url, str(tmp_path / "site"), 0, 0, headless=True, link_graph_path=None)
+
+    saved = [name for _, _, names in os.walk(tmp_path / "site") for name in names if re.fullmatch(r"\d+\.html", name)]
+    assert len(saved) == 15
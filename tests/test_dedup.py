@@ -0,0 +1,46 @@
+import io
+
+import website_cloner
+from dedup import DuplicateIndex, PageFingerprint, fingerprint_html
+
+NAV = "<nav>" + "".join(f'<a href="/c{n}">Category {n} of the department store</a>' for n in range(30)) + "</nav>"
+FOOTER = "<footer>" + "Copyright shop all rights reserved terms privacy shipping returns contact " * 10 + "</footer>"
+ARTICLE = " ".join(f"Sentence {n} of the long review explains how the widget performs in daily use." for n in range(20))
+
+
+def page(content, nav=NAV):
+    return f"<html><body><header>Shop</header>{nav}<main>{content}</main>{FOOTER}</body></html>"
+
+
+def test_pages_sharing_a_template_are_not_duplicates():
+    index = DuplicateIndex()
+    assert index.check("a", fingerprint_html(page("<h1>Red widget, 10 dollars</h1>"))) is None
+    assert index.check("b", fingerprint_html(page("<h1>Blue gadget, 25 dollars</h1>"))) is None
+    assert index.duplicates == 0
+
+
+def test_same_content_with_a_different_session_id_is_a_near_duplicate():
+    index = DuplicateIndex()
+    assert index.check("a", fingerprint_html(page(f"<p>{ARTICLE}</p><p>Session 8f3a91</p>"))) is None
+    assert index.check("b", fingerprint_html(page(f"<p>{ARTICLE}</p><p>Session 27bc04</p>"))) == "a"
+    assert index.near_duplicates == 1
+
+
+def test_near_matching_is_opt_in():
+    index = DuplicateIndex(near=False)
+    index.check("a", fingerprint_html(page(f"<p>{ARTICLE}</p><p>Session 8f3a91</p>")))
+    assert index.check("b", fingerprint_html(page(f"<p>{ARTICLE}</p><p>Session 27bc04</p>"))) is None
+    assert website_cloner.dedup_settings["mode"] == "exact"
+
+
+def test_streaming_fingerprint_skips_boilerplate(tmp_path):
+    def streamed(html_content):
+        fingerprint = PageFingerprint()
+        rewriter = website_cloner.StreamingHtmlRewriter(io.StringIO().write, "http://site.test/p.html",
+                                                        "http://site.test/", str(tmp_path), fingerprint=fingerprint)
+        rewriter.feed(html_content)
+        rewriter.close()
+        return fingerprint.simhash
+
+    other_nav = "<nav>" + "".join(f'<a href="/t{n}">Topic {n} somewhere else entirely</a>' for n in range(30)) + "</nav>"
+    assert streamed(page(f"<p>{ARTICLE}</p>")) == streamed(page(f"<p>{ARTICLE}</p>", nav=other_nav))
@@ -0,0 +1,66 @@
+import logging
+import os
+
+from conftest import QuietHandler
+
+import website_cloner
+from output_backends import DirectoryOutput
+
+
+class AssetSiteHandler(QuietHandler):
+    def do_GET(self):
+        if self.path == "/index.html":
+            assets = "".join(f'<link rel="stylesheet" href="css/s{n}.css"><img src="img/i{n}.png">' for n in range(6))
+            self.send_body(f"<html><head>{assets}</head><body>Home</body></html>".encode())
+        elif self.path.startswith("/css/s"):
+            self.send_body(b"body { color: black }", "text/css")
+        elif self.path.startswith("/img/i"):
+            self.send_body(b"\x89PNG not really", "image/png")
+        else:
+            self.send_body(b"Not found", "text/plain", 404)
+
+    do_HEAD = do_GET
+
+
+def test_each_directory_is_created_once(tmp_path):
+    output = DirectoryOutput(str(tmp_path / "site"))
+    for n in range(20):
+        assert output.makedirs(str(tmp_path / "site" / "a" / "b" / f"c{n % 2}"))
+    assert output.makedirs(str(tmp_path / "site" / "a"))
+
+    # c0 and c1; their parents came along with the first one
+    assert output.syscalls["makedirs"] == 2
+    assert output.cache_hits == 19
+    assert (tmp_path / "site" / "a" / "b" / "c1").is_dir()
+
+
+def test_existing_tree_is_scanned_once_and_answered_from_memory(tmp_path):
+    (tmp_path / "site" / "css").mkdir(parents=True)
+    (tmp_path / "site" / "css" / "site.css").write_text("body {}")
+    output = DirectoryOutput(str(tmp_path / "site"))
+    scans = output.syscalls["scandir"]
+
+    assert output.exists(str(tmp_path / "site" / "css" / "site.css"))
+    assert not output.exists(str(tmp_path / "site" / "css" / "missing.css"))
+    assert output.isdir(str(tmp_path / "site" / "css"))
+    assert output.makedirs(str(tmp_path / "site" / "css"))
+    assert scans == 2
+    assert output.syscalls["stat"] == 0 and output.syscalls["makedirs"] == 0
+
+
+def test_summary_shows_filesystem_calls_with_and_without_the_cache(serve, tmp_path, monkeypatch, caplog):
+    from rich.console import Console
+    monkeypatch.chdir(tmp_path)
+    base_url = serve(AssetSiteHandler)
+
+    with caplog.at_level(logging.INFO, logger="website_cloner"):
+        stats = website_cloner.clone_website(base_url + "/index.html", "site", 0, 0, headless=True,
+                                             link_graph_path=None)
+
+    made, uncached = stats.get_filesystem_totals()
+    assert stats.resources_downloaded == 12
+    assert made < uncached
+    console = Console(record=True, width=300)
+    console.print(website_cloner.get_completion_panel(stats))
+    assert f"{uncached} without the directory cache, {made} with it" in console.export_text()
+    assert f"Filesystem calls: {uncached} without the directory cache, {made} with it" in caplog.text
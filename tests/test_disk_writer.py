@@ -0,0 +1,56 @@
+import json
+import shutil
+import threading
+import time
+
+from test_resume import BODY, ETAG, RangeHandler, fetch_with_timeout
+
+from disk_writer import WriteBehindWriter
+
+
+def test_interrupted_file_holds_a_prefix_that_resumes(serve, tmp_path, monkeypatch):
+    url = serve(RangeHandler) + "/file.bin"
+    partial = tmp_path / "partial.bin"
+    release = threading.Event()
+    write_at = WriteBehindWriter.write_at
+
+    def slow_second_buffer(handle, data, position):
+        if position == 1000:
+            release.wait(10)
+        write_at(handle, data, position)
+
+    monkeypatch.setattr(WriteBehindWriter, "write_at", staticmethod(slow_second_buffer))
+    writer = WriteBehindWriter(write_size=1000, threads=4)
+    handle = writer.open(str(partial))
+    for start in range(0, 5000, 1000):
+        handle.write(BODY[start:start + 1000])
+    time.sleep(0.3)
+
+    # What a crash at this point leaves on disk: no buffer past the slow one may have landed
+    crashed = tmp_path / "file.bin.tmp"
+    shutil.copyfile(partial, crashed)
+    release.set()
+    handle.close()
+    assert crashed.read_bytes() == BODY[:1000]
+
+    (tmp_path / "file.bin.tmp.meta").write_text(json.dumps({'url': url, 'etag': ETAG, 'last_modified': None}))
+    assert fetch_with_timeout(url, tmp_path / "file.bin") == len(BODY)
+    assert (tmp_path / "file.bin").read_bytes() == BODY
+
+
+def test_buffers_of_one_handle_are_written_in_order(tmp_path, monkeypatch):
+    order = []
+    write_at = WriteBehindWriter.write_at
+
+    def recording(handle, data, position):
+        order.append(position)
+        write_at(handle, data, position)
+
+    monkeypatch.setattr(WriteBehindWriter, "write_at", staticmethod(recording))
+    writer = WriteBehindWriter(write_size=100, threads=4)
+    with writer.open(str(tmp_path / "out.bin")) as handle:
+        for start in range(0, len(BODY), 100):
+            handle.write(BODY[start:start + 100])
+
+    assert order == sorted(order)
+    assert (tmp_path / "out.bin").read_bytes() == BODY
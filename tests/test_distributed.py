@@ -0,0 +1,53 @@
+import os
+import re
+
+import pytest
+from conftest import QuietHandler
+
+import distributed
+from link_graph import LinkGraph
+
+PAGES = 20
+
+
+class SiteHandler(QuietHandler):
+    def do_GET(self):
+        if self.path == "/site.css":
+            self.send_body(b"body { color: black }", "text/css")
+        elif self.path == "/index.html":
+            links = "".join(f'<a href="page{n}.html">Page {n}</a>' for n in range(PAGES))
+            self.send_body(f"<html><body>{links}</body></html>".encode())
+        elif re.fullmatch(r"/page\d+\.html", self.path):
+            self.send_body(f'<html><head><link rel="stylesheet" href="site.css"></head>'
+                           f'<body><h1>{self.path}</h1><a href="index.html">Home</a></body></html>'.encode())
+        else:
+            self.send_body(b"Not found", "text/plain", 404)
+
+
+def shards_with_pages(folder):
+    return {shard for shard in os.listdir(folder)
+            if any(name.startswith("page") for _, _, names in os.walk(folder / shard) for name in names)}
+
+
+@pytest.mark.parametrize("partition, shards", [(None, 1), ("url", 2)])
+def test_two_local_workers_share_one_site(serve, tmp_path, monkeypatch, partition, shards):
+    monkeypatch.chdir(tmp_path)
+    base_url = serve(SiteHandler) + "/index.html"
+    graph_path = str(tmp_path / "site.links.sqlite")
+    options = {"partition": partition} if partition else {}
+
+    totals = distributed.run_coordinator(base_url, "site", workers=2, link_graph_path=graph_path,
+                                         min_delay=0, max_delay=0, **options)
+
+    graph = LinkGraph(graph_path)
+    try:
+        pages = {url for url, is_page, _ in graph.urls() if is_page}
+        assert graph.counts()[0] == PAGES + 1
+        assert graph.broken_links() == []
+        assert graph.orphans([base_url]) == []
+    finally:
+        graph.close()
+    assert len(pages) == PAGES + 1
+    assert totals["pages_processed"] == PAGES + 1
+    # By default the one host stays on one worker; partitioning by URL spreads it over both
+    assert len(shards_with_pages(tmp_path / "site")) == shards
@@ -0,0 +1,43 @@
+from conftest import QuietHandler
+
+import website_cloner
+from dedup import DuplicateIndex
+from output_backends import DirectoryOutput
+
+PAGE = ("<html><head><title>Products</title></head><body><h1>Product list</h1>"
+        + "".join(f"<p>Item {n} is a thing with a description of its own</p>" for n in range(40))
+        + "</body></html>").encode()
+
+
+class SameContentHandler(QuietHandler):
+    def do_GET(self):
+        self.send_body(PAGE)
+
+
+def crawl(url, base_url, folder, duplicate_index):
+    return website_cloner.crawl_page(url, base_url, str(folder), website_cloner.RateLimiter(0, 0),
+                                     website_cloner.WebsiteStats(), website_cloner.NullLive(),
+                                     DirectoryOutput(str(folder)), duplicate_index=duplicate_index)
+
+
+def test_duplicate_at_the_canonical_path_keeps_the_page(serve, tmp_path):
+    base_url = serve(SameContentHandler)
+    index = DuplicateIndex()
+    crawl(f"{base_url}/p.html", f"{base_url}/", tmp_path, index)
+    crawl(f"{base_url}/p.html?sid=2", f"{base_url}/", tmp_path, index)
+
+    assert index.exact_duplicates == 1
+    saved = (tmp_path / "p.html").read_text(encoding="utf-8")
+    assert "Product list" in saved
+    assert "http-equiv" not in saved
+
+
+def test_duplicate_at_another_path_is_stored_as_a_reference(serve, tmp_path):
+    base_url = serve(SameContentHandler)
+    index = DuplicateIndex()
+    crawl(f"{base_url}/p.html", f"{base_url}/", tmp_path, index)
+    crawl(f"{base_url}/copy.html", f"{base_url}/", tmp_path, index)
+
+    assert "Product list" in (tmp_path / "p.html").read_text(encoding="utf-8")
+    reference = (tmp_path / "copy.html").read_text(encoding="utf-8")
+    assert "http-equiv" in reference and "p.html" in reference
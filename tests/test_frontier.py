@@ -0,0 +1,70 @@
+import pytest
+
+from frontier import Frontier, SeenSet, SpillDatabase
+
+
+@pytest.fixture
+def spill(tmp_path):
+    database = SpillDatabase(str(tmp_path))
+    yield database
+    database.close()
+
+
+def urls(count, prefix="https://example.com/page"):
+    return [f"{prefix}{n}" for n in range(count)]
+
+
+def test_frontier_pops_in_push_order_across_spills_and_refills(spill):
+    # A budget of a few entries makes nearly every push spill and every refill come from disk
+    frontier = Frontier(spill, memory_budget=2000)
+    popped = []
+    for n, url in enumerate(urls(1000)):
+        frontier.push(url, depth=n % 7)
+        if n % 3 == 0:
+            popped.append(frontier.pop())
+    while len(frontier):
+        popped.append(frontier.pop())
+
+    assert frontier.spilled > 0
+    assert popped == [(url, n % 7) for n, url in enumerate(urls(1000))]
+    with pytest.raises(IndexError):
+        frontier.pop()
+
+
+def test_push_front_is_popped_next_ahead_of_spilled_entries(spill):
+    frontier = Frontier(spill, memory_budget=2000)
+    for url in urls(200):
+        frontier.push(url)
+    assert frontier.on_disk
+    first = frontier.pop()
+    frontier.push_front(["https://example.com/retry-a", "https://example.com/retry-b"], depth=3)
+
+    assert first == (urls(200)[0], 0)
+    assert [frontier.pop() for _ in range(3)] == [("https://example.com/retry-a", 3),
+                                                 ("https://example.com/retry-b", 3), (urls(200)[1], 0)]
+    assert len(frontier) == 198
+
+
+def test_frontiers_sharing_a_spill_database_keep_their_own_entries(spill):
+    first, second = Frontier(spill, 2000, queue=0), Frontier(spill, 2000, queue=1)
+    for url in urls(100, "https://a.example/"):
+        first.push(url)
+    for url in urls(100, "https://b.example/"):
+        second.push(url)
+
+    assert [first.pop()[0] for _ in range(100)] == urls(100, "https://a.example/")
+    assert [second.pop()[0] for _ in range(100)] == urls(100, "https://b.example/")
+
+
+def test_seen_set_remembers_spilled_urls(spill):
+    seen = SeenSet(spill, memory_budget=2000)
+    added = urls(5000)
+    assert all(seen.add(url) for url in added)
+
+    assert seen.spilled > 0
+    assert len(seen) == 5000
+    # Everything spilled is still found, through the Bloom filter and the database
+    assert all(url in seen for url in added)
+    assert not any(seen.add(url) for url in added)
+    assert not any(url in seen for url in urls(5000, "https://example.com/other"))
+    assert len(seen) == 5000
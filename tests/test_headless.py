@@ -0,0 +1,85 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+from conftest import QuietHandler
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class SmallSiteHandler(QuietHandler):
+    def do_GET(self):
+        if self.path.endswith(".css"):
+            self.send_body(b"body { color: black }", "text/css")
+        else:
+            self.send_body(b'<html><head><link rel="stylesheet" href="site.css"></head>'
+                           b'<body><a href="about.html">About</a></body></html>')
+
+
+def loaded_modules(code, cwd):
+    """Run code in a fresh interpreter and return which of rich, bs4 and dnspython it imported"""
+    script = textwrap.dedent(code) + textwrap.dedent("""
+        import json, sys
+        with open('modules.json', 'w') as f:
+            json.dump(sorted({name.split('.')[0] for name in sys.modules} & {'rich', 'bs4', 'dns'}), f)
+    """)
+    result = subprocess.run([sys.executable, "-c", script], cwd=cwd, capture_output=True, text=True, timeout=120,
+                            env=dict(os.environ, PYTHONPATH=ROOT))
+    assert result.returncode == 0, result.stderr
+    return json.loads((cwd / "modules.json").read_text())
+
+
+def test_import_loads_neither_rich_bs4_nor_dnspython(tmp_path):
+    assert loaded_modules("import website_cloner", tmp_path) == []
+
+
+def test_headless_clone_never_loads_rich(serve, tmp_path):
+    base_url = serve(SmallSiteHandler)
+    loaded = loaded_modules(f"""
+        import website_cloner
+        website_cloner.cache_settings['enabled'] = False
+        website_cloner.clone_website({base_url + '/index.html'!r}, 'site', 0, 0, headless=True)
+    """, tmp_path)
+
+    # bs4 is only imported once there is a page to parse
+    assert "rich" not in loaded
+    assert (tmp_path / "site" / "about.html").exists()
+
+
+# Importing website_cloner took about 210 ms before its heavy imports were deferred, about 110 ms after
+IMPORT_BUDGET_MS = 150
+
+
+def import_time_ms(tmp_path):
+    """Cumulative import time of website_cloner in a fresh interpreter, from python -X importtime"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import website_cloner"], cwd=tmp_path,
+                            capture_output=True, text=True, timeout=120, env=dict(os.environ, PYTHONPATH=ROOT))
+    assert result.returncode == 0, result.stderr
+    timings = [line.split("|") for line in result.stderr.splitlines() if line.startswith("import time:")]
+    return next(int(cumulative) for _, cumulative, name in timings if name.strip() == "website_cloner") / 1000
+
+
+def test_import_stays_within_its_time_budget(tmp_path):
+    # The best of a few runs, so one slow start on a busy machine does not fail the test
+    assert min(import_time_ms(tmp_path) for _ in range(5)) <= IMPORT_BUDGET_MS
+
+
+def test_log_lines_reach_stdout_from_the_command_line_only(serve, tmp_path):
+    base_url = serve(SmallSiteHandler)
+    library = subprocess.run([sys.executable, "-c", textwrap.dedent(f"""
+        import website_cloner
+        website_cloner.cache_settings['enabled'] = False
+        website_cloner.clone_website({base_url + '/index.html'!r}, 'library', 0, 0, headless=True)
+    """)], cwd=tmp_path, capture_output=True, text=True, timeout=120, env=dict(os.environ, PYTHONPATH=ROOT))
+    command_line = subprocess.run([sys.executable, os.path.join(ROOT, "website_cloner.py"), base_url + "/index.html",
+                                   "-o", "cli", "--min-delay", "0", "--max-delay", "0", "--headless",
+                                   "--no-http-cache"],
+                                  cwd=tmp_path, capture_output=True, text=True, timeout=120)
+
+    assert library.returncode == 0, library.stderr
+    assert "Successfully processed" not in library.stdout
+    assert "Successfully processed" in (tmp_path / "logs" / "website_cloner.log").read_text()
+    assert command_line.returncode == 0, command_line.stderr
+    assert "Successfully processed" in command_line.stdout
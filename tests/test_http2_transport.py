@@ -0,0 +1,154 @@
+import select
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+from http.server import ThreadingHTTPServer
+
+import httpx
+import pytest
+import requests
+from conftest import QuietHandler
+
+from http2_transport import Http2Adapter
+
+
+class FailingStream(httpx.SyncByteStream):
+    def __init__(self, error):
+        self.error = error
+
+    def __iter__(self):
+        yield b"partial body"
+        raise self.error
+
+
+def session_failing_with(error):
+    adapter = Http2Adapter(transport=httpx.MockTransport(
+        lambda request: httpx.Response(200, stream=FailingStream(error))))
+    session = requests.Session()
+    session.mount("https://", adapter)
+    return session
+
+
+@pytest.mark.parametrize("error, expected", [
+    (httpx.ReadTimeout("timed out"), requests.exceptions.Timeout),
+    (httpx.RemoteProtocolError("peer closed connection"), requests.exceptions.ChunkedEncodingError),
+    (httpx.ReadError("connection reset"), requests.exceptions.ConnectionError),
+])
+@pytest.mark.parametrize("stream", [True, False])
+def test_errors_while_reading_the_body_are_requests_exceptions(error, expected, stream):
+    session = session_failing_with(error)
+    with pytest.raises(expected):
+        response = session.get("https://example.test/file.bin", stream=stream)
+        for _ in response.iter_content(8192):
+            pass
+
+
+def test_read_raises_requests_exceptions():
+    response = session_failing_with(httpx.ReadError("connection reset")).get("https://example.test/", stream=True)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        response.raw.read()
+
+
+@pytest.fixture(scope="module")
+def certificate(tmp_path_factory):
+    """A self-signed certificate for 127.0.0.1, used as server certificate, CA and client certificate"""
+    if not shutil.which("openssl"):
+        pytest.skip("needs the openssl command")
+    folder = tmp_path_factory.mktemp("tls")
+    cert, key = str(folder / "cert.pem"), str(folder / "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+                    "-keyout", key, "-out", cert], check=True, capture_output=True)
+    return cert, key
+
+
+@pytest.fixture
+def serve_tls(certificate):
+    """Start a local HTTPS server that requires a client certificate; returns its base URL"""
+    servers = []
+
+    def start(handler):
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*certificate)
+        context.verify_mode = ssl.CERT_REQUIRED
+        context.load_verify_locations(certificate[0])
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.daemon_threads = True
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"https://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+class HelloHandler(QuietHandler):
+    def do_GET(self):
+        self.send_body(b"hello", "text/plain")
+
+
+def connect_proxy():
+    """Handler for a forward proxy that tunnels CONNECT requests, recording their targets"""
+    tunnels = []
+
+    class ConnectProxy(QuietHandler):
+        def do_CONNECT(self):
+            tunnels.append(self.path)
+            host, port = self.path.rsplit(":", 1)
+            with socket.create_connection((host, int(port))) as upstream:
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.flush()
+                peers = {self.connection: upstream, upstream: self.connection}
+                while True:
+                    readable, _, _ = select.select(list(peers), [], [], 5)
+                    data = readable and readable[0].recv(65536)
+                    if not data:
+                        break
+                    peers[readable[0]].sendall(data)
+            self.close_connection = True
+
+    return ConnectProxy, tunnels
+
+
+def tls_session():
+    session = requests.Session()
+    # Only the arguments given to each call, not the environment
+    session.trust_env = False
+    session.mount("https://", Http2Adapter())
+    return session
+
+
+def test_verify_and_cert_reach_the_tls_handshake(serve_tls, certificate):
+    url = serve_tls(HelloHandler)
+    cert, key = certificate
+    session = tls_session()
+    try:
+        with pytest.raises(requests.exceptions.ConnectionError):
+            session.get(url)
+        with pytest.raises(requests.exceptions.RequestException):
+            session.get(url, verify=cert)
+        assert session.get(url, verify=cert, cert=(cert, key)).text == "hello"
+        assert session.get(url, verify=False, cert=(cert, key)).text == "hello"
+    finally:
+        session.close()
+
+
+def test_requests_go_through_the_https_proxy(serve, serve_tls, certificate):
+    url = serve_tls(HelloHandler)
+    handler, tunnels = connect_proxy()
+    proxy_url = serve(handler)
+    cert, key = certificate
+    session = tls_session()
+    try:
+        response = session.get(url, verify=cert, cert=(cert, key), proxies={"https": proxy_url})
+    finally:
+        session.close()
+
+    assert response.text == "hello"
+    assert tunnels == [url.split("//")[1]]
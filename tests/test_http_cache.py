@@ -0,0 +1,106 @@
+import pytest
+from conftest import QuietHandler
+
+import website_cloner
+
+ASSET_SIZE = 1000
+
+
+def caching_handler(cache_control='max-age=3600'):
+    """Handler serving /assets/* with an ETag, a body per Accept-Language, and a log of each GET's headers"""
+    requests = []
+
+    class CachingHandler(QuietHandler):
+        def do_GET(self):
+            requests.append((self.path, dict(self.headers)))
+            if self.headers.get('If-None-Match') == '"v1"':
+                self.send_response(304)
+                self.send_header('ETag', '"v1"')
+                self.end_headers()
+                return
+            language = self.headers.get('Accept-Language', 'none')
+            body = f"{self.path} {language} ".encode().ljust(ASSET_SIZE, b'.')
+            self.send_body(body, 'application/octet-stream',
+                           headers={'Cache-Control': cache_control, 'ETag': '"v1"', 'Vary': 'Accept-Language'})
+
+        def do_HEAD(self):
+            self.send_body(b'.' * ASSET_SIZE, 'application/octet-stream')
+
+    return CachingHandler, requests
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """A fresh HTTP cache under tmp_path in place of the user's"""
+    monkeypatch.setitem(website_cloner.cache_settings, 'enabled', True)
+    monkeypatch.setitem(website_cloner.cache_settings, 'path', str(tmp_path / "cache"))
+    monkeypatch.setattr(website_cloner, 'http_cache', None)
+    yield
+    if website_cloner.http_cache:
+        website_cloner.http_cache.close()
+
+
+def fetch(url, folder):
+    """Download url into folder with fresh stats; returns (body, stats)"""
+    stats = website_cloner.WebsiteStats()
+    save_path = folder / url.rsplit('/', 1)[1]
+    assert website_cloner.download_resource(url, str(save_path), stats=stats)
+    return save_path.read_bytes(), stats
+
+
+def test_fresh_response_is_served_without_a_request(serve, tmp_path, cache):
+    handler, requests = caching_handler()
+    url = serve(handler) + "/assets/app.js"
+
+    first, _ = fetch(url, tmp_path / "run1")
+    second, stats = fetch(url, tmp_path / "run2")
+
+    assert second == first
+    assert len(requests) == 1
+    assert (stats.cache_hits, stats.cache_bytes_saved) == (1, ASSET_SIZE)
+
+
+def test_stale_response_is_revalidated_with_its_etag(serve, tmp_path, cache):
+    handler, requests = caching_handler('no-cache')
+    url = serve(handler) + "/assets/app.js"
+
+    first, _ = fetch(url, tmp_path / "run1")
+    second, stats = fetch(url, tmp_path / "run2")
+
+    assert second == first
+    assert requests[1][1].get('If-None-Match') == '"v1"'
+    assert (stats.cache_revalidated, stats.cache_bytes_saved) == (1, ASSET_SIZE)
+
+
+def test_responses_are_kept_apart_by_their_vary_headers(serve, tmp_path, cache, monkeypatch):
+    handler, requests = caching_handler()
+    url = serve(handler) + "/assets/app.js"
+
+    monkeypatch.setitem(website_cloner.headers, 'Accept-Language', 'en')
+    english, _ = fetch(url, tmp_path / "run1")
+    monkeypatch.setitem(website_cloner.headers, 'Accept-Language', 'fr')
+    french, _ = fetch(url, tmp_path / "run2")
+    monkeypatch.setitem(website_cloner.headers, 'Accept-Language', 'en')
+    english_again, stats = fetch(url, tmp_path / "run3")
+
+    assert english.startswith(b"/assets/app.js en ") and french.startswith(b"/assets/app.js fr ")
+    assert english_again == english
+    assert len(requests) == 2
+    assert stats.cache_hits == 1
+
+
+def test_least_recently_used_entry_is_evicted_first(serve, tmp_path, cache, monkeypatch):
+    monkeypatch.setitem(website_cloner.cache_settings, 'max_bytes', 2 * ASSET_SIZE + ASSET_SIZE // 2)
+    handler, requests = caching_handler()
+    base_url = serve(handler)
+
+    for run, name in enumerate(["a.js", "b.js", "a.js", "c.js"]):
+        # a.js is used again before c.js comes in, leaving b.js the least recently used
+        fetch(f"{base_url}/assets/{name}", tmp_path / f"run{run}")
+    assert website_cloner.http_cache.usage() == (2 * ASSET_SIZE, 2)
+
+    _, kept = fetch(f"{base_url}/assets/a.js", tmp_path / "after-a")
+    _, evicted = fetch(f"{base_url}/assets/b.js", tmp_path / "after-b")
+    assert kept.cache_hits == 1
+    assert evicted.cache_misses == 1
+    assert [path for path, _ in requests] == ["/assets/a.js", "/assets/b.js", "/assets/c.js", "/assets/b.js"]
@@ -0,0 +1,54 @@
+from conftest import QuietHandler
+
+import link_graph
+import website_cloner
+from link_graph import LinkGraph, FETCH_FAILED
+
+
+def test_url_id_cache_is_bounded_and_ids_stay_stable(tmp_path, monkeypatch):
+    monkeypatch.setattr(link_graph, 'ID_CACHE_SIZE', 10)
+    graph = LinkGraph(str(tmp_path / "graph.sqlite"))
+    try:
+        first = {f"https://example.com/p{n}": graph.url_id(f"https://example.com/p{n}") for n in range(50)}
+        assert len(graph.ids) == 10
+        # Ids that fell out of the cache come back from the database unchanged
+        assert {url: graph.url_id(url) for url in first} == first
+        assert len(set(first.values())) == 50
+    finally:
+        graph.close()
+
+
+class BrokenSiteHandler(QuietHandler):
+    def do_GET(self):
+        if self.path == "/index.html":
+            self.send_body(b'<html><body><img src="img/logo.png"><img src="img/gone.png">'
+                           b'<a href="about.html">About</a><a href="missing.html">Missing</a></body></html>')
+        elif self.path == "/about.html":
+            self.send_body(b'<html><body><a href="index.html">Home</a></body></html>')
+        elif self.path == "/orphan.html":
+            self.send_body(b'<html><body><a href="about.html">About</a></body></html>')
+        elif self.path == "/img/logo.png":
+            self.send_body(b"\x89PNG not really", "image/png")
+        else:
+            self.send_body(b"Not found", "text/plain", 404)
+
+    do_HEAD = do_GET
+
+
+def test_crawl_reports_broken_links_and_orphans(serve, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    base_url = serve(BrokenSiteHandler)
+    graph_path = str(tmp_path / "site.links.sqlite")
+
+    website_cloner.clone_website(base_url + "/index.html", "site", 0, 0, headless=True, link_graph_path=graph_path,
+                                 seeds=[base_url + "/orphan.html"])
+
+    graph = LinkGraph(graph_path)
+    try:
+        assert graph.broken_links() == [(base_url + "/index.html", base_url + "/img/gone.png", FETCH_FAILED),
+                                        (base_url + "/index.html", base_url + "/missing.html", 404)]
+        assert graph.orphans() == [base_url + "/orphan.html"]
+        assert graph.orphans([base_url + "/orphan.html"]) == []
+        assert graph.affected_pages([base_url + "/img/logo.png"]) == [base_url + "/index.html"]
+    finally:
+        graph.close()
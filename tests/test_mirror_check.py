@@ -0,0 +1,16 @@
+import mirror_check
+
+
+def test_srcset_references_without_space_after_the_comma():
+    page = b'<img srcset="img/b-1x.png 1x,img/b-2x.png 2x, img/c.png (max-width: 1x, 2x) 3x">'
+    assert list(mirror_check.reference_values(page)) == ["img/b-1x.png", "img/b-2x.png", "img/c.png"]
+
+
+def test_missing_srcset_candidate_is_reported(tmp_path):
+    (tmp_path / "img").mkdir()
+    (tmp_path / "img" / "b-1x.png").write_bytes(b"png")
+    (tmp_path / "index.html").write_bytes(b'<img srcset="img/b-1x.png 1x,img/b-2x.png 2x">')
+
+    report = mirror_check.verify_mirror(str(tmp_path), workers=1)
+
+    assert list(report.missing) == [str(tmp_path / "img" / "b-2x.png")]
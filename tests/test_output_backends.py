@@ -0,0 +1,148 @@
+import gzip
+import json
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from output_backends import create_output
+
+FILES = {
+    'example.com/index.html': b'<html><body>Home</body></html>',
+    'example.com/css/site.css': b'body { color: black }',
+    'example.com/img/logo.png': bytes(range(256)) * 40,
+}
+ARCHIVES = {'zip': '.zip', 'tar.zst': '.tar.zst', 'warc': '.warc.gz'}
+
+
+def write_files(output, folder, files):
+    for name, data in files.items():
+        path = os.path.join(folder, *name.split('/'))
+        output.makedirs(os.path.dirname(path))
+        if name.endswith('.png'):
+            # Downloads arrive through a staging file
+            temp_path = output.temp_path(path)
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            output.commit(temp_path, path, f"https://{name}", 'image/png')
+        else:
+            output.write(path, data, f"https://{name}", 'text/html')
+
+
+def warc_records(data):
+    """Mirror path -> payload of each resource record in an uncompressed WARC"""
+    records = {}
+    while data:
+        head, data = data.split(b'\r\n\r\n', 1)
+        fields = dict(line.split(': ', 1) for line in head.decode().split('\r\n')[1:])
+        size = int(fields['Content-Length'])
+        if fields['WARC-Type'] == 'resource':
+            records[fields['WARC-X-Mirror-Path']] = data[:size]
+        data = data[size + 4:]
+    return records
+
+
+def read_back(output_format, folder):
+    """Every file stored by an output backend, read back with the standard tools for its format"""
+    if output_format == 'dir':
+        return {os.path.relpath(os.path.join(root, name), folder).replace(os.sep, '/'):
+                open(os.path.join(root, name), 'rb').read()
+                for root, _, names in os.walk(folder) for name in names}
+    path = folder + ARCHIVES[output_format]
+    if output_format == 'zip':
+        with zipfile.ZipFile(path) as archive:
+            return {name: archive.read(name) for name in archive.namelist()}
+    if output_format == 'tar.zst':
+        import zstandard
+        with open(path, 'rb') as f, zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True) as stream:
+            with tarfile.open(fileobj=stream, mode='r|') as archive:
+                return {member.name: archive.extractfile(member).read() for member in archive}
+    with gzip.open(path) as f:
+        return warc_records(f.read())
+
+
+@pytest.mark.parametrize('output_format', ['dir', 'zip', 'tar.zst', 'warc'])
+def test_files_round_trip(tmp_path, output_format):
+    folder = str(tmp_path / 'site')
+    output = create_output(output_format, folder)
+    write_files(output, folder, FILES)
+    output.close()
+
+    assert read_back(output_format, folder) == FILES
+
+
+@pytest.mark.parametrize('output_format', ['zip', 'tar.zst', 'warc'])
+def test_reopened_archive_keeps_its_members(tmp_path, output_format):
+    folder = str(tmp_path / 'site')
+    first = dict(list(FILES.items())[:2])
+    output = create_output(output_format, folder)
+    write_files(output, folder, first)
+    output.close()
+
+    output = create_output(output_format, folder)
+    assert output.exists(os.path.join(folder, 'example.com', 'index.html'))
+    write_files(output, folder, FILES)
+    output.close()
+
+    assert read_back(output_format, folder) == FILES
+    with open(folder + ARCHIVES[output_format] + '.index.jsonl', encoding='utf-8') as f:
+        assert sorted(json.loads(line)['path'] for line in f) == sorted(FILES)
+
+
+@pytest.mark.parametrize('output_format', ['tar.zst', 'warc'])
+def test_index_locates_each_member(tmp_path, output_format):
+    folder = str(tmp_path / 'site')
+    output = create_output(output_format, folder)
+    write_files(output, folder, FILES)
+    output.close()
+
+    path = folder + ARCHIVES[output_format]
+    with open(path + '.index.jsonl', encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f]
+    with open(path, 'rb') as f:
+        for entry in entries:
+            f.seek(entry['offset'])
+            member = f.read(entry['length'])
+            if output_format == 'warc':
+                payload = warc_records(gzip.decompress(member))[entry['path']]
+            else:
+                import zstandard
+                payload = zstandard.ZstdDecompressor().decompressobj().decompress(member)[512:][:entry['size']]
+            assert payload == FILES[entry['path']]
+
+
+def test_index_is_flushed_before_close(tmp_path, monkeypatch):
+    monkeypatch.setattr('output_backends.ArchiveOutput.flush_interval', 0)
+    folder = str(tmp_path / 'site')
+    output = create_output('warc', folder)
+    write_files(output, folder, FILES)
+
+    with open(folder + '.warc.gz.index.jsonl', encoding='utf-8') as f:
+        assert len(f.readlines()) == len(FILES)
+    output.close()
+
+
+def truncate(data):
+    # Lose the central directory, as a run that crashed would
+    return data[:len(data) // 2]
+
+
+def break_central_directory(data):
+    start = data.index(b'PK\x01\x02')
+    return data[:start] + b'XX' + data[start + 2:]
+
+
+@pytest.mark.parametrize('damage', [truncate, break_central_directory])
+def test_damaged_zip_is_refused_with_a_value_error(tmp_path, damage):
+    folder = str(tmp_path / 'site')
+    output = create_output('zip', folder)
+    write_files(output, folder, FILES)
+    output.close()
+    with open(folder + '.zip', 'rb') as f:
+        data = f.read()
+    with open(folder + '.zip', 'wb') as f:
+        f.write(damage(data))
+
+    with pytest.raises(ValueError, match='Cannot append'):
+        create_output('zip', folder)
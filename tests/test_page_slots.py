@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+from conftest import QuietHandler
+
+import website_cloner
+from output_backends import DirectoryOutput
+from url_inventory import UrlInventory
+
+PAGE = ('<html><head><link rel="stylesheet" href="/style.css"></head><body>'
+        + "".join(f"<p>Paragraph {n}</p>" for n in range(200)) + '</body></html>').encode()
+
+
+def slow_body_handler():
+    """Handler sending page bodies in slow parts, counting how many are in flight at once"""
+    state = {'active': 0, 'most': 0, 'lock': threading.Lock()}
+
+    class SlowBodyHandler(QuietHandler):
+        def do_GET(self):
+            if self.path == '/style.css':
+                self.send_body(b'body { color: red }', 'text/css')
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(PAGE)))
+            self.end_headers()
+            self.wfile.flush()
+            with state['lock']:
+                state['active'] += 1
+                state['most'] = max(state['most'], state['active'])
+            part = len(PAGE) // 4 + 1
+            try:
+                for start in range(0, len(PAGE), part):
+                    time.sleep(0.05)
+                    self.wfile.write(PAGE[start:start + part])
+                    self.wfile.flush()
+            except ConnectionError:
+                # The client hung up without reading the whole page
+                self.close_connection = True
+            finally:
+                with state['lock']:
+                    state['active'] -= 1
+
+    return SlowBodyHandler, state
+
+
+def crawl(url, base_url, folder, output=None):
+    return website_cloner.crawl_page(url, base_url, str(folder), website_cloner.RateLimiter(0, 0),
+                                     website_cloner.WebsiteStats(), website_cloner.NullLive(),
+                                     output or DirectoryOutput(str(folder)))
+
+
+@pytest.mark.parametrize('stream_threshold', [0, 256])
+def test_page_bodies_are_read_inside_the_host_slot(serve, tmp_path, monkeypatch, stream_threshold):
+    monkeypatch.setitem(website_cloner.html_settings, 'stream_threshold', stream_threshold)
+    handler, state = slow_body_handler()
+    base_url = serve(handler)
+    website_cloner.scheduler.configure(per_host=1)
+
+    threads = [threading.Thread(target=crawl, args=(f"{base_url}/page{n}.html", f"{base_url}/", tmp_path))
+               for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=20)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert state['most'] == 1
+    # The slot was given back before the page's own stylesheet needed one
+    assert (tmp_path / "style.css").exists()
+    assert all((tmp_path / f"page{n}.html").exists() for n in range(4))
+
+
+def test_every_page_response_is_closed(serve, tmp_path, monkeypatch):
+    handler, _ = slow_body_handler()
+    base_url = serve(handler)
+    responses = []
+    send = website_cloner.session.request
+
+    def recording_request(*args, **kwargs):
+        response = send(*args, **kwargs)
+        responses.append(response)
+        return response
+
+    monkeypatch.setattr(website_cloner.session, 'request', recording_request)
+    output = DirectoryOutput(str(tmp_path))
+    monkeypatch.setattr(output, 'makedirs', lambda path: False)
+    assert crawl(f"{base_url}/page.html", f"{base_url}/", tmp_path, output) == []
+    inventory = UrlInventory(str(tmp_path / "inventory.jsonl"))
+    website_cloner.map_page(f"{base_url}/page.html", f"{base_url}/", 0, website_cloner.RateLimiter(0, 0),
+                            website_cloner.WebsiteStats(), inventory, set())
+    inventory.close()
+
+    assert len(responses) >= 2
+    assert all(response.raw.closed for response in responses)
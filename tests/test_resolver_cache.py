@@ -0,0 +1,21 @@
+import socket
+
+import resolver_cache
+from resolver_cache import DnsCache
+
+
+def test_resolver_is_chosen_on_first_lookup(monkeypatch):
+    chosen = []
+
+    def fake_default_resolver():
+        chosen.append(True)
+        return lambda host, port: ([(socket.AF_INET, "192.0.2.1")], 60)
+
+    monkeypatch.setattr(resolver_cache, "default_resolver", fake_default_resolver)
+    cache = DnsCache()
+    assert chosen == []
+
+    assert cache.resolve("example.test") == [(socket.AF_INET, "192.0.2.1")]
+    assert cache.resolve("example.test") == [(socket.AF_INET, "192.0.2.1")]
+    assert chosen == [True]
+    assert (cache.lookups, cache.hits) == (1, 1)
@@ -0,0 +1,62 @@
+import json
+import re
+import threading
+
+import pytest
+from conftest import QuietHandler
+
+import website_cloner
+from output_backends import DirectoryOutput
+
+BODY = bytes(range(256)) * 40
+ETAG = '"v2"'
+
+
+class RangeHandler(QuietHandler):
+    def do_GET(self):
+        match = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        if match and self.headers.get('If-Range') == ETAG:
+            start = int(match.group(1))
+            if start >= len(BODY):
+                self.send_body(b'', status=416, headers={'Content-Range': f'bytes */{len(BODY)}'})
+                return
+            self.send_body(BODY[start:], 'application/octet-stream', 206,
+                           {'Content-Range': f'bytes {start}-{len(BODY) - 1}/{len(BODY)}', 'ETag': ETAG})
+            return
+        self.send_body(BODY, 'application/octet-stream', headers={'ETag': ETAG, 'Accept-Ranges': 'bytes'})
+
+
+def fetch_with_timeout(url, save_path):
+    result = {}
+
+    def run():
+        result['size'] = website_cloner.fetch_to_file(url, str(save_path), output=DirectoryOutput())
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive(), "fetch_to_file deadlocked"
+    return result['size']
+
+
+@pytest.mark.parametrize("adaptive", [False, True])
+def test_stale_partial_answered_with_416_is_fetched_again(serve, tmp_path, adaptive):
+    website_cloner.scheduler.configure(per_host=1, adaptive=adaptive)
+    url = serve(RangeHandler) + "/file.bin"
+    save_path = tmp_path / "file.bin"
+    # An earlier run left more bytes than the file now has
+    (tmp_path / "file.bin.tmp").write_bytes(b'x' * (len(BODY) + 100))
+    (tmp_path / "file.bin.tmp.meta").write_text(json.dumps({'url': url, 'etag': ETAG, 'last_modified': None}))
+
+    assert fetch_with_timeout(url, save_path) == len(BODY)
+    assert save_path.read_bytes() == BODY
+    assert not (tmp_path / "file.bin.tmp.meta").exists()
+
+
+def test_partial_download_is_resumed(serve, tmp_path):
+    url = serve(RangeHandler) + "/file.bin"
+    (tmp_path / "file.bin.tmp").write_bytes(BODY[:1000])
+    (tmp_path / "file.bin.tmp.meta").write_text(json.dumps({'url': url, 'etag': ETAG, 'last_modified': None}))
+
+    assert fetch_with_timeout(url, tmp_path / "file.bin") == len(BODY)
+    assert (tmp_path / "file.bin").read_bytes() == BODY
@@ -0,0 +1,69 @@
+import time
+
+from conftest import QuietHandler
+
+import website_cloner
+from output_backends import DirectoryOutput
+from retry_queue import RetryQueue, parse_retry_policy
+
+
+def test_deferrals_do_not_use_up_attempts():
+    queue = RetryQueue(parse_retry_policy(["network=1:0"]))
+    for _ in range(10):
+        assert queue.schedule("http://down.test/a.css", lambda: [], retry_after=0, deferral=True)
+        assert [url for url, _ in queue.due()] == ["http://down.test/a.css"]
+    assert queue.attempts == {}
+    assert queue.schedule("http://down.test/a.css", lambda: [])
+    assert not queue.schedule("http://down.test/a.css", lambda: [])
+    assert [entry["url"] for entry in queue.unrecoverable] == ["http://down.test/a.css"]
+
+
+def test_retries_follow_the_policy_backoff():
+    queue = RetryQueue(parse_retry_policy(["5xx=2:10"]))
+    started = time.monotonic()
+    assert queue.schedule("http://site.test/a", lambda: [], status=503)
+    assert 5 <= queue.wait_time() <= 10
+    assert queue.schedule("http://site.test/b", lambda: [], status=503, retry_after=60)
+    due_at = sorted(entry[0] - started for entry in queue.heap)
+    assert 60 <= due_at[1] <= 61
+    assert not queue.schedule("http://site.test/c", lambda: [], status=404)
+    assert queue.waiting() == 2
+
+
+def outage_handler(seconds):
+    """503 for every request during the first `seconds` after the first one, then the asset"""
+    state = {}
+
+    class OutageHandler(QuietHandler):
+        def do_GET(self):
+            started = state.setdefault('started', time.monotonic())
+            if time.monotonic() - started < seconds:
+                self.send_body(b'down', 'text/plain', 503)
+            else:
+                self.send_body(b'body { color: black }', 'text/css')
+
+    return OutageHandler
+
+
+def test_assets_queued_behind_an_open_circuit_recover(serve, tmp_path, monkeypatch):
+    monkeypatch.setitem(website_cloner.circuit_settings, 'failures', 2)
+    monkeypatch.setitem(website_cloner.circuit_settings, 'open_seconds', 0.2)
+    monkeypatch.setitem(website_cloner.circuit_settings, 'max_open_seconds', 0.2)
+    website_cloner.scheduler.configure()
+    base_url = serve(outage_handler(1.0))
+    # A request that never goes out must not count against the single network attempt
+    retry_queue = RetryQueue(parse_retry_policy(["5xx=10:0.05", "network=1:0.05"]))
+    output = DirectoryOutput(str(tmp_path))
+    stats = website_cloner.WebsiteStats()
+    for n in range(6):
+        website_cloner.download_resource(f"{base_url}/{n}.css", str(tmp_path / f"{n}.css"), stats=stats,
+                                         output=output, retry_queue=retry_queue)
+
+    deadline = time.monotonic() + 20
+    while retry_queue.waiting() and time.monotonic() < deadline:
+        retry_queue.run_due()
+        time.sleep(min(retry_queue.wait_time() or 0, 0.05))
+
+    assert retry_queue.unrecoverable == []
+    assert stats.errors == 0
+    assert sorted(path.name for path in tmp_path.glob("*.css")) == [f"{n}.css" for n in range(6)]
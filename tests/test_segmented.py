@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+
+import pytest
+from conftest import QuietHandler
+
+import website_cloner
+
+BODY = os.urandom(64 * 1024)
+
+
+def range_handler(honour_ranges=True, advertise_ranges=True):
+    """Handler serving BODY, recording each request's Range header and how many bodies are in flight"""
+    state = {'ranges': [], 'active': 0, 'most': 0, 'lock': threading.Lock()}
+
+    class RangeHandler(QuietHandler):
+        def do_GET(self):
+            requested = self.headers.get('Range')
+            state['ranges'].append(requested)
+            headers = {'ETag': '"v1"'}
+            if advertise_ranges:
+                headers['Accept-Ranges'] = 'bytes'
+            if requested and honour_ranges:
+                start, end = (int(n) for n in requested.split('=')[1].split('-'))
+                body = BODY[start:end + 1]
+                headers['Content-Range'] = f'bytes {start}-{end}/{len(BODY)}'
+                status = 206
+            else:
+                body = BODY
+                status = 200
+            with state['lock']:
+                state['active'] += 1
+                state['most'] = max(state['most'], state['active'])
+            try:
+                time.sleep(0.05)
+                self.send_body(body, 'application/octet-stream', status, headers)
+            finally:
+                with state['lock']:
+                    state['active'] -= 1
+
+    return RangeHandler, state
+
+
+@pytest.fixture
+def segmented(monkeypatch):
+    monkeypatch.setitem(website_cloner.download_settings, 'segments', 4)
+    monkeypatch.setitem(website_cloner.download_settings, 'segment_threshold', 1024)
+
+
+@pytest.mark.parametrize('per_host, most', [(None, 4), (2, 2), (1, 1)])
+def test_ranges_stay_within_the_per_host_limit(serve, tmp_path, segmented, per_host, most):
+    handler, state = range_handler()
+    url = serve(handler) + "/big.bin"
+    website_cloner.scheduler.configure(per_host=per_host)
+    save_path = str(tmp_path / "big.bin")
+
+    website_cloner.fetch_to_file(url, save_path)
+
+    assert open(save_path, 'rb').read() == BODY
+    assert len([r for r in state['ranges'] if r]) == 3
+    assert state['most'] <= most
+
+
+def test_server_without_range_support_is_fetched_whole(serve, tmp_path, segmented):
+    handler, state = range_handler(honour_ranges=False, advertise_ranges=False)
+    url = serve(handler) + "/big.bin"
+    save_path = str(tmp_path / "big.bin")
+
+    website_cloner.fetch_to_file(url, save_path)
+
+    assert open(save_path, 'rb').read() == BODY
+    assert state['ranges'] == [None]
+
+
+def test_server_ignoring_ranges_fails_the_download(serve, tmp_path, segmented):
+    handler, _ = range_handler(honour_ranges=False)
+    url = serve(handler) + "/big.bin"
+    save_path = str(tmp_path / "big.bin")
+
+    with pytest.raises(IOError):
+        website_cloner.fetch_to_file(url, save_path)
+    assert not os.path.exists(save_path)
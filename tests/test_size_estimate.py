@@ -0,0 +1,89 @@
+from collections import namedtuple
+
+import pytest
+from conftest import QuietHandler
+
+import website_cloner
+
+ASSET_SIZE = 2000
+ASSETS = [f"img/photo{n}.png" for n in range(10)]
+
+DiskUsage = namedtuple('DiskUsage', 'total used free')
+
+
+class SizedSiteHandler(QuietHandler):
+    def do_GET(self):
+        if self.path == "/index.html":
+            images = "".join(f'<img src="{asset}">' for asset in ASSETS)
+            self.send_body(f"<html><body>{images}</body></html>".encode())
+        elif self.path.startswith("/img/photo"):
+            self.send_body(b"x" * ASSET_SIZE, "image/png")
+        else:
+            self.send_body(b"Not found", "text/plain", 404)
+
+    do_HEAD = do_GET
+
+
+def free_space(monkeypatch, free):
+    monkeypatch.setattr(website_cloner.shutil, 'disk_usage', lambda path: DiskUsage(free * 2, free, free))
+
+
+@pytest.fixture
+def stats(serve):
+    """WebsiteStats with the site's assets queued and four of them sized by HEAD requests"""
+    base_url = serve(SizedSiteHandler)
+    stats = website_cloner.WebsiteStats()
+    urls = [f"{base_url}/{asset}" for asset in ASSETS]
+    for url in urls:
+        stats.expect(url)
+    website_cloner.sample_resource_sizes(urls, stats=stats, sample=4)
+    return stats
+
+
+def test_sampled_heads_size_the_queue_before_downloading(stats):
+    assert stats.expected_known_count == 4
+    # The six unsized assets count as the average sized one
+    assert stats.get_expected_total() == len(ASSETS) * ASSET_SIZE
+    assert stats.get_progress_percentage() == 0
+
+    stats.downloaded_size = 5 * ASSET_SIZE
+    stats.download_speed = 1000
+    assert stats.get_progress_percentage() == 50
+    assert stats.get_estimated_time_remaining().total_seconds() == 10
+
+
+def test_disk_check_compares_the_estimate_with_free_space(stats, tmp_path, monkeypatch):
+    monkeypatch.setitem(website_cloner.size_settings, 'min_sized', 4)
+    reserve = website_cloner.size_settings['disk_reserve']
+
+    free_space(monkeypatch, reserve + len(ASSETS) * ASSET_SIZE)
+    assert website_cloner.check_disk_space(stats, str(tmp_path)) is None
+    free_space(monkeypatch, reserve + len(ASSETS) * ASSET_SIZE - 1)
+    assert "Not enough disk space" in website_cloner.check_disk_space(stats, str(tmp_path))
+
+    # Too few sized assets to trust the estimate
+    monkeypatch.setitem(website_cloner.size_settings, 'min_sized', 5)
+    assert website_cloner.check_disk_space(stats, str(tmp_path)) is None
+
+
+def test_crawl_ends_with_every_asset_sized(serve, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    base_url = serve(SizedSiteHandler)
+
+    stats = website_cloner.clone_website(base_url + "/index.html", "site", 0, 0, headless=True, link_graph_path=None)
+
+    assert stats.resources_downloaded == len(ASSETS)
+    assert stats.expected_known_count == len(ASSETS)
+    assert stats.get_expected_total() == stats.downloaded_size
+    assert stats.get_progress_percentage() == 100
+
+
+def test_crawl_stops_before_filling_the_disk(serve, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    free_space(monkeypatch, website_cloner.size_settings['disk_reserve'] - 1)
+    base_url = serve(SizedSiteHandler)
+
+    stats = website_cloner.clone_website(base_url + "/index.html", "site", 0, 0, headless=True, link_graph_path=None)
+
+    assert stats.failure.startswith("Not enough disk space")
+    assert stats.resources_downloaded == 0
@@ -0,0 +1,33 @@
+import website_cloner
+
+
+def test_candidates_without_space_after_the_comma():
+    assert website_cloner.parse_srcset("img/b-1x.png 1x,img/b-2x.png 2x") == [
+        ("img/b-1x.png", "1x"), ("img/b-2x.png", "2x")]
+
+
+def test_candidates_separated_by_comma_and_space():
+    assert website_cloner.parse_srcset("a.jpg 480w, b.jpg 800w") == [("a.jpg", "480w"), ("b.jpg", "800w")]
+
+
+def test_trailing_comma_ends_a_candidate_without_descriptor():
+    assert website_cloner.parse_srcset("a.jpg,b.jpg 2x") == [("a.jpg,b.jpg", "2x")]
+    assert website_cloner.parse_srcset("a.jpg, b.jpg 2x") == [("a.jpg", ""), ("b.jpg", "2x")]
+
+
+def test_commas_inside_a_data_url_do_not_split_it():
+    assert website_cloner.parse_srcset("data:image/png;base64,iVBO,Rw0K 1x,big.png 2x") == [("big.png", "2x")]
+
+
+def test_mixed_width_and_density_candidates_rank_the_widths():
+    candidates = website_cloner.parse_srcset("hero@3x.jpg 3x, hero-300.jpg 300w, hero-1200.jpg 1200w, hero.jpg")
+    assert website_cloner.select_srcset_candidates(candidates, 'largest') == [("hero-1200.jpg", "1200w")]
+    assert website_cloner.select_srcset_candidates(candidates, 'smallest') == [("hero-300.jpg", "300w")]
+    assert website_cloner.select_srcset_candidates(candidates, 'largest', max_width=800) == [("hero-300.jpg", "300w")]
+    assert website_cloner.select_srcset_candidates(candidates, 'largest', max_width=100) == [("hero-300.jpg", "300w")]
+
+
+def test_density_candidates_count_a_bare_url_as_1x():
+    candidates = website_cloner.parse_srcset("logo.png, logo@2x.png 2x, logo@0.5x.png 0.5x")
+    assert website_cloner.select_srcset_candidates(candidates, 'largest') == [("logo@2x.png", "2x")]
+    assert website_cloner.select_srcset_candidates(candidates, 'smallest') == [("logo@0.5x.png", "0.5x")]
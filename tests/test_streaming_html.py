@@ -0,0 +1,70 @@
+import pytest
+from bs4 import BeautifulSoup
+from conftest import QuietHandler
+
+import website_cloner
+from output_backends import DirectoryOutput
+
+PAGE = b"""<html><head>
+<link rel="stylesheet" href="assets/site.css">
+<link rel="icon" href="assets/favicon.ico">
+<script src="assets/app.js"></script>
+</head><body>
+<img src="assets/logo.png" data-src="assets/logo-lazy.png">
+<img src="assets/photo.png" srcset="assets/photo-400.png 400w, assets/photo-800.png 800w">
+<div data-bg="url(assets/bg.png)">Lazy background</div>
+<div style="background-image: url(assets/hero.png)">Hero</div>
+<video poster="assets/poster.png"><source src="assets/clip.mp4"></video>
+<a href="about.html">About</a>
+<a href="docs/guide.html#intro">Guide</a>
+<a href="assets/manual.pdf">Manual</a>
+<a href="https://example.org/">Elsewhere</a>
+<a href="#top">Top</a>
+</body></html>"""
+
+# (tag, attribute) pairs whose values either page path may rewrite
+REFERENCES = [('link', 'href'), ('script', 'src'), ('img', 'src'), ('img', 'data-src'), ('img', 'srcset'),
+              ('div', 'data-bg'), ('div', 'style'), ('video', 'poster'), ('source', 'src'), ('a', 'href')]
+
+
+class RichPageHandler(QuietHandler):
+    def do_GET(self):
+        if self.path == "/index.html":
+            self.send_body(PAGE)
+        elif self.path.startswith("/assets/"):
+            self.send_body(b"asset " + self.path.encode(), "application/octet-stream")
+        else:
+            self.send_body(b"Not found", "text/plain", 404)
+
+    do_HEAD = do_GET
+
+
+def references(path):
+    soup = BeautifulSoup(path.read_text(), "html.parser")
+    return [(tag, attr, element[attr].strip()) for tag, attr in REFERENCES
+            for element in soup.find_all(tag) if element.has_attr(attr)]
+
+
+def crawl(base_url, folder):
+    links = website_cloner.crawl_page(f"{base_url}/index.html", f"{base_url}/", str(folder),
+                                      website_cloner.RateLimiter(0, 0), website_cloner.WebsiteStats(),
+                                      website_cloner.NullLive(), DirectoryOutput(str(folder)))
+    saved = sorted(path.relative_to(folder).as_posix() for path in folder.rglob("*") if path.is_file())
+    return sorted(links), saved, references(folder / "index.html")
+
+
+@pytest.mark.parametrize('stream_threshold', [256, 1])
+def test_streamed_page_matches_the_parsed_page(serve, tmp_path, monkeypatch, stream_threshold):
+    base_url = serve(RichPageHandler)
+    monkeypatch.setitem(website_cloner.html_settings, 'stream_threshold', 0)
+    parsed = crawl(base_url, tmp_path / "parsed")
+    monkeypatch.setitem(website_cloner.html_settings, 'stream_threshold', stream_threshold)
+    streamed = crawl(base_url, tmp_path / "streamed")
+
+    links, saved, rewritten = streamed
+    # The same-page #top link counts as a link to index.html itself
+    assert links == [f"{base_url}/{path}" for path in ("about.html", "assets/manual.pdf", "docs/guide.html", "index.html")]
+    assert "assets/photo-800.png" in saved and "assets/photo-400.png" not in saved
+    assert ('div', 'style', 'background-image: url(assets/hero.png)') in rewritten
+    assert ('a', 'href', 'https://example.org/') in rewritten
+    assert streamed == parsed
@@ -0,0 +1,51 @@
+import json
+import threading
+
+class UrlInventory:
+    """
+    JSON lines list of the URLs found by a --map-only crawl, one object per
+    URL: {"url", "kind" ("page", "file" or "asset"), "status", "content_type",
+    "size", "depth", "referrer"}. Status is None when the fetch failed, size
+    comes from Content-Length (or the body read, for pages) and depth counts
+    links from the start URL; an asset sits one deeper than the page using it.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8')
+        self.lock = threading.Lock()
+        self.counts = {'page': 0, 'file': 0, 'asset': 0}
+        self.total_size = 0
+
+    def add(self, url, kind, status=None, content_type=None, size=None, depth=0, referrer=None, error=None):
+        entry = {'url': url, 'kind': kind, 'status': status, 'content_type': content_type, 'size': size,
+                 'depth': depth, 'referrer': referrer}
+        if error:
+            entry['error'] = str(error)
+        with self.lock:
+            self.file.write(json.dumps(entry) + '\n')
+            self.counts[kind] += 1
+            self.total_size += size or 0
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def load_seed_urls(path):
+    """
+    Page URLs to start a crawl from: the pages a --map-only inventory found
+    (status 200, shallowest first), or every line of a plain list of URLs.
+    """
+    pages = []
+    with open(path, encoding='utf-8') as seeds:
+        for line in seeds:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if not line.startswith('{'):
+                pages.append((0, line))
+                continue
+            entry = json.loads(line)
+            if entry.get('kind') == 'page' and entry.get('status') == 200:
+                pages.append((entry.get('depth') or 0, entry['url']))
+    pages.sort(key=lambda page: page[0])
+    return [url for _, url in pages]
@@ -1,32 +1,381 @@
 import requests
-from bs4 import BeautifulSoup
 import os
 import re
 import time
 import random
 import argparse
+import json
+import shutil
+import threading
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack, contextmanager
 from urllib.parse import urljoin, urlparse
-from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn, TimeRemainingColumn
-from rich.panel import Panel
-from rich.table import Table
-from rich.live import Live
-from rich.layout import Layout
-from rich.text import Text
-from rich.style import Style
-from datetime import datetime, timedelta
+from datetime import timedelta
 import logging
-from logging.handlers import RotatingFileHandler
+import codecs
+import html
+from html.parser import HTMLParser
+import queue
+import atexit
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import sys
+from output_backends import DirectoryOutput, OUTPUT_FORMATS, create_output
+from resolver_cache import DnsCache, install_dns_cache
+from link_graph import LinkGraph, FETCH_FAILED
+from dedup import BOILERPLATE_TAGS, DuplicateIndex, PageFingerprint, fingerprint_html, duplicate_reference_html
+from crawl_traps import TrapDetector
+from concurrency import AdaptiveConcurrency
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from retry_queue import DEFAULT_POLICY, RetryQueue, parse_retry_policy, retry_after_seconds
+from http_cache import HttpCache, default_cache_dir
+from url_inventory import UrlInventory, load_seed_urls
+from frontier import Frontier, SeenSet, SpillDatabase
+from mirror_check import HTML_EXTENSIONS, verify_mirror
+from disk_writer import FSYNC_POLICIES, WriteBehindWriter
 
-# Initialize rich console
-console = Console()
+# Rich console, created on first use so headless runs never import rich
+console = None
+
+def get_console():
+    """Return the shared rich console, importing rich on first use"""
+    global console
+    if console is None:
+        from rich.console import Console
+        console = Console()
+    return console
 
 # Define the headers with a common User-Agent
 headers = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 
+def supported_encodings():
+    """
+    Content codings we can decode while streaming: gzip and deflate always,
+    br and zstd only when urllib3 found a Brotli or Zstandard decoder.
+    """
+    try:
+        from urllib3.util.request import ACCEPT_ENCODING
+        return ACCEPT_ENCODING
+    except ImportError:
+        return 'gzip,deflate'
+
+# Negotiate every compression scheme we can decode; responses are decoded as they stream
+headers['Accept-Encoding'] = supported_encodings()
+
+# Tunables for the streaming download path. Files of at least segment_threshold
+# bytes are fetched as `segments` parallel byte ranges.
+download_settings = {
+    'chunk_size': 8192,
+    'segments': 4,
+    'segment_threshold': 32 * 1024 * 1024,
+}
+
+# Write-behind stage between network reads and the disk (see disk_writer.py):
+# up to `buffer` bytes are queued for `threads` writer threads in writes of
+# write_size bytes before fetchers are held back. fsync is 'never', 'file'
+# or 'batch' (files synced together every fsync_interval seconds).
+disk_settings = {
+    'buffer': 32 * 1024 * 1024,
+    'write_size': 1024 * 1024,
+    'fsync': 'never',
+    'fsync_interval': 0.2,
+    'threads': 2,
+}
+
+# Pages of at least stream_threshold bytes are rewritten while they stream in
+# instead of being parsed into a full tree, see stream_process_html().
+html_settings = {
+    'stream_threshold': 16 * 1024 * 1024,
+}
+
+# Duplicate page detection: 'exact' matches byte-identical pages, 'near'
+# also pages whose SimHash signatures (of the text outside nav, header,
+# footer and aside) differ in at most max_distance bits, 'off' disables it.
+dedup_settings = {
+    'mode': 'exact',
+    'max_distance': 3,
+}
+
+# Crawler-trap limits: how many distinct URLs one URL template may contribute
+# once it looks like a trap (0 for no limit), how often a block of path
+# segments may repeat in a row and how many segments a path may have.
+trap_settings = {
+    'budget': 500,
+    'max_repeats': 3,
+    'max_depth': 32,
+}
+
+# Which responsive image candidates to fetch from srcset attributes:
+# 'largest', 'smallest' or 'all'. With max_width set, 'largest' picks the
+# widest candidate that is no wider than max_width pixels.
+image_settings = {
+    'policy': 'largest',
+    'max_width': None,
+}
+
+# Pre-flight sizing: how many unsized assets of each page get a HEAD request
+# up front (they would get one before downloading anyway), and how much disk
+# space must stay free. A crawl whose expected remaining bytes would eat into
+# disk_reserve is stopped once min_sized assets have known sizes.
+size_settings = {
+    'head_sample': 8,
+    'disk_reserve': 256 * 1024 * 1024,
+    'disk_check': True,
+    'min_sized': 20,
+}
+
+# Requests in flight per host: up to `max` (1 fetches one asset at a time),
+# starting from `initial` and adjusted from response latency and 429/5xx
+# rates when adaptive, see concurrency.AdaptiveConcurrency.
+concurrency_settings = {
+    'adaptive': True,
+    'initial': 2,
+    'max': 1,
+    'latency_factor': 2.0,
+}
+
+# Per-host circuit breaker: this many consecutive failures (network errors,
+# timeouts, 429, 5xx) stop requests to a host for open_seconds, doubling up
+# to max_open_seconds while probes keep failing. failures=0 disables it.
+circuit_settings = {
+    'failures': 5,
+    'open_seconds': 30.0,
+    'max_open_seconds': 600.0,
+}
+
+# Deferred retries of failed page and asset fetches, per status class
+# ('429', '5xx', 'network', '4xx'): (attempts, base delay in seconds).
+retry_settings = {
+    'policy': dict(DEFAULT_POLICY),
+}
+
+# Memory budget of a crawl's URL frontier and seen-set together; beyond it
+# they spill to a temporary SQLite file in spill_dir (the system temp
+# directory when None), see frontier.py.
+frontier_settings = {
+    'memory': 64 * 1024 * 1024,
+    'spill_dir': None,
+}
+
+# On-disk HTTP cache of downloaded assets, shared by every run and output folder
+cache_settings = {
+    'enabled': True,
+    'path': default_cache_dir(),
+    'max_bytes': 1024 * 1024 * 1024,
+}
+
+# Log lines go to logs/ and, when console is set, to stdout as well. Only the
+# command line sets it, so library callers do not get their stdout written to.
+log_settings = {
+    'console': False,
+}
+
+# Logger used by module-level helpers until clone_website configures it
+logger = logging.getLogger('website_cloner')
+
+# Shared HTTP session so connections are reused across pages, assets and batch jobs
+session = requests.Session()
+
+# Process-wide DNS cache, hooked into urllib3 by clone_website and clone_batch
+dns_cache = DnsCache()
+
+# Process-wide HTTP cache, opened by get_http_cache() on first use
+http_cache = None
+http_cache_lock = threading.Lock()
+
+def get_http_cache():
+    """Return the shared HTTP cache, opening it on first use; None when disabled or unusable"""
+    global http_cache
+    with http_cache_lock:
+        if http_cache is None and cache_settings['enabled']:
+            try:
+                http_cache = HttpCache(cache_settings['path'], cache_settings['max_bytes'])
+            except (OSError, sqlite3.Error) as e:
+                logger.warning("HTTP cache at %s unavailable, not caching: %s", cache_settings['path'], e)
+                cache_settings['enabled'] = False
+        return http_cache
+
+# Process-wide disk writer, started by get_disk_writer() on first use
+disk_writer = None
+disk_writer_lock = threading.Lock()
+
+def get_disk_writer():
+    """Return the shared write-behind disk writer, starting it from disk_settings on first use"""
+    global disk_writer
+    with disk_writer_lock:
+        if disk_writer is None:
+            disk_writer = WriteBehindWriter(disk_settings['buffer'], disk_settings['write_size'],
+                                            disk_settings['fsync'], disk_settings['fsync_interval'],
+                                            disk_settings['threads'])
+        return disk_writer
+
+def disk_counters_since(start):
+    """The disk writer's counters accumulated since the start snapshot"""
+    return {name: value - start.get(name, 0) for name, value in get_disk_writer().counters().items()}
+
+def configure_connection_pool(max_connections=10, http2=False):
+    """
+    Resize the shared session's connection pools.
+    With http2=True, https:// requests go through the HTTP/2 transport instead,
+    multiplexed over one connection per host (falls back to HTTP/1.1 if httpx is missing).
+    """
+    adapter = requests.adapters.HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if http2:
+        from http2_transport import mount_http2
+        try:
+            mount_http2(session, max_connections)
+        except RuntimeError as e:
+            logger.warning("%s, using HTTP/1.1", e)
+
+class SlotFeedback:
+    """Handle yielded by RequestScheduler.slot() for reporting the response back"""
+    def __init__(self, scheduler, host):
+        self.scheduler = scheduler
+        self.host = host
+        self.started = time.monotonic()
+        self.reported = False
+    
+    def response(self, response):
+        """Report the status and time to headers of the response received in this slot"""
+        self.report(response.status_code)
+    
+    def report(self, status):
+        if self.reported:
+            return
+        self.reported = True
+        if self.scheduler.controller:
+            self.scheduler.controller.observe(self.host, time.monotonic() - self.started, status)
+        if self.scheduler.breaker:
+            self.scheduler.breaker.record(self.host, status)
+
+class RequestScheduler:
+    """
+    Shared concurrency budget for every request made by this process,
+    with an additional cap on concurrent requests to any single host.
+    A limit of None means unlimited. With adaptive=True the per-host cap
+    becomes a ceiling and each host's actual limit is set by an
+    AdaptiveConcurrency controller from the responses reported to slot().
+    The same responses feed the per-host CircuitBreaker, and slot() raises
+    CircuitOpenError for a host whose circuit is open.
+    """
+    def __init__(self, max_concurrent=None, per_host=None, adaptive=False):
+        self.configure(max_concurrent, per_host, adaptive)
+
+    def configure(self, max_concurrent=None, per_host=None, adaptive=False):
+        self.max_concurrent = max_concurrent
+        self.per_host = per_host
+        self.global_slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+        self.host_slots = {}
+        self.lock = threading.Lock()
+        self.controller = None
+        self.breaker = None
+        if circuit_settings['failures']:
+            self.breaker = CircuitBreaker(circuit_settings['failures'], circuit_settings['open_seconds'],
+                                          circuit_settings['max_open_seconds'])
+        if adaptive and per_host:
+            self.controller = AdaptiveConcurrency(min(concurrency_settings['initial'], per_host), maximum=per_host,
+                                                  latency_factor=concurrency_settings['latency_factor'])
+
+    def _host_semaphore(self, host):
+        with self.lock:
+            if host not in self.host_slots:
+                self.host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self.host_slots[host]
+
+    @contextmanager
+    def slot(self, url, blocking=True):
+        """
+        Hold one global slot and one slot for the URL's host while a request runs.
+        Yields a SlotFeedback; callers pass it the response so the adaptive
+        controller can learn from it. A request that raises before reporting
+        counts as a network error. With blocking=False, None is yielded
+        instead of waiting when no slot is free.
+        """
+        host = urlparse(url).netloc
+        if self.breaker:
+            self.breaker.allow(host)
+        if self.global_slots and not self.global_slots.acquire(blocking):
+            yield None
+            return
+        try:
+            if self.controller:
+                window = self.controller.acquire(host, blocking)
+                if window is None:
+                    yield None
+                    return
+                # Latency is timed from here, waiting for the slot is not the server's doing
+                feedback = SlotFeedback(self, host)
+                try:
+                    yield feedback
+                except Exception:
+                    feedback.report(None)
+                    raise
+                finally:
+                    self.controller.release(window)
+            else:
+                host_slots = self._host_semaphore(host) if self.per_host else None
+                if host_slots and not host_slots.acquire(blocking):
+                    yield None
+                    return
+                feedback = SlotFeedback(self, host)
+                try:
+                    yield feedback
+                except Exception:
+                    feedback.report(None)
+                    raise
+                finally:
+                    if host_slots:
+                        host_slots.release()
+        finally:
+            if self.global_slots:
+                self.global_slots.release()
+
+# Process-wide scheduler; unlimited unless batch mode configures it
+scheduler = RequestScheduler()
+
+def http_request(method, url, **kwargs):
+    """
+    Send a request through the shared session inside a scheduler slot.
+    Streaming callers should use streamed_get() so the slot covers the body.
+    """
+    with scheduler.slot(url) as slot:
+        response = session.request(method, url, headers=headers, **kwargs)
+        slot.response(response)
+        return response
+
+@contextmanager
+def streamed_get(url, **kwargs):
+    """
+    GET url with a streamed body, holding its scheduler slot until the block
+    exits and closing the response on the way out. Resources the page refers
+    to must be fetched after leaving the block, as they need slots of their own.
+    """
+    with scheduler.slot(url) as slot:
+        response = session.request('GET', url, headers=headers, stream=True, **kwargs)
+        with response:
+            slot.response(response)
+            yield response
+
+class NullLive:
+    """Stand-in for the rich Live display when running headless"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def update(self, renderable):
+        pass
+
+def refresh_display(live, stats):
+    """Redraw the live statistics panel; does nothing when running headless"""
+    if live and not isinstance(live, NullLive):
+        live.update(get_stats_panel(stats))
+
 class WebsiteStats:
     """Track website cloning statistics"""
     def __init__(self):
@@ -35,14 +384,58 @@ class WebsiteStats:
         self.resources_downloaded = 0
         self.errors = 0
         self.skipped = 0
-        self.unique_urls = set()
+        self.unique_urls = 0
         self.verified_paths = set()
         self.invalid_paths = set()
         self.current_url = ""
         self.current_file = ""
         self.status = "Initializing..."
+        self.failure = None
+        self.transfer_by_type = {}
+        self.filesystem_calls = {}
+        self.transfer_counts = {}
+        self.image_variants_skipped = 0
+        self.dns_lookups = 0
+        self.dns_cache_hits = 0
+        self.filesystem_cache_hits = 0
+        self.disk_counters = {}
+        self.cache_hits = 0
+        self.cache_revalidated = 0
+        self.cache_misses = 0
+        self.cache_bytes_saved = 0
+        self.cache_usage = None
+        self.inventory_path = None
+        self.inventory_counts = {}
+        self.mirror_report = None
+        self.mirror_report_path = None
+        self.mirror_unresolved = 0
+        self.pages_fingerprinted = 0
+        self.duplicates_exact = 0
+        self.duplicates_near = 0
+        self.link_graph_path = None
+        self.link_graph_counts = (0, 0, 0)
+        self.trap_urls_skipped = 0
+        self.throttled_patterns = []
         self.total_size = 0
         self.downloaded_size = 0
+        self.expected_sizes = {}
+        self.expected_known_bytes = 0
+        self.expected_known_count = 0
+        self.frontier_size = 0
+        self.frontier_on_disk = 0
+        self.urls_seen = 0
+        self.urls_spilled = 0
+        self.seen_filter_bytes = 0
+        self.disk_free = None
+        self.concurrency_adjustments = []
+        self.retries_scheduled = 0
+        self.retries_pending = 0
+        self.retries_recovered = 0
+        self.unrecoverable = []
+        self.retry_report_path = None
+        self.concurrency_limits = {}
+        self.circuit_summary = []
+        self.lock = threading.Lock()
         self.download_speed = 0
         self.last_update_time = time.time()
         self.last_downloaded_size = 0
@@ -69,45 +462,138 @@ class WebsiteStats:
         return self.spinner_chars[self.spinner_index]
         
     def add_processed(self):
-        self.pages_processed += 1
+        with self.lock:
+            self.pages_processed += 1
         
     def add_resource(self, size=0):
-        self.resources_downloaded += 1
-        self.total_size += size
-        self.update_download_speed(size)
+        # The bytes themselves are counted as they arrive, see update_download_speed()
+        with self.lock:
+            self.resources_downloaded += 1
+            self.total_size += size
+        
+    def expect(self, url, size=None):
+        """
+        Register an asset the crawl is going to fetch, with its size in bytes
+        when known (Content-Length, a sampled HEAD, or the finished download).
+        A later call with a size replaces an earlier estimate for the same URL.
+        """
+        with self.lock:
+            previous = self.expected_sizes.get(url)
+            if size is None:
+                self.expected_sizes.setdefault(url, None)
+                return
+            if previous is not None:
+                self.expected_known_bytes -= previous
+                self.expected_known_count -= 1
+            self.expected_sizes[url] = size
+            self.expected_known_bytes += size
+            self.expected_known_count += 1
+        
+    def drop_expected(self, url):
+        """Forget an asset that is not going to be downloaded after all"""
+        with self.lock:
+            previous = self.expected_sizes.pop(url, None)
+            if previous is not None:
+                self.expected_known_bytes -= previous
+                self.expected_known_count -= 1
+        
+    def get_expected_total(self):
+        """Expected bytes of every asset seen so far; unsized ones count as the average sized one"""
+        unknown = len(self.expected_sizes) - self.expected_known_count
+        if not self.expected_known_count:
+            return max(self.total_size, self.downloaded_size)
+        average = self.expected_known_bytes / self.expected_known_count
+        return max(int(self.expected_known_bytes + unknown * average), self.downloaded_size)
+        
+    def get_expected_remaining(self):
+        return max(0, self.get_expected_total() - self.downloaded_size)
         
     def add_error(self):
-        self.errors += 1
+        with self.lock:
+            self.errors += 1
         
     def add_skipped(self):
-        self.skipped += 1
+        with self.lock:
+            self.skipped += 1
         
     def add_url(self, url):
-        self.unique_urls.add(url)
+        # Crawled URLs come off a frontier that never queues one twice, so counting them is enough
+        with self.lock:
+            self.unique_urls += 1
         
-    def update_download_speed(self, size):
-        current_time = time.time()
-        time_diff = current_time - self.last_update_time
+    def add_transfer(self, content_type, wire_bytes, decoded_bytes):
+        with self.lock:
+            totals = self.transfer_by_type.setdefault(content_type, [0, 0])
+            totals[0] += wire_bytes
+            totals[1] += decoded_bytes
+            self.transfer_counts[content_type] = self.transfer_counts.get(content_type, 0) + 1
         
-        if time_diff >= 1.0:  # Update speed every second
-            self.download_speed = (self.downloaded_size - self.last_downloaded_size) / time_diff
-            self.last_downloaded_size = self.downloaded_size
-            self.last_update_time = current_time
+    def add_cache_lookup(self, outcome, size=0):
+        """Count an HTTP cache 'hit', 'revalidated' (304) or 'miss'; size is the body served from the cache"""
+        with self.lock:
+            if outcome == 'hit':
+                self.cache_hits += 1
+            elif outcome == 'revalidated':
+                self.cache_revalidated += 1
+            else:
+                self.cache_misses += 1
+            self.cache_bytes_saved += size
+        
+    def add_image_variants_skipped(self, count):
+        with self.lock:
+            self.image_variants_skipped += count
+        
+    def get_dedup_ratio(self):
+        """Share of fingerprinted pages that duplicated an earlier page"""
+        if not self.pages_fingerprinted:
+            return 0.0
+        return (self.duplicates_exact + self.duplicates_near) / self.pages_fingerprinted
+    
+    def get_image_bytes_saved(self):
+        # Estimated from the average size of the images that were downloaded
+        image_bytes = sum(totals[1] for content_type, totals in self.transfer_by_type.items()
+                          if content_type.startswith('image/'))
+        image_count = sum(count for content_type, count in self.transfer_counts.items()
+                          if content_type.startswith('image/'))
+        if not image_count:
+            return 0
+        return int(self.image_variants_skipped * image_bytes / image_count)
+        
+    def get_transfer_totals(self):
+        wire_bytes = sum(totals[0] for totals in self.transfer_by_type.values())
+        decoded_bytes = sum(totals[1] for totals in self.transfer_by_type.values())
+        return wire_bytes, decoded_bytes
         
-        self.downloaded_size += size
+    def get_filesystem_totals(self):
+        """Filesystem calls made with the directory cache, and at least how many the run needed without it"""
+        made = sum(self.filesystem_calls.values())
+        return made, made + self.filesystem_cache_hits
+        
+    def update_download_speed(self, size):
+        with self.lock:
+            current_time = time.time()
+            time_diff = current_time - self.last_update_time
+            
+            if time_diff >= 1.0:  # Update speed every second
+                self.download_speed = (self.downloaded_size - self.last_downloaded_size) / time_diff
+                self.last_downloaded_size = self.downloaded_size
+                self.last_update_time = current_time
+            
+            self.downloaded_size += size
         
     def get_elapsed_time(self):
         return timedelta(seconds=int(time.time() - self.start_time))
         
     def get_estimated_time_remaining(self):
-        if self.download_speed > 0 and self.total_size > self.downloaded_size:
-            remaining_size = self.total_size - self.downloaded_size
+        remaining_size = self.get_expected_remaining()
+        if self.download_speed > 0 and remaining_size:
             return timedelta(seconds=int(remaining_size / self.download_speed))
         return timedelta(seconds=0)
         
     def get_progress_percentage(self):
-        if self.total_size > 0:
-            return (self.downloaded_size / self.total_size) * 100
+        expected_total = self.get_expected_total()
+        if expected_total > 0:
+            return (self.downloaded_size / expected_total) * 100
         return 0
 
 class RateLimiter:
@@ -119,11 +605,17 @@ class RateLimiter:
         self.max_delay = max_delay
         self.last_request_time = 0
         self.debug = debug
+        # Concurrent downloads take their turn, keeping the delays between requests
+        self.lock = threading.Lock()
         
     def wait(self, stats=None):
         """
         Wait an appropriate amount of time since the last request.
         """
+        with self.lock:
+            self._wait(stats)
+            
+    def _wait(self, stats=None):
         current_time = time.time()
         elapsed = current_time - self.last_request_time
         
@@ -144,20 +636,89 @@ class RateLimiter:
             
         self.last_request_time = time.time()
 
-def verify_path_exists(url, rate_limiter=None):
+def verify_path_exists(url, rate_limiter=None, stats=None):
     """
     Verify if a URL path exists by sending a HEAD request.
     Returns True if the path exists, False otherwise.
+    With stats, the Content-Length of an existing path is recorded as its expected size.
     """
     try:
         if rate_limiter:
             rate_limiter.wait()
         
-        response = requests.head(url, headers=headers, allow_redirects=True, timeout=5)
+        response = http_request('HEAD', url, allow_redirects=True, timeout=5)
+        if stats and response.status_code == 200:
+            stats.expect(url, content_length(response))
+        # An overloaded server says nothing about the path; let the download and its retries find out
+        if response.status_code == 429 or response.status_code >= 500:
+            return True
         return response.status_code == 200
+    except CircuitOpenError:
+        # The host is down, not the path
+        return True
     except:
         return False
 
+def retry_delay(error):
+    """Seconds a failed request asked to be left alone: its Retry-After, or until its host's circuit probes"""
+    if error.response is not None:
+        return retry_after_seconds(error.response.headers.get('Retry-After'))
+    return getattr(error, 'retry_after', None)
+
+def content_length(response):
+    """Declared body size of a response, or None when missing or malformed"""
+    try:
+        return int(response.headers['Content-Length'])
+    except (KeyError, ValueError):
+        return None
+
+def sample_resource_sizes(urls, rate_limiter=None, stats=None, sample=None):
+    """
+    Size up to `sample` of the given not yet sized assets with HEAD requests,
+    so the expected total of a page's assets is known before its downloads
+    start. The outcome is kept in stats.verified_paths / invalid_paths, which
+    lets download_resource() skip its own HEAD for these URLs.
+    """
+    sample = size_settings['head_sample'] if sample is None else sample
+    if not stats or not sample:
+        return
+    unsized = [url for url in urls if stats.expected_sizes.get(url) is None
+               and urlparse(url).path not in stats.verified_paths
+               and urlparse(url).path not in stats.invalid_paths]
+    for url in random.sample(unsized, min(sample, len(unsized))):
+        path = urlparse(url).path
+        if verify_path_exists(url, rate_limiter, stats):
+            stats.verified_paths.add(path)
+        else:
+            stats.invalid_paths.add(path)
+
+def nearest_existing_dir(path):
+    path = os.path.abspath(path)
+    while not os.path.isdir(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return path
+
+def check_disk_space(stats, folder):
+    """
+    Compare the expected remaining download with the free space under folder.
+    Returns an error message when the rest of the crawl is not going to fit
+    (keeping disk_reserve free), or None. The estimate is only trusted once
+    min_sized assets have known sizes; below that only a disk already inside
+    the reserve stops the crawl.
+    """
+    if not size_settings['disk_check']:
+        return None
+    try:
+        stats.disk_free = shutil.disk_usage(nearest_existing_dir(folder)).free
+    except OSError:
+        return None
+    remaining = stats.get_expected_remaining() if stats.expected_known_count >= size_settings['min_sized'] else 0
+    if stats.disk_free - remaining >= size_settings['disk_reserve']:
+        return None
+    return (f"Not enough disk space: about {remaining / (1024*1024):.1f} MB still to download, "
+            f"{stats.disk_free / (1024*1024):.1f} MB free, "
+            f"{size_settings['disk_reserve'] / (1024*1024):.0f} MB must stay free")
+
 def verify_directory_exists(url, rate_limiter=None):
     """
     Verify if a directory exists by checking the parent path.
@@ -170,33 +731,413 @@ def verify_directory_exists(url, rate_limiter=None):
     parent_url = f"{parsed.scheme}://{parsed.netloc}{parent_path}"
     return verify_path_exists(parent_url, rate_limiter)
 
-def download_resource(url, save_path, rate_limiter=None, stats=None, max_retries=3, live_display=None):
+def parse_content_range(value):
+    """
+    Parse a Content-Range header such as "bytes 100-199/1000" or "bytes */1000".
+    Returns (start, end, total); unknown parts are None.
+    """
+    match = re.match(r'bytes\s+(?:(\d+)-(\d+)|\*)/(\d+|\*)', value or '')
+    if not match:
+        return None, None, None
+    start, end, total = match.groups()
+    return (int(start) if start is not None else None,
+            int(end) if end is not None else None,
+            int(total) if total and total != '*' else None)
+
+def load_partial_download(temp_path, url, output=None):
+    """
+    Check for a resumable partial download left in temp_path by an earlier attempt or run.
+    Returns (offset, validator) where validator is the ETag or Last-Modified value
+    to send as If-Range, or (0, None) when the download must start from scratch.
+    """
+    output = output or DirectoryOutput()
+    if not output.staged_exists(temp_path + '.meta'):
+        return 0, None
+    try:
+        with open(temp_path + '.meta', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        offset = os.path.getsize(temp_path)
+    except (OSError, ValueError):
+        return 0, None
+    
+    # Weak ETags cannot be used with If-Range, fall back to Last-Modified
+    etag = meta.get('etag')
+    if etag and etag.startswith('W/'):
+        etag = None
+    validator = etag or meta.get('last_modified')
+    
+    if meta.get('url') != url or not validator or offset == 0:
+        return 0, None
+    return offset, validator
+
+def save_partial_meta(temp_path, url, response, output=None):
+    """Record the validators needed to resume temp_path later, or drop stale ones"""
+    output = output or DirectoryOutput()
+    meta_path = temp_path + '.meta'
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if etag or last_modified:
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'url': url, 'etag': etag, 'last_modified': last_modified}, f)
+        output.note_file(meta_path)
+    elif output.staged_exists(meta_path):
+        os.remove(meta_path)
+        output.forget_file(meta_path)
+
+def discard_partial_download(temp_path, output=None):
+    """Remove a partial download and its resume metadata"""
+    output = output or DirectoryOutput()
+    for path in (temp_path, temp_path + '.meta'):
+        if output.staged_exists(path):
+            os.remove(path)
+            output.forget_file(path)
+
+def record_transfer(stats, response, decoded_bytes):
+    """
+    Attribute a finished response's bytes on the wire and after decoding
+    to its content type in the stats.
+    """
+    if not stats:
+        return
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower() or 'unknown'
+    try:
+        wire_bytes = response.raw.tell()
+    except Exception:
+        wire_bytes = 0
+    stats.add_transfer(content_type, wire_bytes or decoded_bytes, decoded_bytes)
+
+def use_segmented_download(response):
+    """
+    Decide whether a full 200 response is worth splitting into parallel byte ranges:
+    it must be large, of known length, unencoded and served with range support.
+    """
+    segments = download_settings['segments']
+    threshold = download_settings['segment_threshold']
+    if segments < 2 or threshold is None:
+        return False
+    if response.status_code != 200 or response.headers.get('Content-Encoding'):
+        return False
+    if response.headers.get('Accept-Ranges', '').lower() != 'bytes':
+        return False
+    if not (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+        return False
+    try:
+        total_size = int(response.headers.get('Content-Length', 0))
+    except ValueError:
+        return False
+    return total_size >= max(threshold, segments)
+
+def download_segmented(url, temp_path, response, on_chunk=None, output=None):
+    """
+    Fetch a large file as several byte ranges over parallel connections.
+    The already-open response supplies the first segment, the others are requested
+    with Range + If-Range and written in place into a preallocated temp file,
+    each through its own handle on the disk writer.
+    Each extra connection runs in a scheduler slot of its own, taken without
+    waiting; ranges left over for want of a free slot are fetched in turn
+    under the caller's slot, so the per-host limit is never exceeded.
+    Returns the size of the file.
+    """
+    total_size = int(response.headers['Content-Length'])
+    validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+    if validator.startswith('W/'):
+        validator = response.headers.get('Last-Modified') or validator
+    segments = download_settings['segments']
+    chunk_size = download_settings['chunk_size']
+    segment_size = -(-total_size // segments)
+    ranges = [(start, min(start + segment_size, total_size) - 1)
+              for start in range(0, total_size, segment_size)]
+    
+    # A preallocated file would look complete to the resume logic, so drop its metadata
+    discard_partial_download(temp_path, output)
+    with open(temp_path, 'wb') as f:
+        f.truncate(total_size)
+    if output:
+        output.note_file(temp_path)
+    
+    progress_lock = threading.Lock()
+    downloaded = 0
+    writer = get_disk_writer()
+    
+    def fetch_range(start, end, range_response=None, slot=None):
+        nonlocal downloaded
+        if range_response is None:
+            range_headers = dict(headers)
+            range_headers['Range'] = f'bytes={start}-{end}'
+            range_headers['If-Range'] = validator
+            range_response = session.get(url, headers=range_headers, stream=True)
+            if slot:
+                slot.response(range_response)
+            range_response.raise_for_status()
+            range_start, _, _ = parse_content_range(range_response.headers.get('Content-Range'))
+            if range_response.status_code != 206 or range_start != start:
+                range_response.close()
+                raise IOError(f"Server did not honour range {start}-{end} for {url}")
+        
+        remaining = end - start + 1
+        try:
+            with writer.open(temp_path, 'r+b', start) as f:
+                for chunk in range_response.iter_content(chunk_size=chunk_size):
+                    if not chunk:
+                        continue
+                    chunk = chunk[:remaining]
+                    f.write(chunk)
+                    remaining -= len(chunk)
+                    with progress_lock:
+                        downloaded += len(chunk)
+                        if on_chunk:
+                            on_chunk(len(chunk), downloaded)
+                    if remaining <= 0:
+                        break
+        finally:
+            range_response.close()
+        if remaining > 0:
+            raise IOError(f"Range {start}-{end} of {url} ended {remaining} bytes early")
+    
+    pending = iter(ranges[1:])
+    pending_lock = threading.Lock()
+    failed = threading.Event()
+    
+    def fetch_pending(slot=None):
+        while not failed.is_set():
+            with pending_lock:
+                next_range = next(pending, None)
+            if next_range is None:
+                return
+            try:
+                fetch_range(*next_range, slot=slot)
+            except Exception:
+                failed.set()
+                raise
+    
+    def fetch_in_own_slot():
+        with scheduler.slot(url, blocking=False) as slot:
+            if slot is not None:
+                fetch_pending(slot)
+    
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges) - 1 or 1) as executor:
+            futures = [executor.submit(fetch_in_own_slot) for _ in ranges[1:]]
+            try:
+                fetch_range(*ranges[0], range_response=response)
+                fetch_pending()
+            except Exception:
+                failed.set()
+                raise
+            for future in futures:
+                future.result()
+    except Exception:
+        discard_partial_download(temp_path, output)
+        raise
+    return total_size
+
+def fetch_to_file(url, save_path, on_chunk=None, on_response=None, stats=None, output=None):
+    """
+    Stream a URL into save_path through a temp file that the output backend
+    commits once complete (an atomic rename for plain directory output).
+    A partial temp file from an earlier attempt or run is resumed with a Range
+    request guarded by If-Range, so it is only continued when the remote file is
+    unchanged; servers that ignore ranges simply send the whole file again.
+    on_response(response) is called once the response headers are in and
+    on_chunk(chunk_size, bytes_so_far) for every chunk received.
+    Large files are split into parallel byte ranges, see download_segmented().
+    Wire and decoded byte counts are recorded in stats when given.
+    A stale copy in the HTTP cache is revalidated with a conditional request
+    and served on 304 Not Modified; complete downloads are offered to the cache.
+    The body is written through the write-behind disk writer (get_disk_writer()).
+    Returns the size of the completed file.
+    """
+    output = output or DirectoryOutput()
+    temp_path = output.temp_path(save_path)
+    offset, validator = load_partial_download(temp_path, url, output)
+    content_type = None
+    cache = get_http_cache()
+    cached = None
+    cacheable = False
+    
+    restart = False
+    
+    request_headers = dict(headers)
+    if offset:
+        request_headers['Range'] = f'bytes={offset}-'
+        request_headers['If-Range'] = validator
+    elif cache:
+        cached = cache_lookup(url)
+        if cached:
+            request_headers.update(cached.validators())
+    
+    # Hold a scheduler slot for the whole streamed transfer
+    with scheduler.slot(url) as slot:
+        response = session.get(url, headers=request_headers, stream=True)
+        slot.response(response)
+        
+        if cached and response.status_code == 304:
+            response.close()
+        elif offset and response.status_code == 416:
+            # Nothing left to fetch if the partial file already has every byte
+            _, _, total = parse_content_range(response.headers.get('Content-Range'))
+            response.close()
+            # Otherwise start over, after giving back the slot the new request needs
+            restart = total != offset
+        else:
+            response.raise_for_status()
+            content_type = response.headers.get('Content-Type')
+            
+            start, _, _ = parse_content_range(response.headers.get('Content-Range'))
+            if offset and response.status_code == 206 and start == offset:
+                mode = 'ab'
+            else:
+                # Full response: the server ignored the range or the file changed
+                offset = 0
+                mode = 'wb'
+                save_partial_meta(temp_path, url, response, output)
+            
+            if on_response:
+                on_response(response)
+            cacheable = True
+            
+            if mode == 'wb' and use_segmented_download(response):
+                total_size = download_segmented(url, temp_path, response, on_chunk, output)
+                if stats:
+                    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower() or 'unknown'
+                    stats.add_transfer(content_type, total_size, total_size)
+                offset = total_size
+            else:
+                downloaded = offset
+                output.note_file(temp_path)
+                # Chunks are written behind by the disk writer; leaving the block waits for them
+                with get_disk_writer().open(temp_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=download_settings['chunk_size']):
+                        if chunk:
+                            f.write(chunk)
+                            downloaded += len(chunk)
+                            if on_chunk:
+                                on_chunk(len(chunk), downloaded)
+                record_transfer(stats, response, downloaded - offset)
+                offset = downloaded
+    
+    if restart:
+        discard_partial_download(temp_path, output)
+        return fetch_to_file(url, save_path, on_chunk, on_response, stats, output)
+    
+    if cached and response.status_code == 304:
+        try:
+            cache.refresh(cached, response.headers)
+        except sqlite3.Error as e:
+            logger.debug("Could not refresh the cache entry of %s: %s", url, e)
+        size = serve_from_cache(cached, url, save_path, output)
+        if size is None:
+            # Evicted since the lookup, fetch it for real
+            return fetch_to_file(url, save_path, on_chunk, on_response, stats, output)
+        if stats:
+            stats.add_cache_lookup('revalidated', size)
+        return size
+    
+    if cache and cacheable:
+        if stats:
+            stats.add_cache_lookup('miss')
+        try:
+            cache.store(url, cache_request_headers(), response.headers, temp_path)
+        except (OSError, sqlite3.Error) as e:
+            logger.debug("Could not cache %s: %s", url, e)
+    
+    output.commit(temp_path, save_path, url, content_type)
+    if output.staged_exists(temp_path + '.meta'):
+        os.remove(temp_path + '.meta')
+        output.forget_file(temp_path + '.meta')
+    return offset
+
+def cache_request_headers():
+    """Headers every fetch sends, as seen by the Vary matching of the HTTP cache"""
+    return {**session.headers, **headers}
+
+def cache_lookup(url):
+    """Cached response for url, fresh or stale, or None; cache trouble counts as a miss"""
+    try:
+        return get_http_cache().lookup(url, cache_request_headers())
+    except (OSError, sqlite3.Error) as e:
+        logger.debug("HTTP cache lookup of %s failed: %s", url, e)
+        return None
+
+def serve_from_cache(entry, url, save_path, output=None):
+    """
+    Commit the cached body of entry as save_path through the output backend.
+    Returns its size, or None when the body has been evicted meanwhile.
+    """
+    output = output or DirectoryOutput()
+    temp_path = output.temp_path(save_path)
+    output.note_file(temp_path)
+    try:
+        copied = get_http_cache().copy_to(entry, temp_path)
+    except (OSError, sqlite3.Error) as e:
+        logger.debug("Reading %s from the HTTP cache failed: %s", url, e)
+        copied = False
+    if not copied:
+        output.forget_file(temp_path)
+        return None
+    output.commit(temp_path, save_path, url, entry.headers.get('Content-Type'))
+    # A partial download of this path from an earlier run is superseded
+    if output.staged_exists(temp_path + '.meta'):
+        os.remove(temp_path + '.meta')
+        output.forget_file(temp_path + '.meta')
+    return entry.size
+
+def fetch_from_cache(url, save_path, stats=None, output=None):
+    """Commit a fresh cached copy of url as save_path without any request; returns its size, or None on a miss"""
+    if not get_http_cache():
+        return None
+    entry = cache_lookup(url)
+    if not entry or not entry.fresh:
+        return None
+    size = serve_from_cache(entry, url, save_path, output)
+    if size is not None and stats:
+        stats.add_cache_lookup('hit', size)
+        stats.expect(url, size)
+        stats.add_resource(size)
+    return size
+
+def download_resource(url, save_path, rate_limiter=None, stats=None, max_retries=3, live_display=None, output=None,
+                      retry_queue=None, referrer=None):
     """
     Download a resource from the web and save it to a specific path.
+    With a retry_queue, a failure the queue's policy retries is handed to it
+    instead of being retried inline, and None is returned for now.
     """
     # For live updates
     last_update_time = time.time()
     live = live_display
+    # Bytes received for this URL over every attempt
+    received = 0
+    
+    output = output or DirectoryOutput()
     
     try:
-        # Create the directory if it doesn't exist
-        os.makedirs(os.path.dirname(save_path), exist_ok=True)
-        
         # Skip if file already exists
-        if os.path.exists(save_path):
+        if output.exists(save_path):
             if stats:
                 stats.add_skipped()
+                stats.drop_expected(url)
                 stats.update_current_file(f"Skipped (exists): {os.path.basename(save_path)}")
             return save_path
         
+        # A fresh copy in the HTTP cache needs neither the HEAD check nor the download
+        if fetch_from_cache(url, save_path, stats, output) is not None:
+            if stats:
+                stats.update_current_file(f"Cached: {os.path.basename(save_path)}")
+            if retry_queue:
+                retry_queue.succeeded(url)
+            return save_path
+        
         # Check if we've already verified this path exists or not
         parsed_url = urlparse(url)
         if parsed_url.path in stats.invalid_paths:
+            stats.drop_expected(url)
             return None
         elif parsed_url.path not in stats.verified_paths:
             # Verify the path exists before attempting to download
-            if not verify_path_exists(url, rate_limiter):
+            if not verify_path_exists(url, rate_limiter, stats):
                 stats.invalid_paths.add(parsed_url.path)
+                stats.drop_expected(url)
                 return None
             stats.verified_paths.add(parsed_url.path)
             
@@ -207,58 +1148,99 @@ def download_resource(url, save_path, rate_limiter=None, stats=None, max_retries
         if stats:
             stats.update_current_file(f"Downloading: {os.path.basename(save_path)}")
             
-        # Retry loop
-        for attempt in range(max_retries):
-            try:
-                # Get the file with streaming
-                response = requests.get(url, headers=headers, stream=True)
-                response.raise_for_status()
-                
-                # Create a temporary file for atomic write
-                temp_path = save_path + '.tmp'
-                downloaded_size = 0
-                
-                with open(temp_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded_size += len(chunk)
-                            if stats:
-                                stats.update_download_speed(len(chunk))
-                                
-                                # Update display periodically during downloads
-                                if live and time.time() - last_update_time > 0.2:
-                                    live.update(get_stats_panel(stats))
-                                    last_update_time = time.time()
+        def on_response(response):
+            # What is left to fetch, on top of whatever earlier attempts received
+            remaining = content_length(response)
+            if stats and remaining is not None:
+                stats.expect(url, received + remaining)
+        
+        def on_chunk(chunk_size, downloaded):
+            nonlocal last_update_time, received
+            received += chunk_size
+            if stats:
+                stats.update_download_speed(chunk_size)
                 
-                # Atomic rename
-                os.rename(temp_path, save_path)
+                # Update display periodically during downloads
+                if live and time.time() - last_update_time > 0.2:
+                    refresh_display(live, stats)
+                    last_update_time = time.time()
+        
+        # Retry loop, each attempt resumes whatever the previous one left in the temp file.
+        # With a retry queue the later attempts are deferred rather than slept for.
+        attempts = 1 if retry_queue else max_retries
+        for attempt in range(attempts):
+            try:
+                downloaded_size = fetch_to_file(url, save_path, on_chunk, on_response, stats=stats, output=output)
                 
                 if stats:
+                    stats.expect(url, downloaded_size)
                     stats.add_resource(downloaded_size)
                     stats.update_current_file(f"Completed: {os.path.basename(save_path)}")
+                if retry_queue:
+                    retry_queue.succeeded(url)
                 return save_path
                 
             except Exception as e:
-                if attempt < max_retries - 1:
+                if attempt < attempts - 1 and not isinstance(e, CircuitOpenError):
                     if stats:
-                        stats.update_current_file(f"Retry {attempt + 1}/{max_retries}: {os.path.basename(save_path)}")
+                        stats.update_current_file(f"Retry {attempt + 1}/{attempts}: {os.path.basename(save_path)}")
                     time.sleep(2 ** attempt)  # Exponential backoff
                 else:
                     raise e
                     
     except Exception as e:
+        if retry_queue and isinstance(e, requests.exceptions.RequestException):
+            response = e.response
+            def retry():
+                download_resource(url, save_path, rate_limiter, stats, max_retries, live_display, output,
+                                  retry_queue, referrer)
+                return []
+            if retry_queue.schedule(url, retry, response.status_code if response is not None else None, e,
+                                    retry_delay(e), referrer=referrer, deferral=isinstance(e, CircuitOpenError)):
+                if stats:
+                    stats.update_current_file(f"Deferred: {os.path.basename(save_path)}")
+                logger.warning("Fetching %s failed (%s), retrying later", url, e)
+                return None
         if stats:
             stats.add_error()
+            # Nothing more is coming for this URL
+            if received:
+                stats.expect(url, received)
+            else:
+                stats.drop_expected(url)
             stats.update_current_file(f"Error: {os.path.basename(save_path)}")
         if isinstance(e, requests.exceptions.RequestException):
             # Only print 404 errors in debug mode
             if not isinstance(e, requests.exceptions.HTTPError) or e.response.status_code != 404:
-                logger.error(f"Failed to download {url}: {e}")
+                logger.error("Failed to download %s: %s", url, e)
         else:
-            logger.error(f"Failed to download {url}: {e}")
+            logger.error("Failed to download %s: %s", url, e)
         return None
 
+def download_resources(resources, rate_limiter=None, stats=None, live_display=None, output=None, retry_queue=None,
+                       referrer=None):
+    """
+    Download (url, save_path) pairs with download_resource(), several at a
+    time when the scheduler allows more than one request per host; how many
+    of them really run at once is then up to the host's adaptive limit.
+    URLs that map to an already listed path are fetched once.
+    Returns {save_path: saved path or None}.
+    """
+    unique = {}
+    for url, save_path in resources:
+        unique.setdefault(save_path, url)
+    workers = min(len(unique), scheduler.per_host or 1)
+    if workers <= 1:
+        return {save_path: download_resource(url, save_path, rate_limiter, stats, live_display=live_display, output=output,
+                                             retry_queue=retry_queue, referrer=referrer)
+                for save_path, url in unique.items()}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {save_path: executor.submit(download_resource, url, save_path, rate_limiter, stats,
+                                              live_display=live_display, output=output, retry_queue=retry_queue,
+                                              referrer=referrer)
+                   for save_path, url in unique.items()}
+        return {save_path: future.result() for save_path, future in futures.items()}
+
 def validate_and_normalize_path(path, is_directory=False):
     """
     Validate and normalize a file path to ensure it's safe and properly formatted.
@@ -388,11 +1370,110 @@ def get_base_folder_from_url(base_url, output_folder):
     # Default to just the output folder
     return output_folder
 
-def process_html(html_content, page_url, base_url, base_folder, rate_limiter=None, stats=None, live_display=None):
+def parse_srcset(srcset):
+    """
+    Split a srcset value into (url, descriptor) pairs, e.g. "a.jpg 480w, b.jpg 2x"
+    or "a.jpg 1x,b.jpg 2x", as the HTML spec parses it: a URL runs up to
+    whitespace (so it may contain commas, as data: URLs do) less any trailing
+    commas, which end the candidate; otherwise its descriptors run up to the
+    next comma outside parentheses. data: candidates are left out.
+    """
+    candidates = []
+    position, length = 0, len(srcset)
+    while True:
+        while position < length and (srcset[position].isspace() or srcset[position] == ','):
+            position += 1
+        if position >= length:
+            return candidates
+        start = position
+        while position < length and not srcset[position].isspace():
+            position += 1
+        url = srcset[start:position]
+        descriptor = ''
+        if url.endswith(','):
+            url = url.rstrip(',')
+        else:
+            start = position
+            depth = 0
+            while position < length and (srcset[position] != ',' or depth):
+                if srcset[position] == '(':
+                    depth += 1
+                elif srcset[position] == ')' and depth:
+                    depth -= 1
+                position += 1
+            descriptor = ' '.join(srcset[start:position].split())
+        if url and not url.startswith('data:'):
+            candidates.append((url, descriptor))
+
+def select_srcset_candidates(candidates, policy=None, max_width=None):
+    """
+    Pick which srcset candidates to download according to the image policy.
+    Width (w) and density (x) descriptors cannot be compared, so only one kind
+    is ranked: widths when the srcset has any, densities otherwise. A candidate
+    without a descriptor counts as 1x.
+    """
+    policy = policy or image_settings['policy']
+    max_width = max_width if max_width is not None else image_settings['max_width']
+    if policy == 'all' or len(candidates) < 2:
+        return list(candidates)
+    
+    def size_of(candidate):
+        match = re.match(r'^([\d.]+)([wx])$', candidate[1].strip().lower())
+        if not match:
+            return 1.0, 'x'
+        return float(match.group(1)), match.group(2)
+    
+    kind = 'w' if any(size_of(candidate)[1] == 'w' for candidate in candidates) else 'x'
+    ranked = sorted((candidate for candidate in candidates if size_of(candidate)[1] == kind),
+                    key=lambda candidate: size_of(candidate)[0])
+    if policy == 'smallest':
+        return [ranked[0]]
+    
+    if max_width and kind == 'w':
+        fitting = [candidate for candidate in ranked if size_of(candidate)[0] <= max_width]
+        # When every candidate is wider than the cap, take the narrowest
+        return [fitting[-1] if fitting else ranked[0]]
+    return [ranked[-1]]
+
+class SrcsetRewrite:
+    """
+    Pending rewrite of a srcset-style attribute: collects the local paths of
+    the selected candidates and writes back a srcset that only lists local files.
+    """
+    def __init__(self, element, attr, selected, skipped):
+        self.element = element
+        self.attr = attr
+        self.selected = selected
+        self.skipped = skipped
+        self.local_paths = {}
+    
+    def set_local(self, index, relative_path):
+        self.local_paths[index] = relative_path
+    
+    def apply(self):
+        if not self.local_paths:
+            return
+        self.element[self.attr] = ', '.join(
+            f"{self.local_paths[index]} {descriptor}".strip()
+            for index, (url, descriptor) in enumerate(self.selected) if index in self.local_paths
+        )
+
+# Link targets with these extensions are downloaded as resources rather than crawled
+RESOURCE_EXTENSIONS = ['.css', '.js', '.jpg', '.jpeg', '.png', '.gif', '.svg',
+                       '.webp', '.pdf', '.doc', '.docx', '.xls', '.xlsx',
+                       '.zip', '.rar', '.mp3', '.mp4', '.webm', '.ogg', '.wav',
+                       '.ttf', '.woff', '.woff2', '.eot', '.ico', '.json', '.xml']
+
+def process_html(html_content, page_url, base_url, base_folder, rate_limiter=None, stats=None, live_display=None, output=None,
+                 link_graph=None, retry_queue=None):
     """
     Process HTML content: extract links and update resource paths.
+    The page's links and assets are recorded in link_graph when given.
+    Assets whose download was deferred to retry_queue are pointed at their local path already.
     Returns: processed HTML and a list of internal links to follow
     """
+    from bs4 import BeautifulSoup
+    
     soup = BeautifulSoup(html_content, "html.parser")
     internal_links = []
     
@@ -427,7 +1508,7 @@ def process_html(html_content, page_url, base_url, base_folder, rate_limiter=Non
         nonlocal last_update_time
         if live and stats and time.time() - last_update_time > 0.2:
             stats.update_current_file(f"Analyzing: {os.path.basename(url)}")
-            live.update(get_stats_panel(stats))
+            refresh_display(live, stats)
             last_update_time = time.time()
     
     # Collect all resources first
@@ -448,19 +1529,28 @@ def process_html(html_content, page_url, base_url, base_folder, rate_limiter=Non
             if attr in img.attrs:
                 img_url = img[attr]  # Don't use urljoin yet
                 add_to_group(img_url, img, attr)
-        # Also check srcset attribute for responsive images
-        if 'srcset' in img.attrs:
-            srcset = img['srcset']
-            for src_item in srcset.split(','):
-                if src_item.strip():
-                    # Extract URL from srcset format (url size)
-                    src_parts = src_item.strip().split(' ')
-                    if src_parts:
-                        img_url = src_parts[0]  # Don't use urljoin yet
-                        # Create a temporary element for this url
-                        temp_element = soup.new_tag('img')
-                        temp_element['src'] = img_url
-                        add_to_group(img_url, temp_element, 'src')
+    
+    # Responsive images: only fetch the srcset candidates chosen by the image policy
+    srcset_rewrites = []
+    for element in soup.find_all(['img', 'source']):
+        for attr in ['srcset', 'data-srcset']:
+            if attr not in element.attrs:
+                continue
+            candidates = parse_srcset(element[attr])
+            selected = select_srcset_candidates(candidates)
+            rewrite = SrcsetRewrite(element, attr, selected, len(candidates) - len(selected))
+            srcset_rewrites.append(rewrite)
+            for index, (img_url, descriptor) in enumerate(selected):
+                add_to_group(img_url, rewrite, index)
+            if stats:
+                stats.add_image_variants_skipped(rewrite.skipped)
+    
+    # Lazy-loaded background images
+    for element in soup.find_all(attrs={'data-bg': True}):
+        bg_match = re.search(r'url\([\'"]?(.*?)[\'"]?\)', element['data-bg'])
+        bg_url = bg_match.group(1) if bg_match else element['data-bg'].strip()
+        if bg_url and not bg_url.startswith('data:'):
+            add_to_group(bg_url, element, 'data-bg')
     
     # Background images in inline style attributes
     for element in soup.find_all(style=True):
@@ -504,13 +1594,7 @@ def process_html(html_content, page_url, base_url, base_folder, rate_limiter=Non
                 internal_links.append(processed_url)
         
         # Also check if the href is pointing to a resource (non-HTML file)
-        # Common resource extensions that should be downloaded
-        resource_extensions = ['.css', '.js', '.jpg', '.jpeg', '.png', '.gif', '.svg', 
-                            '.webp', '.pdf', '.doc', '.docx', '.xls', '.xlsx', 
-                            '.zip', '.rar', '.mp3', '.mp4', '.webm', '.ogg', '.wav',
-                            '.ttf', '.woff', '.woff2', '.eot', '.ico', '.json', '.xml']
-        
-        if any(processed_url.lower().endswith(ext) for ext in resource_extensions):
+        if any(processed_url.lower().endswith(ext) for ext in RESOURCE_EXTENSIONS):
             add_to_group(link_url, a, 'href')
     
     # Favicons and other link resources
@@ -522,45 +1606,83 @@ def process_html(html_content, page_url, base_url, base_folder, rate_limiter=Non
                 link_url = link['href']  # Don't use urljoin yet
                 add_to_group(link_url, link, 'href')
     
+    # Resolve the hosts of every resource in the background before downloading them
+    dns_cache.prefetch(urlparse(url).hostname for resources in resource_groups.values() for url, _, _ in resources)
+    
+    # Every asset counts as failed until it is downloaded
+    asset_status = {url: FETCH_FAILED for resources in resource_groups.values() for url, _, _ in resources}
+    
+    # Register the assets for the size estimate and size a sample of them up front
+    if stats:
+        for url in asset_status:
+            stats.expect(url)
+        sample_resource_sizes(list(asset_status), rate_limiter, stats)
+    
     # Process resources by directory
+    wanted = []
     for dir_path, resources in resource_groups.items():
         # Update display periodically
         if live and stats and time.time() - last_update_time > 0.2:
             stats.update_status(f"Processing directory: {dir_path}")
-            live.update(get_stats_panel(stats))
+            refresh_display(live, stats)
             last_update_time = time.time()
             
         if dir_path:
-            # Skip entire directory if we know it's invalid
-            if dir_path in stats.invalid_paths:
-                continue
-            
             # Verify directory exists if we haven't checked it yet
-            if dir_path not in stats.verified_paths:
+            if dir_path not in stats.verified_paths and dir_path not in stats.invalid_paths:
                 dir_url = f"{urlparse(base_url).scheme}://{urlparse(base_url).netloc}{dir_path}"
-                if not verify_directory_exists(dir_url, rate_limiter):
+                if verify_directory_exists(dir_url, rate_limiter):
+                    stats.verified_paths.add(dir_path)
+                else:
                     stats.invalid_paths.add(dir_path)
-                    continue
-                stats.verified_paths.add(dir_path)
+            
+            # Skip entire directory if we know it's invalid
+            if dir_path in stats.invalid_paths:
+                for url, _, _ in resources:
+                    stats.drop_expected(url)
+                continue
         
-        # Process resources in verified directories
+        # Resources in verified directories are downloaded together below
         for url, element, attr in resources:
-            local_path = get_resource_path(url, base_url, base_folder)
-            if download_resource(url, local_path, rate_limiter, stats, live_display=live_display):
-                relative_path = os.path.relpath(local_path, os.path.dirname(get_resource_path(page_url, base_url, base_folder)))
-                element[attr] = relative_path
-                
-                # If this was a temp attribute for background image, update the style
-                if attr == 'data-bg-url':
-                    element['style'] = re.sub(r'url\([\'"]?(.*?)[\'"]?\)', f'url({relative_path})', element['style'])
-                    del element['data-bg-url']  # Remove the temporary attribute
+            wanted.append((url, element, attr, get_resource_path(url, base_url, base_folder)))
+    
+    saved = download_resources([(url, local_path) for url, _, _, local_path in wanted],
+                               rate_limiter, stats, live_display, output, retry_queue, page_url)
+    
+    # Rewrite the references to every resource that was saved or will be retried
+    for url, element, attr, local_path in wanted:
+        if saved.get(local_path):
+            asset_status[url] = 200
+        if saved.get(local_path) or (retry_queue and retry_queue.is_pending(url)):
+            relative_path = os.path.relpath(local_path, os.path.dirname(get_resource_path(page_url, base_url, base_folder)))
+            
+            # Srcset candidates are collected and written back together below
+            if isinstance(element, SrcsetRewrite):
+                element.set_local(attr, relative_path)
+                continue
+            
+            # Keep the url(...) wrapper of lazy background attributes
+            if attr == 'data-bg' and 'url(' in element[attr]:
+                element[attr] = re.sub(r'url\([\'"]?(.*?)[\'"]?\)', f'url({relative_path})', element[attr])
+                continue
+            
+            element[attr] = relative_path
+            
+            # If this was a temp attribute for background image, update the style
+            if attr == 'data-bg-url':
+                element['style'] = re.sub(r'url\([\'"]?(.*?)[\'"]?\)', f'url({relative_path})', element['style'])
+                del element['data-bg-url']  # Remove the temporary attribute
+    
+    # Point srcset attributes at the downloaded variants only
+    for rewrite in srcset_rewrites:
+        rewrite.apply()
     
     # Collect internal links to follow
     for a in soup.find_all('a', href=True):
         # Update display periodically
         if live and stats and time.time() - last_update_time > 0.2:
             stats.update_status(f"Analyzing links: {page_url}")
-            live.update(get_stats_panel(stats))
+            refresh_display(live, stats)
             last_update_time = time.time()
             
         link_url = urljoin(page_url, a['href'])
@@ -574,10 +1696,277 @@ def process_html(html_content, page_url, base_url, base_folder, rate_limiter=Non
                     os.path.dirname(get_resource_path(page_url, base_url, base_folder))
                 )
     
-    return soup.prettify(), list(set(internal_links))  # Deduplicate links
+    internal_links = list(set(internal_links))  # Deduplicate links
+    if link_graph:
+        link_graph.record_page(page_url, internal_links, asset_status,
+                               local_path=get_resource_path(page_url, base_url, base_folder))
+    
+    processed_html = soup.prettify()
+    # Break the tree's parent/child cycles now rather than waiting for the garbage collector
+    soup.decompose()
+    return processed_html, internal_links
+
+# Tag attributes that point at page resources, mirroring what process_html() collects
+STREAM_RESOURCE_ATTRS = {
+    'script': ('src',),
+    'img': ('src', 'data-src'),
+    'video': ('src', 'data-src', 'data', 'poster'),
+    'audio': ('src', 'data-src', 'data', 'poster'),
+    'source': ('src', 'data-src', 'data', 'poster'),
+    'iframe': ('src', 'data-src', 'data', 'poster'),
+    'embed': ('src', 'data-src', 'data', 'poster'),
+    'object': ('src', 'data-src', 'data', 'poster'),
+}
+STREAM_LINK_RELS = ['stylesheet', 'preload', 'icon', 'manifest', 'apple-touch-icon', 'shortcut']
+CSS_URL_PATTERN = re.compile(r'url\([\'"]?(.*?)[\'"]?\)')
+
+class StreamingHtmlRewriter(HTMLParser):
+    """
+    Tokenising rewriter for pages too large to parse into a tree. Markup is
+    passed through to write() token by token as it is fed, with the URL
+    attributes process_html() handles pointed at their local copies. Only the
+    current unfinished token is buffered, so memory stays around the feed size
+    plus the largest single tag or inline script.
+    Resources are recorded in self.resources (url -> local path) for the caller
+    to download once the page is written, and followable links in self.internal_links.
+    """
+    def __init__(self, write, page_url, base_url, base_folder, stats=None, fingerprint=None):
+        super().__init__(convert_charrefs=False)
+        self.fingerprint = fingerprint
+        self.write = write
+        self.page_url = page_url
+        self.base_url = base_url
+        self.base_folder = base_folder
+        self.stats = stats
+        self.page_dir = os.path.dirname(get_resource_path(page_url, base_url, base_folder))
+        self.resources = {}
+        self.internal_links = set()
+        # Open boilerplate elements, whose text is left out of the fingerprint
+        self.boilerplate_depth = 0
+    
+    def local_reference(self, url):
+        """Record url as a resource and return the page-relative path of its local copy"""
+        url = urljoin(self.page_url, url.strip())
+        if not url.startswith(('http://', 'https://')):
+            return None
+        if self.stats and os.path.dirname(urlparse(url).path) in self.stats.invalid_paths:
+            return None
+        local_path = self.resources.get(url) or get_resource_path(url, self.base_url, self.base_folder)
+        self.resources[url] = local_path
+        return os.path.relpath(local_path, self.page_dir)
+    
+    def rewrite_css_urls(self, value):
+        def replace(match):
+            url = match.group(1)
+            if not url or url.startswith('data:'):
+                return match.group(0)
+            relative_path = self.local_reference(url)
+            return f'url({relative_path})' if relative_path else match.group(0)
+        return CSS_URL_PATTERN.sub(replace, value)
+    
+    def rewrite_srcset(self, value):
+        candidates = parse_srcset(value)
+        selected = select_srcset_candidates(candidates)
+        if self.stats:
+            self.stats.add_image_variants_skipped(len(candidates) - len(selected))
+        rewritten = []
+        for url, descriptor in selected:
+            relative_path = self.local_reference(url)
+            if relative_path:
+                rewritten.append(f"{relative_path} {descriptor}".strip())
+        return ', '.join(rewritten) if rewritten else value
+    
+    def rewrite_href(self, value):
+        link_url = urljoin(self.page_url, value)
+        relative_path = None
+        if any(link_url.lower().endswith(ext) for ext in RESOURCE_EXTENSIONS):
+            relative_path = self.local_reference(value)
+        if link_url.startswith(('http://', 'https://')) and is_internal_link(link_url, self.base_url):
+            # Fragment links are followed without the fragment but left as they are
+            self.internal_links.add(link_url.split('#')[0])
+            if '#' not in link_url:
+                relative_path = os.path.relpath(get_resource_path(link_url, self.base_url, self.base_folder), self.page_dir)
+        return relative_path
+    
+    def rewrite_attribute(self, tag, name, value, attrs):
+        if not value or value.startswith(('data:', 'javascript:', 'mailto:')):
+            return None
+        if tag == 'a' and name == 'href':
+            # Same-page fragments still count as a link to the page, as in process_html()
+            return self.rewrite_href(value)
+        if value.startswith('#'):
+            return None
+        if name == 'style':
+            return self.rewrite_css_urls(value)
+        if name == 'data-bg':
+            if 'url(' in value:
+                return self.rewrite_css_urls(value)
+            return self.local_reference(value)
+        if name in ('srcset', 'data-srcset') and tag in ('img', 'source'):
+            return self.rewrite_srcset(value)
+        if tag == 'link' and name == 'href':
+            rel = (attrs.get('rel') or '').lower()
+            if any(rel_type in rel for rel_type in STREAM_LINK_RELS):
+                return self.local_reference(value)
+            return None
+        if name in STREAM_RESOURCE_ATTRS.get(tag, ()):
+            return self.local_reference(value)
+        return None
+    
+    def rewrite_tag(self, tag, attrs):
+        attr_map = dict(attrs)
+        changed = False
+        parts = [f'<{tag}']
+        for name, value in attrs:
+            new_value = self.rewrite_attribute(tag, name, value, attr_map)
+            if new_value is not None and new_value != value:
+                value = new_value
+                changed = True
+            parts.append(f' {name}' if value is None else f' {name}="{html.escape(value, quote=True)}"')
+        if not changed:
+            # Pass untouched tags through byte for byte
+            return self.get_starttag_text()
+        if self.get_starttag_text().endswith('/>'):
+            parts.append(' /')
+        parts.append('>')
+        return ''.join(parts)
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in BOILERPLATE_TAGS:
+            self.boilerplate_depth += 1
+        self.write(self.rewrite_tag(tag, attrs))
+    
+    def handle_startendtag(self, tag, attrs):
+        self.write(self.rewrite_tag(tag, attrs))
+    
+    def handle_endtag(self, tag):
+        if tag in BOILERPLATE_TAGS and self.boilerplate_depth:
+            self.boilerplate_depth -= 1
+        self.write(f'</{tag}>')
+    
+    def handle_data(self, data):
+        if self.fingerprint and not self.cdata_elem and not self.boilerplate_depth:
+            self.fingerprint.add_text(data)
+        self.write(data)
+    
+    def handle_entityref(self, name):
+        self.write(f'&{name};')
+    
+    def handle_charref(self, name):
+        self.write(f'&#{name};')
+    
+    def handle_comment(self, data):
+        self.write(f'<!--{data}-->')
+    
+    def handle_decl(self, decl):
+        self.write(f'<!{decl}>')
+    
+    def handle_pi(self, data):
+        self.write(f'<?{data}>')
+    
+    def unknown_decl(self, data):
+        self.write(f'<![{data}]>')
+
+def read_html_page(response, threshold=None, stats=None):
+    """
+    Read an HTML response body unless it turns out to be at least threshold
+    bytes long, judged by Content-Length or by reading up to the threshold.
+    Returns (text, None) for a small page, or (None, chunks) for a large one,
+    where chunks iterates over the whole body, including anything already read.
+    The transfer of a small page is recorded in stats when given.
+    """
+    threshold = threshold if threshold is not None else html_settings['stream_threshold']
+    encoding = response.encoding or 'utf-8'
+    if not threshold:
+        record_transfer(stats, response, len(response.content))
+        return response.content.decode(encoding, errors='replace'), None
+    chunk_iterator = response.iter_content(chunk_size=download_settings['chunk_size'])
+    try:
+        declared_size = int(response.headers.get('Content-Length', 0))
+    except ValueError:
+        declared_size = 0
+    if declared_size >= threshold:
+        return None, chunk_iterator
+    
+    buffered = []
+    received = 0
+    for chunk in chunk_iterator:
+        buffered.append(chunk)
+        received += len(chunk)
+        if received >= threshold:
+            break
+    else:
+        record_transfer(stats, response, received)
+        return b''.join(buffered).decode(encoding, errors='replace'), None
+    
+    def chunks():
+        # Hand back the buffered head first, letting go of each chunk once consumed
+        while buffered:
+            yield buffered.pop(0)
+        yield from chunk_iterator
+    return None, chunks()
+
+def stream_process_html(response, chunks, page_url, base_url, base_folder, local_path,
+                        rate_limiter=None, stats=None, live_display=None, output=None, link_graph=None,
+                        duplicate_index=None, retry_queue=None, on_body_read=None):
+    """
+    Bounded-memory counterpart of process_html() for very large pages: the
+    body chunks are decoded, rewritten by StreamingHtmlRewriter and written to
+    the output one at a time, then the referenced resources are downloaded.
+    Output is left unformatted rather than prettified. Returns the internal links.
+    With duplicate_index the page is fingerprinted as it streams; a duplicate
+    keeps its full copy (it is already written) but its resources and links
+    are not followed. on_body_read() is called once the whole body is in,
+    before any resource is fetched.
+    """
+    output = output or DirectoryOutput()
+    temp_path = output.temp_path(local_path)
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    fingerprint = PageFingerprint() if duplicate_index else None
+    received = 0
+    
+    output.note_file(temp_path)
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        rewriter = StreamingHtmlRewriter(f.write, page_url, base_url, base_folder, stats, fingerprint)
+        for chunk in chunks:
+            received += len(chunk)
+            text = decoder.decode(chunk)
+            if fingerprint:
+                fingerprint.update(text)
+            rewriter.feed(text)
+        rewriter.feed(decoder.decode(b'', final=True))
+        rewriter.close()
+    record_transfer(stats, response, received)
+    if on_body_read:
+        on_body_read()
+    output.commit(temp_path, local_path, page_url, response.headers.get('Content-Type'))
+    logger.info("Streamed large page %s (%s bytes)", page_url, received)
+    
+    canonical_url = duplicate_index.check(page_url, fingerprint) if duplicate_index else None
+    if canonical_url:
+        logger.info("Duplicate of %s, not following its links: %s", canonical_url, page_url)
+        if link_graph:
+            link_graph.record_page(page_url, [canonical_url], local_path=local_path)
+        return []
+    
+    # Resolve the hosts of every resource in the background before downloading them
+    dns_cache.prefetch(urlparse(url).hostname for url in rewriter.resources)
+    if stats:
+        for url in rewriter.resources:
+            stats.expect(url)
+        sample_resource_sizes(list(rewriter.resources), rate_limiter, stats)
+    saved = download_resources(list(rewriter.resources.items()), rate_limiter, stats, live_display, output,
+                               retry_queue, page_url)
+    asset_status = {url: 200 if saved.get(resource_path) else FETCH_FAILED
+                    for url, resource_path in rewriter.resources.items()}
+    if link_graph:
+        link_graph.record_page(page_url, rewriter.internal_links, asset_status, local_path=local_path)
+    return list(rewriter.internal_links)
 
 def get_stats_panel(stats):
     """Create a panel with current statistics"""
+    from rich.panel import Panel
+    
     content = []
     content.append(f"[bold cyan]Status:[/bold cyan] {stats.status} {stats.get_spinner()}")
     content.append("")
@@ -592,16 +1981,47 @@ def get_stats_panel(stats):
     progress_bar = "█" * int(progress / 2) + "░" * (50 - int(progress / 2))
     content.append(f"[green]{progress_bar}[/green] {progress:.1f}%")
     content.append(f"[cyan]Downloaded:[/cyan] [green]{stats.downloaded_size / (1024*1024):.2f} MB[/green]")
-    content.append(f"[cyan]Total:[/cyan] [green]{stats.total_size / (1024*1024):.2f} MB[/green]")
+    content.append(f"[cyan]Expected:[/cyan] [green]{stats.get_expected_total() / (1024*1024):.2f} MB[/green] "
+                   f"({stats.expected_known_count}/{len(stats.expected_sizes)} assets sized)")
+    if stats.disk_free is not None:
+        content.append(f"[cyan]Disk Free:[/cyan] [green]{stats.disk_free / (1024*1024):.0f} MB[/green]")
     content.append(f"[cyan]Speed:[/cyan] [green]{stats.download_speed / (1024*1024):.2f} MB/s[/green]")
+    if disk_writer and disk_writer.pending_bytes:
+        content.append(f"[cyan]Write Queue:[/cyan] [yellow]{disk_writer.pending_bytes / (1024*1024):.1f} MB[/yellow] "
+                       f"of {disk_writer.buffer_bytes / (1024*1024):.0f} MB waiting for the disk")
+    wire_bytes, decoded_bytes = stats.get_transfer_totals()
+    if decoded_bytes:
+        content.append(f"[cyan]Transferred:[/cyan] [green]{wire_bytes / (1024*1024):.2f} MB[/green] "
+                       f"for [green]{decoded_bytes / (1024*1024):.2f} MB[/green] decoded")
     content.append(f"[cyan]ETA:[/cyan] [green]{stats.get_estimated_time_remaining()}[/green]")
     content.append("")
     content.append("[bold cyan]Statistics:[/bold cyan]")
-    content.append(f"[cyan]Pages Processed:[/cyan] [green]{stats.pages_processed}[/green]")
-    content.append(f"[cyan]Resources Downloaded:[/cyan] [green]{stats.resources_downloaded}[/green]")
+    queued = f"[yellow]{stats.frontier_size}[/yellow] queued"
+    if stats.frontier_on_disk:
+        queued += f", [yellow]{stats.frontier_on_disk}[/yellow] on disk"
+    content.append(f"[cyan]Pages Processed:[/cyan] [green]{stats.pages_processed}[/green] ({queued})")
+    content.append(f"[cyan]Resources Downloaded:[/cyan] [green]{stats.resources_downloaded}[/green] "
+                   f"of [green]{len(stats.expected_sizes)}[/green] found")
     content.append(f"[cyan]Errors:[/cyan] [red]{stats.errors}[/red]")
     content.append(f"[cyan]Skipped:[/cyan] [yellow]{stats.skipped}[/yellow]")
-    content.append(f"[cyan]Unique URLs:[/cyan] [green]{len(stats.unique_urls)}[/green]")
+    content.append(f"[cyan]Unique URLs:[/cyan] [green]{stats.unique_urls}[/green]")
+    if stats.trap_urls_skipped:
+        content.append(f"[cyan]Trap URLs Skipped:[/cyan] [yellow]{stats.trap_urls_skipped}[/yellow]")
+    if stats.retries_pending:
+        content.append(f"[cyan]Retries Pending:[/cyan] [yellow]{stats.retries_pending}[/yellow]")
+    if stats.cache_hits or stats.cache_revalidated:
+        content.append(f"[cyan]HTTP Cache:[/cyan] [green]{stats.cache_hits + stats.cache_revalidated}[/green] hits, "
+                       f"[yellow]{stats.cache_misses}[/yellow] misses")
+    if scheduler.controller:
+        windows = ", ".join(f"{host} {in_flight}/{limit}" for host, limit, in_flight in scheduler.controller.snapshot()[:3])
+        content.append(f"[cyan]Concurrency:[/cyan] [green]{windows or 'idle'}[/green] "
+                       f"({len(scheduler.controller.adjustments)} adjustments)")
+    if scheduler.breaker:
+        circuits = scheduler.breaker.open_circuits()
+        if circuits:
+            hosts = ", ".join(f"{host} {state} {opened:.0f}s, probe in {probe:.0f}s"
+                              for host, state, opened, probe in circuits[:3])
+            content.append(f"[cyan]Open Circuits:[/cyan] [red]{hosts}[/red]")
     content.append(f"[cyan]Elapsed Time:[/cyan] [green]{stats.get_elapsed_time()}[/green]")
     
     return Panel(
@@ -612,16 +2032,114 @@ def get_stats_panel(stats):
 
 def get_completion_panel(stats):
     """Create a completion panel with final statistics"""
+    from rich.panel import Panel
+    
     content = []
-    content.append("[bold green]✓ Website cloning complete![/bold green]")
+    if stats.inventory_path:
+        content.append("[bold green]✓ Site map complete![/bold green]")
+    elif stats.mirror_report:
+        content.append("[bold green]✓ Mirror check complete![/bold green]")
+    else:
+        content.append("[bold green]✓ Website cloning complete![/bold green]")
     content.append("")
+    if stats.failure:
+        content.append(f"[bold red]Stopped early:[/bold red] {stats.failure}")
+        content.append("")
     content.append("[bold cyan]Final Statistics:[/bold cyan]")
     content.append(f"[cyan]Pages Processed:[/cyan] [green]{stats.pages_processed}[/green]")
     content.append(f"[cyan]Resources Downloaded:[/cyan] [green]{stats.resources_downloaded}[/green]")
+    content.append(f"[cyan]Downloaded:[/cyan] [green]{stats.downloaded_size / (1024*1024):.2f} MB[/green] of an estimated "
+                   f"[green]{stats.get_expected_total() / (1024*1024):.2f} MB[/green]")
     content.append(f"[cyan]Errors:[/cyan] [red]{stats.errors}[/red]")
     content.append(f"[cyan]Skipped:[/cyan] [yellow]{stats.skipped}[/yellow]")
-    content.append(f"[cyan]Unique URLs:[/cyan] [green]{len(stats.unique_urls)}[/green]")
+    content.append(f"[cyan]Unique URLs:[/cyan] [green]{stats.unique_urls}[/green]")
     content.append(f"[cyan]Total Time:[/cyan] [green]{stats.get_elapsed_time()}[/green]")
+    if stats.image_variants_skipped:
+        content.append(f"[cyan]Image Variants Skipped:[/cyan] [green]{stats.image_variants_skipped}[/green] "
+                       f"(~[green]{stats.get_image_bytes_saved() / (1024*1024):.2f} MB[/green] saved)")
+    if stats.dns_lookups:
+        content.append(f"[cyan]DNS Lookups:[/cyan] [green]{stats.dns_lookups}[/green], "
+                       f"[green]{stats.dns_cache_hits}[/green] answered from cache")
+    if stats.duplicates_exact or stats.duplicates_near:
+        content.append(f"[cyan]Duplicate Pages:[/cyan] [green]{stats.duplicates_exact}[/green] exact, "
+                       f"[green]{stats.duplicates_near}[/green] near "
+                       f"([green]{stats.get_dedup_ratio() * 100:.1f}%[/green] of {stats.pages_fingerprinted} pages)")
+    if stats.retries_scheduled:
+        content.append(f"[cyan]Retries:[/cyan] [green]{stats.retries_scheduled}[/green] deferred, "
+                       f"[green]{stats.retries_recovered}[/green] URLs recovered, "
+                       f"[red]{len(stats.unrecoverable)}[/red] unrecoverable")
+        if stats.retry_report_path and stats.unrecoverable:
+            content.append(f"[cyan]Unrecoverable URLs:[/cyan] {stats.retry_report_path}")
+    if stats.concurrency_limits:
+        limits = ", ".join(f"{host} {limit}" for host, limit in stats.concurrency_limits.items())
+        content.append(f"[cyan]Concurrency Limits:[/cyan] [green]{limits}[/green] "
+                       f"after {len(stats.concurrency_adjustments)} adjustments")
+    if stats.inventory_path:
+        counts = stats.inventory_counts
+        content.append(f"[cyan]URL Inventory:[/cyan] [green]{counts.get('page', 0)}[/green] pages, "
+                       f"[green]{counts.get('file', 0)}[/green] other files, "
+                       f"[green]{counts.get('asset', 0)}[/green] assets in {stats.inventory_path}")
+    if stats.mirror_report:
+        report = stats.mirror_report
+        content.append(f"[cyan]Mirror Check:[/cyan] [green]{report.references}[/green] references in "
+                       f"[green]{report.documents}[/green] HTML and CSS files ({report.files} files)")
+        content.append(f"[cyan]Mirror Problems:[/cyan] [red]{len(report.missing)}[/red] missing targets, "
+                       f"[red]{len(report.empty)}[/red] empty files, "
+                       f"[red]{len(report.leftovers)}[/red] unfinished downloads"
+                       f"{f', [green]{len(report.repaired)}[/green] repaired' if report.repaired else ''}"
+                       f"{f', [yellow]{stats.mirror_unresolved}[/yellow] without a known URL' if stats.mirror_unresolved else ''}")
+        if stats.mirror_report_path:
+            content.append(f"[cyan]Mirror Report:[/cyan] {stats.mirror_report_path}")
+    if stats.urls_spilled:
+        content.append(f"[cyan]Frontier:[/cyan] [green]{stats.urls_seen}[/green] URLs seen, "
+                       f"[green]{stats.urls_spilled}[/green] spilled to disk "
+                       f"(Bloom filter {stats.seen_filter_bytes / 1024:.0f} KB)")
+    if stats.cache_usage:
+        used, entries = stats.cache_usage
+        content.append(f"[cyan]HTTP Cache:[/cyan] [green]{stats.cache_hits}[/green] hits, "
+                       f"[green]{stats.cache_revalidated}[/green] revalidated, "
+                       f"[yellow]{stats.cache_misses}[/yellow] misses, "
+                       f"[green]{stats.cache_bytes_saved / (1024*1024):.2f} MB[/green] saved "
+                       f"({entries} entries, {used / (1024*1024):.1f} MB stored)")
+    if stats.circuit_summary:
+        hosts = ", ".join(f"{host} {opened}x for {seconds:.0f}s ({state})"
+                          for host, opened, seconds, state in stats.circuit_summary)
+        content.append(f"[cyan]Circuits Opened:[/cyan] [red]{hosts}[/red]")
+    if stats.link_graph_path:
+        pages, links, assets = stats.link_graph_counts
+        content.append(f"[cyan]Link Graph:[/cyan] [green]{pages}[/green] pages, [green]{links}[/green] links, "
+                       f"[green]{assets}[/green] asset references in {stats.link_graph_path}")
+    if stats.disk_counters.get('bytes_written'):
+        disk = stats.disk_counters
+        elapsed = max(time.time() - stats.start_time, 0.001)
+        wire_bytes, _ = stats.get_transfer_totals()
+        content.append(f"[cyan]Throughput:[/cyan] network [green]{wire_bytes / elapsed / (1024*1024):.2f} MB/s[/green] "
+                       f"over the run, disk [green]{disk['bytes_written'] / max(disk['busy_seconds'], 0.001) / (1024*1024):.1f} MB/s[/green] "
+                       f"while writing (busy {disk['busy_seconds'] / elapsed * 100:.0f}% of the time)")
+        content.append(f"[cyan]Disk Writer:[/cyan] [green]{disk['bytes_written'] / (1024*1024):.2f} MB[/green] in "
+                       f"[green]{disk['writes']}[/green] writes, [green]{disk['fsyncs']}[/green] fsyncs "
+                       f"({disk['fsync_seconds']:.1f}s), fetchers held back [yellow]{disk['stalls']}[/yellow] times "
+                       f"for [yellow]{disk['stall_seconds']:.1f}s[/yellow]")
+    if stats.filesystem_calls or stats.filesystem_cache_hits:
+        calls = ", ".join(f"{name} {count}" for name, count in sorted(stats.filesystem_calls.items()))
+        made, uncached = stats.get_filesystem_totals()
+        content.append(f"[cyan]Filesystem Calls:[/cyan] [yellow]{uncached}[/yellow] without the directory cache, "
+                       f"[green]{made}[/green] with it{f' ({calls})' if calls else ''}")
+    if stats.throttled_patterns:
+        content.append("")
+        content.append(f"[bold cyan]Throttled URL Patterns ({stats.trap_urls_skipped} URLs skipped):[/bold cyan]")
+        for template, count, reason in stats.throttled_patterns[:10]:
+            content.append(f"[yellow]{template}[/yellow]: {count} ({reason})")
+        if len(stats.throttled_patterns) > 10:
+            content.append(f"... and {len(stats.throttled_patterns) - 10} more, see the log")
+    if stats.transfer_by_type:
+        content.append("")
+        content.append("[bold cyan]Transfer by Content Type (wire / decoded):[/bold cyan]")
+        for content_type, (wire_bytes, decoded_bytes) in sorted(stats.transfer_by_type.items(),
+                                                                key=lambda item: -item[1][1]):
+            saved = (1 - wire_bytes / decoded_bytes) * 100 if decoded_bytes else 0
+            content.append(f"[cyan]{content_type}:[/cyan] [green]{wire_bytes / 1024:.1f} KB[/green] / "
+                           f"[green]{decoded_bytes / 1024:.1f} KB[/green] ({saved:.0f}% saved)")
     
     return Panel(
         "\n".join(content),
@@ -629,67 +2147,99 @@ def get_completion_panel(stats):
         border_style="green"
     )
 
-def setup_logging(log_file='website_cloner.log', debug=False):
-    """Set up logging configuration"""
-    log_dir = 'logs'
-    os.makedirs(log_dir, exist_ok=True)
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that hands records over unformatted, so message formatting
+    happens on the listener thread instead of the crawl loop.
+    """
+    def prepare(self, record):
+        return record
+
+class StdoutHandler(logging.StreamHandler):
+    """
+    StreamHandler that looks up sys.stdout on every write, so output goes
+    through rich's Live redirection instead of tearing the live panel.
+    """
+    @property
+    def stream(self):
+        return sys.stdout
     
-    log_path = os.path.join(log_dir, log_file)
+    @stream.setter
+    def stream(self, value):
+        pass
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+# Background listener that owns the real handlers, started once by setup_logging
+log_listener = None
+log_file_handler = None
+
+def setup_logging(log_file='website_cloner.log', debug=False, log_format='text'):
+    """
+    Set up logging configuration.
+    Records are put on a queue and written by a background listener thread,
+    so logging never blocks the crawl on disk or terminal I/O. Handlers are
+    attached only once per process; later calls just update the level and
+    the log file format ('text' or 'json' for JSON lines). Messages are
+    echoed to stdout only when log_settings['console'] is set.
+    """
+    global log_listener, log_file_handler
     
     # Create logger
     logger = logging.getLogger('website_cloner')
     logger.setLevel(logging.DEBUG if debug else logging.INFO)
     
+    # Create formatters
+    if log_format == 'json':
+        file_formatter = JsonLinesFormatter()
+    else:
+        file_formatter = logging.Formatter(
+            '%(asctime)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+    
+    if log_listener is not None:
+        log_file_handler.setFormatter(file_formatter)
+        return logger
+    
+    log_dir = 'logs'
+    os.makedirs(log_dir, exist_ok=True)
+    
+    log_path = os.path.join(log_dir, log_file)
+    
     # Create handlers
-    file_handler = RotatingFileHandler(
+    log_file_handler = RotatingFileHandler(
         log_path,
         maxBytes=10*1024*1024,  # 10MB
         backupCount=5
     )
-    console_handler = logging.StreamHandler(sys.stdout)
-    
-    # Create formatters
-    file_formatter = logging.Formatter(
-        '%(asctime)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    console_formatter = logging.Formatter('%(message)s')
-    
-    # Add formatters to handlers
-    file_handler.setFormatter(file_formatter)
-    console_handler.setFormatter(console_formatter)
-    
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    log_file_handler.setFormatter(file_formatter)
+    handlers = [log_file_handler]
+    if log_settings['console']:
+        console_handler = StdoutHandler()
+        console_handler.setFormatter(logging.Formatter('%(message)s'))
+        handlers.append(console_handler)
+    
+    # The logger only enqueues, the listener thread does the writing
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    log_listener.start()
+    atexit.register(log_listener.stop)
     
     return logger
 
-def ensure_directory(path):
-    """Ensure directory exists with proper permissions"""
-    try:
-        # If path is a directory that already exists, just return success
-        if os.path.isdir(path):
-            return True
-            
-        # If path is a file that exists, create a similar directory
-        if os.path.isfile(path):
-            # Create a directory with a modified name
-            dir_path = path + '_dir'
-            os.makedirs(dir_path, exist_ok=True)
-            os.chmod(dir_path, 0o755)
-            logger.warning(f"File exists at {path}, created directory at {dir_path} instead")
-            return True
-            
-        # Normal case - create the directory
-        os.makedirs(path, exist_ok=True)
-        # Set permissions to 755 (rwxr-xr-x)
-        os.chmod(path, 0o755)
-        return True
-    except Exception as e:
-        logger.error(f"Failed to create directory {path}: {e}")
-        return False
-
 def is_template_site(url):
     """
     Detect if a website is a template-style site with relative paths.
@@ -701,9 +2251,14 @@ def is_template_site(url):
     
     # Check content for template-style path references
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            content = response.text.lower()
+        with streamed_get(url, timeout=10) as response:
+            if response.status_code != 200:
+                return False
+            # Only the start of a page above the streaming threshold is sniffed
+            html_content, body_chunks = read_html_page(response)
+            if body_chunks is not None:
+                html_content = next(body_chunks, b'').decode(response.encoding or 'utf-8', errors='replace')
+            content = html_content.lower()
             # Look for common template path patterns
             if './assets/' in content or 'assets/css/' in content or 'assets/js/' in content:
                 return True
@@ -712,62 +2267,65 @@ def is_template_site(url):
         
     return False
 
-def download_file(url, output_path, rate_limiter=None, stats=None, progress=None, task_id=None):
+def download_file(url, output_path, rate_limiter=None, stats=None, progress=None, task_id=None, output=None):
     """Download a file with progress tracking"""
+    output = output or DirectoryOutput()
     try:
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
         # Skip if file exists
-        if os.path.exists(output_path):
+        if output.exists(output_path):
             if stats:
                 stats.add_skipped()
             if progress:
                 progress.advance(task_id)
             return True
+        
+        if fetch_from_cache(url, output_path, stats, output) is not None:
+            if progress:
+                progress.advance(task_id)
+            return True
 
         # Apply rate limiting if configured
         if rate_limiter:
             rate_limiter.wait(stats)
 
-        # Download the file
-        response = requests.get(url, headers=headers, stream=True)
-        response.raise_for_status()
+        received = 0
         
-        # Get content length if available
-        total_size = int(response.headers.get('content-length', 0)) or None
+        def on_response(response):
+            # Update progress bar total if we have content length
+            total_size = int(response.headers.get('content-length', 0)) or None
+            if progress and task_id and total_size:
+                progress.update(task_id, total=total_size)
+            if stats and total_size:
+                stats.expect(url, received + total_size)
         
-        # Update progress bar total if we have content length
-        if progress and task_id and total_size:
-            progress.update(task_id, total=total_size)
-            
-        # Download with progress tracking
-        with open(output_path, 'wb') as f:
-            downloaded = 0
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    if stats:
-                        stats.update_download_speed(len(chunk))
-                    if progress and task_id:
-                        progress.update(task_id, completed=downloaded)
+        def on_chunk(chunk_size, downloaded):
+            nonlocal received
+            received += chunk_size
+            if stats:
+                stats.update_download_speed(chunk_size)
+            if progress and task_id:
+                progress.update(task_id, completed=downloaded)
+        
+        # Download with progress tracking, resuming any partial temp file
+        downloaded = fetch_to_file(url, output_path, on_chunk, on_response, stats, output)
                         
         if stats:
+            stats.expect(url, downloaded)
             stats.add_resource(downloaded)
             
         return True
     except Exception as e:
         if stats:
             stats.add_error()
-        logger.error(f"Failed to download {url}: {e}")
+        logger.error("Failed to download %s: %s", url, e)
         return False
 
-def clone_template_site(url, output_dir, rate_limiter=None, stats=None):
+def clone_template_site(url, output_dir, rate_limiter=None, stats=None, output=None):
     """Clone a template-style website with assets in relative paths"""
     # Make stats object if not provided
     if stats is None:
         stats = WebsiteStats()
+    output = output or DirectoryOutput()
         
     # Parse URL components
     parsed_url = urlparse(url)
@@ -780,7 +2338,7 @@ def clone_template_site(url, output_dir, rate_limiter=None, stats=None):
     base_url = base_domain + base_path
     
     # Create output directory
-    ensure_directory(output_dir)
+    output.makedirs(output_dir)
     
     # Download the main page
     if rate_limiter:
@@ -789,19 +2347,20 @@ def clone_template_site(url, output_dir, rate_limiter=None, stats=None):
     stats.update_status(f"Processing template site: {url}")
     stats.update_current_file(f"Downloading main HTML")
     
-    response = requests.get(url, headers=headers)
+    response = http_request('GET', url)
     response.raise_for_status()
+    record_transfer(stats, response, len(response.content))
     
     # Save the main HTML file
     filename = os.path.basename(parsed_url.path) or 'index.html'
     main_html_path = os.path.join(output_dir, filename)
     
-    with open(main_html_path, 'w', encoding='utf-8') as f:
-        f.write(response.text)
+    output.write(main_html_path, response.text, url, response.headers.get('Content-Type'))
     
     stats.add_processed()
     
     # Parse HTML to extract asset links
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(response.text, 'html.parser')
     
     # Extract all asset links
@@ -853,7 +2412,7 @@ def clone_template_site(url, output_dir, rate_limiter=None, stats=None):
             local_path = os.path.join(output_dir, asset_path)
         
         stats.update_current_file(f"Downloading: {asset_path}")
-        download_file(asset_url, local_path, rate_limiter, stats)
+        download_file(asset_url, local_path, rate_limiter, stats, output=output)
     
     # Find and download HTML pages linked from the main page
     html_links = []
@@ -888,15 +2447,15 @@ def clone_template_site(url, output_dir, rate_limiter=None, stats=None):
             if rate_limiter:
                 rate_limiter.wait(stats)
                 
-            response = requests.get(html_url, headers=headers)
+            response = http_request('GET', html_url)
             response.raise_for_status()
+            record_transfer(stats, response, len(response.content))
             
             # Create directory if needed
-            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            output.makedirs(os.path.dirname(local_path))
             
             # Save the HTML file
-            with open(local_path, 'w', encoding='utf-8') as f:
-                f.write(response.text)
+            output.write(local_path, response.text, html_url, response.headers.get('Content-Type'))
             
             stats.add_processed()
             
@@ -941,25 +2500,293 @@ def clone_template_site(url, output_dir, rate_limiter=None, stats=None):
                 stats.update_current_file(f"Downloading sub-asset: {sub_asset}")
                 
                 # Download without detailed progress
-                os.makedirs(os.path.dirname(sub_local_path), exist_ok=True)
-                if not os.path.exists(sub_local_path):
-                    download_file(asset_url, sub_local_path, rate_limiter, stats)
+                if not output.exists(sub_local_path):
+                    download_file(asset_url, sub_local_path, rate_limiter, stats, output=output)
                     
         except Exception as e:
             stats.add_error()
-            logger.error(f"Failed to download HTML page {html_url}: {e}")
+            logger.error("Failed to download HTML page %s: %s", html_url, e)
     
     return stats
 
-def clone_website(base_url, base_folder, min_delay=1.0, max_delay=3.0, debug=False):
+def crawl_page(current_url, base_url, base_folder, rate_limiter, stats, live, output,
+               link_graph=None, duplicate_index=None, retry_queue=None):
+    """
+    Fetch one crawled URL and save it under base_folder: HTML pages are
+    rewritten and their resources downloaded, anything else is stored as is.
+    Errors are logged and counted in stats rather than raised; with a
+    retry_queue, fetches failing in a way its policy retries are queued
+    there (assets included) and only counted once they are given up on.
+    Returns the internal links found on the page.
+    """
+    # Holds the page's scheduler slot and response until the body is read
+    transfer = ExitStack()
+    try:
+        # Apply rate limiting
+        rate_limiter.wait(stats)
+        
+        # Stream the body so very large pages never have to sit in memory whole
+        response = transfer.enter_context(streamed_get(current_url, timeout=10))
+        response.raise_for_status()
+        
+        # Check content type
+        content_type = response.headers.get('Content-Type', '').lower()
+        
+        # Only process HTML-like content for link extraction
+        if not any(html_type in content_type for html_type in ['text/html', 'application/xhtml']):
+            stats.update_status(f"Non-HTML content detected: {current_url}")
+            logger.info("Skipping non-HTML content (%s): %s", content_type, current_url)
+            
+            # For non-HTML content, still save the file but don't process it
+            local_path = get_resource_path(current_url, base_url, base_folder)
+            
+            # Check if directory exists at this path and handle appropriately
+            if output.isdir(local_path):
+                # If it's supposed to be a file but a directory exists, create a file with a different name
+                parsed = urlparse(current_url)
+                filename = os.path.basename(parsed.path) or 'index'
+                local_path = os.path.join(os.path.dirname(local_path), f"{filename}.bin")
+            
+            # Ensure directory exists
+            dir_path = os.path.dirname(local_path)
+            if not output.makedirs(dir_path):
+                logger.error("Failed to create directory for: %s", local_path)
+                return []
+                
+            # Save the raw content without processing
+            record_transfer(stats, response, len(response.content))
+            output.write(local_path, response.content, current_url, response.headers.get('Content-Type'))
+            if link_graph:
+                link_graph.record_page(current_url, status=response.status_code, local_path=local_path)
+                
+            stats.expect(current_url, len(response.content))
+            stats.update_download_speed(len(response.content))
+            stats.add_resource(len(response.content))
+            stats.update_status(f"Saved non-HTML content: {current_url}")
+            return []
+            
+        # For HTML content, proceed with normal processing
+        # Determine the local path for this URL
+        local_path = get_resource_path(current_url, base_url, base_folder)
+        stats.update_current_file(f"Processing: {os.path.basename(local_path)}")
+        refresh_display(live, stats)
+        
+        # Check if directory exists at this path and handle appropriately
+        if output.isdir(local_path):
+            # If it's a directory, use index.html inside it
+            local_path = os.path.join(os.path.dirname(local_path), 
+                                    os.path.basename(os.path.dirname(local_path)), 
+                                    'index.html')
+        
+        # Ensure directory exists
+        if not output.makedirs(os.path.dirname(local_path)):
+            logger.error("Failed to create directory for: %s", local_path)
+            return []
+        
+        # Pages above the stream threshold are rewritten as they arrive
+        html_content, body_chunks = read_html_page(response, stats=stats)
+        if body_chunks is None:
+            # Give the slot back before the page's resources are downloaded
+            transfer.close()
+        canonical_url = None
+        if body_chunks is None and duplicate_index:
+            canonical_url = duplicate_index.check(current_url, fingerprint_html(html_content))
+        
+        if body_chunks is not None:
+            stats.update_status(f"Streaming large page: {current_url}")
+            new_links = stream_process_html(response, body_chunks, current_url, base_url, base_folder,
+                                            local_path, rate_limiter, stats, live, output, link_graph,
+                                            duplicate_index, retry_queue, on_body_read=transfer.close)
+        elif canonical_url:
+            # Store the duplicate as a reference to its canonical copy and do not follow its links
+            canonical_path = get_resource_path(canonical_url, base_url, base_folder)
+            if os.path.normpath(canonical_path) == os.path.normpath(local_path):
+                # Same file as the canonical page (e.g. it only differs in its query string): keep that page
+                logger.info("Duplicate of %s saved at the same path, recorded as an alias: %s",
+                            canonical_url, current_url)
+            else:
+                relative_path = os.path.relpath(canonical_path, os.path.dirname(local_path))
+                output.write(local_path, duplicate_reference_html(canonical_url, relative_path),
+                             current_url, 'text/html; charset=utf-8')
+                logger.info("Duplicate of %s, stored as a reference: %s", canonical_url, current_url)
+            if link_graph:
+                link_graph.record_page(current_url, [canonical_url], local_path=local_path)
+            new_links = []
+        else:
+            # Process the HTML content
+            processed_html, new_links = process_html(html_content, current_url, base_url, base_folder, rate_limiter, stats, live, output,
+                                                     link_graph, retry_queue)
+            
+            # Save the processed HTML
+            output.write(local_path, processed_html, current_url, response.headers.get('Content-Type'))
+            del html_content, processed_html
+            
+        stats.add_processed()
+        stats.update_status(f"Completed: {current_url}")
+        logger.info("Successfully processed: %s", current_url)
+        if retry_queue:
+            retry_queue.succeeded(current_url)
+        return new_links
+        
+    except requests.exceptions.RequestException as e:
+        status = e.response.status_code if e.response is not None else None
+        if retry_queue:
+            def retry():
+                return crawl_page(current_url, base_url, base_folder, rate_limiter, stats, live, output,
+                                  link_graph, duplicate_index, retry_queue)
+            if retry_queue.schedule(current_url, retry, status, e, retry_delay(e), kind='page',
+                                    deferral=isinstance(e, CircuitOpenError)):
+                stats.update_status(f"Deferred: {current_url}")
+                logger.warning("Fetching %s failed (%s), retrying later", current_url, e)
+                return []
+        stats.add_error()
+        stats.update_status(f"Error: {str(e)}")
+        logger.error("Error processing %s: %s", current_url, e)
+        if link_graph:
+            link_graph.record_status(current_url, status if status is not None else FETCH_FAILED)
+        refresh_display(live, stats)
+        return []
+    except Exception as e:
+        stats.add_error()
+        stats.update_status(f"Unexpected error: {str(e)}")
+        logger.error("Unexpected error processing %s: %s", current_url, e)
+        refresh_display(live, stats)
+        return []
+    finally:
+        transfer.close()
+
+def head_asset(url, rate_limiter=None):
+    """(status, content type, size) of url from a HEAD request; status None with the error when it failed"""
+    try:
+        if rate_limiter:
+            rate_limiter.wait()
+        response = http_request('HEAD', url, allow_redirects=True, timeout=5)
+        return response.status_code, response.headers.get('Content-Type'), content_length(response), None
+    except requests.exceptions.RequestException as e:
+        return None, None, None, e
+
+def map_page(current_url, base_url, depth, rate_limiter, stats, inventory, assets_seen):
+    """
+    --map-only counterpart of crawl_page(): fetch one URL, and for an HTML
+    page pull its links and assets out with StreamingHtmlRewriter writing
+    nowhere, so nothing is parsed into a tree, rewritten or saved. Assets
+    not in assets_seen are sized with HEAD requests instead of downloaded.
+    Everything is recorded in inventory. Returns the internal links found.
+    """
+    rate_limiter.wait(stats)
+    response = None
+    received = 0
+    try:
+        # The slot is held while the body streams in and given back before the assets are sized
+        with streamed_get(current_url, timeout=10) as response:
+            content_type = response.headers.get('Content-Type')
+            if response.status_code >= 400 or not any(
+                    html_type in (content_type or '').lower() for html_type in ['text/html', 'application/xhtml']):
+                # Not a page: its headers say all the inventory needs
+                kind = 'page' if response.status_code >= 400 else 'file'
+                inventory.add(current_url, kind, response.status_code, content_type, content_length(response), depth)
+                if response.status_code >= 400:
+                    stats.add_error()
+                else:
+                    stats.expect(current_url, content_length(response))
+                return []
+            
+            decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+            rewriter = StreamingHtmlRewriter(lambda text: None, current_url, base_url, '', stats)
+            for chunk in response.iter_content(chunk_size=download_settings['chunk_size']):
+                received += len(chunk)
+                rewriter.feed(decoder.decode(chunk))
+            rewriter.feed(decoder.decode(b'', final=True))
+            rewriter.close()
+    except requests.exceptions.RequestException as e:
+        stats.add_error()
+        logger.error("Error mapping %s: %s", current_url, e)
+        if response is not None:
+            inventory.add(current_url, 'page', response.status_code, content_type, received, depth, error=e)
+        else:
+            inventory.add(current_url, 'page', depth=depth, error=e)
+        return []
+    record_transfer(stats, response, received)
+    stats.update_download_speed(received)
+    inventory.add(current_url, 'page', response.status_code, content_type, content_length(response) or received,
+                  depth)
+    stats.add_processed()
+    
+    new_assets = [url for url in rewriter.resources if url not in assets_seen]
+    assets_seen.update(new_assets)
+    dns_cache.prefetch(urlparse(url).hostname for url in new_assets)
+    workers = max(1, min(len(new_assets), scheduler.per_host or 1))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        heads = executor.map(lambda url: head_asset(url, rate_limiter), new_assets)
+        for url, (status, asset_type, size, error) in zip(new_assets, heads):
+            inventory.add(url, 'asset', status, asset_type, size, depth + 1, current_url, error)
+            if status == 200:
+                stats.expect(url, size)
+    stats.update_status(f"Mapped: {current_url}")
+    return list(rewriter.internal_links)
+
+def note_frontier(stats, frontier, seen):
+    """Copy the size of a crawl's frontier and seen-set, and how much of them is on disk, into stats"""
+    stats.frontier_size = len(frontier)
+    stats.frontier_on_disk = frontier.on_disk
+    stats.urls_seen = len(seen)
+    stats.urls_spilled = seen.spilled + frontier.spilled
+    stats.seen_filter_bytes = seen.filter.nbytes
+
+def seed_urls(base_url):
+    """
+    Starting frontier of a crawl: the base URL plus common asset folders,
+    tried from the domain root and from the base URL's own directory.
+    """
+    parsed_base = urlparse(base_url)
+    base_domain = f"{parsed_base.scheme}://{parsed_base.netloc}"
+    base_path = os.path.dirname(parsed_base.path)
+    if not base_path.endswith('/'):
+        base_path += '/'
+    
+    # Initialize the queue with the base URL
+    queue = [base_url]
+    
+    # Add common asset paths to check
+    common_asset_paths = [
+        'assets/', 'css/', 'js/', 'images/', 'img/', 'fonts/',
+        'media/', 'videos/', 'audio/', 'documents/', 'downloads/'
+    ]
+    
+    # Add these paths to the queue to make sure we check them
+    for asset_path in common_asset_paths:
+        # Try both the domain root and any subdirectory path
+        asset_url = urljoin(base_domain, asset_path)
+        queue.append(asset_url)
+        
+        # If the base URL has a path component, also try from there
+        if base_path and base_path != '/':
+            asset_url = urljoin(base_domain + base_path, asset_path)
+            queue.append(asset_url)
+    return queue
+
+def clone_website(base_url, base_folder, min_delay=1.0, max_delay=3.0, debug=False, headless=False,
+                  output_format='dir', log_format='text', link_graph_path=None, retry_report_path=None, seeds=None):
     """
     Clone a website by recursively downloading all pages and resources.
     Automatically detects and handles template-style websites.
+    With headless=True no live display or panels are drawn (used by batch mode).
+    output_format selects loose files ('dir') or a single zip, tar.zst or warc archive,
+    log_format writes the log file as plain text or JSON lines ('json').
+    With link_graph_path set, every page's links and assets are written to a
+    SQLite link graph there (see link_graph.py); rerunning into the same file
+    updates it.
+    Failed fetches are retried later in the crawl as retry_settings allows,
+    with a final sweep once the queue runs dry; URLs that never recover are
+    written to retry_report_path as JSON lines when given.
+    seeds are extra page URLs to start from, such as those of a --map-only inventory.
+    Returns the WebsiteStats for the run.
     """
     # Initialize logging
     global logger
-    logger = setup_logging(debug=debug)
-    logger.info(f"Starting website clone: {base_url}")
+    logger = setup_logging(debug=debug, log_format=log_format)
+    install_dns_cache(dns_cache)
+    logger.info("Starting website clone: %s", base_url)
     
     # Check if base_url has a specific path structure we should preserve
     proper_base_folder = get_base_folder_from_url(base_url, base_folder)
@@ -967,42 +2794,66 @@ def clone_website(base_url, base_folder, min_delay=1.0, max_delay=3.0, debug=Fal
     # Initialize rate limiter and stats
     rate_limiter = RateLimiter(min_delay=min_delay, max_delay=max_delay, debug=debug)
     stats = WebsiteStats()
+    disk_start = get_disk_writer().counters()
     
-    # Parse base_url to get its components
-    parsed_base = urlparse(base_url)
-    base_domain = f"{parsed_base.scheme}://{parsed_base.netloc}"
-    base_path = os.path.dirname(parsed_base.path)
-    if not base_path.endswith('/'):
-        base_path += '/'
-    
-    # Ensure output directory exists
-    if not ensure_directory(proper_base_folder):
-        logger.error(f"Failed to create output directory: {proper_base_folder}")
-        return
+    # Open the output backend and ensure the output directory exists
+    try:
+        output = create_output(output_format, base_folder)
+    except (RuntimeError, ValueError, OSError) as e:
+        logger.error("Failed to open output: %s", e)
+        stats.failure = f"Failed to open output: {e}"
+        return stats
+    if not output.makedirs(proper_base_folder):
+        logger.error("Failed to create output directory: %s", proper_base_folder)
+        stats.failure = f"Failed to create output directory: {proper_base_folder}"
+        output.close()
+        return stats
+    
+    # Fingerprints of the pages seen so far, to spot duplicates
+    duplicate_index = None
+    if dedup_settings['mode'] != 'off':
+        duplicate_index = DuplicateIndex(dedup_settings['max_distance'], near=dedup_settings['mode'] == 'near')
+    
+    # Failed fetches wait here for their next attempt while the crawl goes on
+    retry_queue = RetryQueue(retry_settings['policy'])
+    spill = None
+    
+    link_graph = None
+    if link_graph_path:
+        try:
+            link_graph = LinkGraph(link_graph_path)
+            stats.link_graph_path = link_graph_path
+        except sqlite3.Error as e:
+            logger.error("Failed to open link graph %s: %s", link_graph_path, e)
     
     # Print initial information
-    console.print(Panel.fit(
-        f"[bold cyan]Website Cloner[/bold cyan]\n"
-        f"[green]URL:[/green] {base_url}\n"
-        f"[green]Output:[/green] {base_folder}\n"
-        f"[green]Rate Limiting:[/green] {min_delay}s to {max_delay}s",
-        title="Starting Website Clone",
-        border_style="blue"
-    ))
-    
-    with Live(get_stats_panel(stats), console=console, refresh_per_second=10) as live:
+    if not headless:
+        from rich.panel import Panel
+        from rich.live import Live
+        get_console().print(Panel.fit(
+            f"[bold cyan]Website Cloner[/bold cyan]\n"
+            f"[green]URL:[/green] {base_url}\n"
+            f"[green]Output:[/green] {base_folder}\n"
+            f"[green]Rate Limiting:[/green] {min_delay}s to {max_delay}s",
+            title="Starting Website Clone",
+            border_style="blue"
+        ))
+    
+    live_display = NullLive() if headless else Live(get_stats_panel(stats), console=get_console(), refresh_per_second=10)
+    with live_display as live:
         try:
             # Test initial connection
             stats.update_status("Testing connection...")
-            live.update(get_stats_panel(stats))
+            refresh_display(live, stats)
             logger.info("Testing initial connection...")
             
-            response = requests.get(base_url, headers=headers, timeout=10)
-            response.raise_for_status()
+            # Headers are enough here, the page itself is fetched by the crawl
+            with streamed_get(base_url, timeout=10) as response:
+                response.raise_for_status()
             
             stats.update_status("Connection successful, detecting site type...")
             logger.info("Connection successful, detecting site type...")
-            live.update(get_stats_panel(stats))
+            refresh_display(live, stats)
             
             # Check if this is a template-style website
             is_template = is_template_site(base_url)
@@ -1011,177 +2862,529 @@ def clone_website(base_url, base_folder, min_delay=1.0, max_delay=3.0, debug=Fal
                 # Use template site cloning approach
                 stats.update_status("Detected template-style website, using specialized cloning...")
                 logger.info("Detected template-style website, using specialized cloning...")
-                live.update(get_stats_panel(stats))
+                refresh_display(live, stats)
                 
                 # Perform template site cloning
-                clone_template_site(base_url, proper_base_folder, rate_limiter, stats)
+                clone_template_site(base_url, proper_base_folder, rate_limiter, stats, output)
                 
                 # Keep updating display during processing
                 last_update_time = time.time()
                 while time.time() - last_update_time < 0.5:
                     stats.get_spinner()  # Update spinner
-                    live.update(get_stats_panel(stats))
+                    refresh_display(live, stats)
                     time.sleep(0.1)
                     
             else:
                 # For regular websites, use recursive crawling approach
                 stats.update_status("Using recursive crawling for standard website...")
                 logger.info("Using recursive crawling for standard website...")
-                live.update(get_stats_panel(stats))
+                refresh_display(live, stats)
                 
-                # Initialize the queue with the base URL
-                queue = [base_url]
+                # Queued and seen URLs stay within the memory budget, spilling to disk beyond it
+                spill = SpillDatabase(frontier_settings['spill_dir'])
+                queue = Frontier(spill, frontier_settings['memory'] // 2)
                 
-                # Add common asset paths to check
-                common_asset_paths = [
-                    'assets/', 'css/', 'js/', 'images/', 'img/', 'fonts/',
-                    'media/', 'videos/', 'audio/', 'documents/', 'downloads/'
-                ]
+                # Keep track of every URL ever queued to avoid cycles
+                visited = SeenSet(spill, frontier_settings['memory'] // 2)
                 
-                # Add these paths to the queue to make sure we check them
-                for asset_path in common_asset_paths:
-                    # Try both the domain root and any subdirectory path
-                    asset_url = urljoin(base_domain, asset_path)
-                    queue.append(asset_url)
-                    
-                    # If the base URL has a path component, also try from there
-                    if base_path and base_path != '/':
-                        asset_url = urljoin(base_domain + base_path, asset_path)
-                        queue.append(asset_url)
+                # Initialize the queue with the base URL, the common asset folders and any seed pages
+                for url in seed_urls(base_url) + list(seeds or []):
+                    if visited.add(url):
+                        queue.push(url)
                 
-                # Keep track of visited URLs to avoid cycles
-                visited = set()
+                # Cluster URLs by template to catch traps that visited alone cannot
+                trap_detector = TrapDetector(trap_settings['budget'], trap_settings['max_repeats'],
+                                             trap_settings['max_depth'])
+                duplicates_seen = 0
+                sweeping = False
                 
                 # For spinner updates
                 last_spinner_update = time.time()
                 
-                while queue:
-                    current_url = queue.pop(0)
+                while queue or retry_queue.waiting():
+                    # Retries that have come due go first, their pages' links join the queue
+                    for link in retry_queue.run_due():
+                        if visited.add(link):
+                            queue.push(link)
+                    stats.retries_pending = retry_queue.waiting()
+                    if not queue:
+                        # Final sweep: only retries are left, wait for the next one
+                        if not sweeping and retry_queue.waiting():
+                            sweeping = True
+                            logger.info("Final retry sweep: %s URLs waiting", retry_queue.waiting())
+                        stats.update_status(f"Retrying {retry_queue.waiting()} failed URLs...")
+                        refresh_display(live, stats)
+                        time.sleep(min(retry_queue.wait_time() or 0, 0.5))
+                        continue
+                    current_url, _ = queue.pop()
                     
                     # Keep spinner animated regardless of progress
                     current_time = time.time()
                     if current_time - last_spinner_update >= 0.1:
                         stats.get_spinner()  # Forces spinner update
-                        live.update(get_stats_panel(stats))
+                        refresh_display(live, stats)
                         last_spinner_update = current_time
                     
-                    # Skip if already visited
-                    if current_url in visited:
+                    # Leave out URLs that look like a crawler trap
+                    if not trap_detector.admit(current_url):
+                        stats.trap_urls_skipped += 1
+                        logger.debug("Skipping likely crawler trap: %s", current_url)
                         continue
-                        
-                    visited.add(current_url)
+                    
+                    # Stop before the disk fills up rather than part way through a file
+                    disk_failure = check_disk_space(stats, base_folder)
+                    if disk_failure:
+                        stats.update_status(disk_failure)
+                        stats.failure = disk_failure
+                        logger.error("%s, stopping the crawl", disk_failure)
+                        break
+                    
                     stats.add_url(current_url)
+                    note_frontier(stats, queue, visited)
                     stats.update_status(f"Processing: {current_url}")
-                    logger.info(f"Processing URL: {current_url}")
-                    live.update(get_stats_panel(stats))
+                    logger.info("Processing URL: %s", current_url)
+                    refresh_display(live, stats)
                     
-                    try:
-                        # Apply rate limiting
-                        rate_limiter.wait(stats)
-                        
-                        response = requests.get(current_url, headers=headers, timeout=10)
-                        response.raise_for_status()
-                        
-                        # Check content type
-                        content_type = response.headers.get('Content-Type', '').lower()
-                        
-                        # Only process HTML-like content for link extraction
-                        if not any(html_type in content_type for html_type in ['text/html', 'application/xhtml']):
-                            stats.update_status(f"Non-HTML content detected: {current_url}")
-                            logger.info(f"Skipping non-HTML content ({content_type}): {current_url}")
-                            
-                            # For non-HTML content, still save the file but don't process it
-                            local_path = get_resource_path(current_url, base_url, proper_base_folder)
-                            
-                            # Check if directory exists at this path and handle appropriately
-                            if os.path.isdir(local_path):
-                                # If it's supposed to be a file but a directory exists, create a file with a different name
-                                parsed = urlparse(current_url)
-                                filename = os.path.basename(parsed.path) or 'index'
-                                local_path = os.path.join(os.path.dirname(local_path), f"{filename}.bin")
-                            
-                            # Ensure directory exists
-                            dir_path = os.path.dirname(local_path)
-                            if not ensure_directory(dir_path):
-                                logger.error(f"Failed to create directory for: {local_path}")
-                                continue
-                                
-                            # Save the raw content without processing
-                            with open(local_path, 'wb') as file:
-                                file.write(response.content)
-                                
-                            stats.add_resource(len(response.content))
-                            stats.update_status(f"Saved non-HTML content: {current_url}")
-                            continue
-                            
-                        # For HTML content, proceed with normal processing
-                        # Determine the local path for this URL
-                        local_path = get_resource_path(current_url, base_url, proper_base_folder)
-                        stats.update_current_file(f"Processing: {os.path.basename(local_path)}")
-                        live.update(get_stats_panel(stats))
-                        
-                        # Check if directory exists at this path and handle appropriately
-                        if os.path.isdir(local_path):
-                            # If it's a directory, use index.html inside it
-                            local_path = os.path.join(os.path.dirname(local_path), 
-                                                    os.path.basename(os.path.dirname(local_path)), 
-                                                    'index.html')
-                        
-                        # Ensure directory exists
-                        if not ensure_directory(os.path.dirname(local_path)):
-                            logger.error(f"Failed to create directory for: {local_path}")
-                            continue
-                        
-                        # Process the HTML content
-                        processed_html, new_links = process_html(response.text, current_url, base_url, proper_base_folder, rate_limiter, stats, live)
-                        
-                        # Save the processed HTML
-                        with open(local_path, 'w', encoding='utf-8') as file:
-                            file.write(processed_html)
-                            
-                        # Add new internal links to the queue
-                        for link in new_links:
-                            if link not in visited:
-                                queue.append(link)
-                                
-                        stats.add_processed()
-                        stats.update_status(f"Completed: {current_url}")
-                        logger.info(f"Successfully processed: {current_url}")
-                        
-                    except requests.exceptions.RequestException as e:
-                        stats.add_error()
-                        stats.update_status(f"Error: {str(e)}")
-                        logger.error(f"Error processing {current_url}: {e}")
-                        live.update(get_stats_panel(stats))
-                    except Exception as e:
-                        stats.add_error()
-                        stats.update_status(f"Unexpected error: {str(e)}")
-                        logger.error(f"Unexpected error processing {current_url}: {e}")
-                        live.update(get_stats_panel(stats))
+                    new_links = crawl_page(current_url, base_url, proper_base_folder, rate_limiter, stats, live, output,
+                                           link_graph, duplicate_index, retry_queue)
+                    
+                    # Pages of a template that keep repeating each other close the template
+                    if duplicate_index and duplicate_index.duplicates > duplicates_seen:
+                        duplicates_seen = duplicate_index.duplicates
+                        trap_detector.note_duplicate(current_url)
+                    
+                    # Add new internal links to the queue
+                    queued = [link for link in new_links if visited.add(link)]
+                    for link in queued:
+                        queue.push(link)
+                    trap_detector.note_links(current_url, queued)
+                    note_frontier(stats, queue, visited)
                     
                     # Update the live display
-                    live.update(get_stats_panel(stats))
+                    refresh_display(live, stats)
+                
+                stats.throttled_patterns = trap_detector.throttled_patterns()
+                for template, count, reason in stats.throttled_patterns:
+                    logger.info("Throttled URL pattern %s: %s URLs skipped (%s)", template, count, reason)
             
         except requests.exceptions.RequestException as e:
             stats.update_status(f"Initial connection failed: {str(e)}")
-            logger.error(f"Failed to connect to {base_url}: {e}")
+            stats.failure = f"Initial connection failed: {e}"
+            logger.error("Failed to connect to %s: %s", base_url, e)
         except Exception as e:
             stats.update_status(f"Unexpected error: {str(e)}")
-            logger.error(f"Unexpected error: {e}")
+            stats.failure = f"Unexpected error: {e}"
+            logger.error("Unexpected error: %s", e)
+        finally:
+            output.close()
+            if spill:
+                spill.close()
+            if duplicate_index:
+                stats.pages_fingerprinted = duplicate_index.pages
+                stats.duplicates_exact = duplicate_index.exact_duplicates
+                stats.duplicates_near = duplicate_index.near_duplicates
+            stats.retries_scheduled = retry_queue.scheduled
+            stats.retries_pending = retry_queue.waiting()
+            stats.retries_recovered = len(retry_queue.recovered)
+            stats.unrecoverable = list(retry_queue.unrecoverable)
+            if retry_report_path and (retry_queue.unrecoverable or os.path.exists(retry_report_path)):
+                try:
+                    retry_queue.write_report(retry_report_path)
+                    stats.retry_report_path = retry_report_path
+                except OSError as e:
+                    logger.error("Failed to write retry report %s: %s", retry_report_path, e)
+            if link_graph:
+                # Assets recorded as failed when their page was saved may have come in on a retry
+                for url in retry_queue.recovered:
+                    link_graph.record_status(url, 200)
+                stats.link_graph_counts = link_graph.counts()
+                link_graph.close()
+            stats.filesystem_calls = dict(output.syscalls)
+            stats.filesystem_cache_hits = output.cache_hits
+            stats.disk_counters = disk_counters_since(disk_start)
+            stats.dns_lookups = dns_cache.lookups
+            stats.dns_cache_hits = dns_cache.hits
+            if scheduler.controller:
+                stats.concurrency_adjustments = list(scheduler.controller.adjustments)
+                stats.concurrency_limits = scheduler.controller.limits()
+            if scheduler.breaker:
+                stats.circuit_summary = scheduler.breaker.summary()
+            if http_cache:
+                stats.cache_usage = http_cache.usage()
     
     # Print final statistics
-    console.print(get_completion_panel(stats))
+    if not headless:
+        get_console().print(get_completion_panel(stats))
     logger.info("Website cloning completed")
-    logger.info(f"Final statistics: {stats.pages_processed} pages processed, "
-                f"{stats.resources_downloaded} resources downloaded, "
-                f"{stats.errors} errors, {stats.skipped} skipped")
+    logger.info("Final statistics: %s pages processed, %s resources downloaded, %s errors, %s skipped",
+                stats.pages_processed, stats.resources_downloaded, stats.errors, stats.skipped)
+    logger.info("Downloaded %s of an estimated %s bytes (%s of %s assets sized in advance)",
+                stats.downloaded_size, stats.get_expected_total(), stats.expected_known_count,
+                len(stats.expected_sizes))
+    if stats.pages_fingerprinted:
+        logger.info("Duplicate pages: %s exact, %s near (dedup ratio %.1f%% of %s pages)", stats.duplicates_exact,
+                    stats.duplicates_near, stats.get_dedup_ratio() * 100, stats.pages_fingerprinted)
+    if stats.urls_spilled:
+        logger.info("Frontier: %s URLs seen, %s written to disk under the %s byte budget, %s byte Bloom filter",
+                    stats.urls_seen, stats.urls_spilled, frontier_settings['memory'], stats.seen_filter_bytes)
+    if stats.link_graph_path:
+        logger.info("Link graph: %s pages, %s links, %s asset references in %s",
+                    *stats.link_graph_counts, stats.link_graph_path)
+    if stats.retries_scheduled:
+        logger.info("Retries: %s deferred, %s URLs recovered, %s unrecoverable%s", stats.retries_scheduled,
+                    stats.retries_recovered, len(stats.unrecoverable),
+                    f" (see {stats.retry_report_path})" if stats.retry_report_path and stats.unrecoverable else "")
+    if stats.concurrency_limits:
+        logger.info("Concurrency: %s adjustments, final limits %s", len(stats.concurrency_adjustments),
+                    ", ".join(f"{host}={limit}" for host, limit in stats.concurrency_limits.items()))
+    if stats.disk_counters.get('bytes_written'):
+        disk = stats.disk_counters
+        logger.info("Disk writer: %s bytes in %s writes, %.2fs writing, %s fsyncs (%.2fs), %s stalls (%.2fs); "
+                    "network %s bytes in %.1fs", disk['bytes_written'], disk['writes'], disk['busy_seconds'],
+                    disk['fsyncs'], disk['fsync_seconds'], disk['stalls'], disk['stall_seconds'],
+                    stats.get_transfer_totals()[0], time.time() - stats.start_time)
+    if stats.filesystem_calls or stats.filesystem_cache_hits:
+        logger.info("Filesystem calls: %s without the directory cache, %s with it (%s)",
+                    *reversed(stats.get_filesystem_totals()),
+                    ", ".join(f"{name} {count}" for name, count in sorted(stats.filesystem_calls.items())))
+    if stats.cache_usage:
+        logger.info("HTTP cache: %s hits, %s revalidated, %s misses, %s bytes saved; %s bytes in %s entries",
+                    stats.cache_hits, stats.cache_revalidated, stats.cache_misses, stats.cache_bytes_saved,
+                    *stats.cache_usage)
+    for host, opened, seconds, state in stats.circuit_summary:
+        logger.info("Circuit for %s opened %s times, %.0fs open in total, now %s", host, opened, seconds, state)
+    
+    return stats
+
+def map_website(base_url, inventory_path, min_delay=1.0, max_delay=3.0, debug=False, headless=False,
+                log_format='text', seeds=None):
+    """
+    Discovery-only crawl (--map-only): follow the site's HTML pages as
+    clone_website() would, but download no assets and write nothing but a
+    URL inventory (see url_inventory.py) to inventory_path, so the size and
+    shape of a site are known before cloning it. Pages are read without
+    being parsed into a tree, assets are sized from HEAD responses. The
+    inventory can seed a later full run (--seeds). Returns the WebsiteStats.
+    """
+    global logger
+    logger = setup_logging(debug=debug, log_format=log_format)
+    install_dns_cache(dns_cache)
+    logger.info("Starting site map: %s", base_url)
+    
+    rate_limiter = RateLimiter(min_delay=min_delay, max_delay=max_delay, debug=debug)
+    stats = WebsiteStats()
+    try:
+        inventory = UrlInventory(inventory_path)
+    except OSError as e:
+        logger.error("Failed to open inventory %s: %s", inventory_path, e)
+        stats.failure = f"Failed to open inventory: {e}"
+        return stats
+    stats.inventory_path = inventory_path
+    
+    if not headless:
+        from rich.live import Live
+    live_display = NullLive() if headless else Live(get_stats_panel(stats), console=get_console(), refresh_per_second=10)
+    spill = None
+    with live_display as live:
+        try:
+            spill = SpillDatabase(frontier_settings['spill_dir'])
+            queue = Frontier(spill, frontier_settings['memory'] // 2)
+            visited = SeenSet(spill, frontier_settings['memory'] // 2)
+            for url in seed_urls(base_url) + list(seeds or []):
+                if visited.add(url):
+                    queue.push(url)
+            assets_seen = set()
+            trap_detector = TrapDetector(trap_settings['budget'], trap_settings['max_repeats'],
+                                         trap_settings['max_depth'])
+            while queue:
+                current_url, depth = queue.pop()
+                if not trap_detector.admit(current_url):
+                    stats.trap_urls_skipped += 1
+                    continue
+                
+                stats.add_url(current_url)
+                note_frontier(stats, queue, visited)
+                stats.update_status(f"Mapping: {current_url}")
+                logger.info("Mapping URL: %s", current_url)
+                refresh_display(live, stats)
+                
+                queued = [link for link in map_page(current_url, base_url, depth, rate_limiter, stats, inventory,
+                                                    assets_seen) if visited.add(link)]
+                for link in queued:
+                    queue.push(link, depth + 1)
+                trap_detector.note_links(current_url, queued)
+                note_frontier(stats, queue, visited)
+                refresh_display(live, stats)
+            stats.throttled_patterns = trap_detector.throttled_patterns()
+        except Exception as e:
+            stats.update_status(f"Unexpected error: {str(e)}")
+            stats.failure = f"Unexpected error: {e}"
+            logger.error("Unexpected error: %s", e)
+        finally:
+            inventory.close()
+            if spill:
+                spill.close()
+            stats.inventory_counts = dict(inventory.counts)
+            stats.dns_lookups = dns_cache.lookups
+            stats.dns_cache_hits = dns_cache.hits
+            if scheduler.breaker:
+                stats.circuit_summary = scheduler.breaker.summary()
+    
+    if not headless:
+        get_console().print(get_completion_panel(stats))
+    logger.info("Site map completed: %s pages, %s other files and %s assets in %s, an estimated %s bytes to clone",
+                stats.inventory_counts['page'], stats.inventory_counts['file'], stats.inventory_counts['asset'],
+                inventory_path, stats.get_expected_total())
+    for host, opened, seconds, state in stats.circuit_summary:
+        logger.info("Circuit for %s opened %s times, %.0fs open in total, now %s", host, opened, seconds, state)
+    return stats
+
+def guess_mirror_url(path, base_url, base_folder):
+    """
+    The URL get_resource_path() would have saved at path, for paths the link
+    graph does not know. None for files under external/, which keep only
+    the last segment of their URL.
+    """
+    relative = os.path.relpath(path, base_folder).replace(os.sep, '/')
+    if relative.startswith(('../', 'external/')):
+        return None
+    if relative == 'index.html' or relative.endswith('/index.html'):
+        # Directory URLs are saved as their index.html
+        relative = relative[:-len('index.html')]
+    parsed = urlparse(base_url)
+    return f"{parsed.scheme}://{parsed.netloc}/{relative}"
+
+def repair_mirror(report, base_url, base_folder, rate_limiter, stats, live, output, link_graph=None):
+    """
+    Refetch the files a MirrorReport found missing, empty or unfinished
+    through the usual download path: pages with crawl_page(), so they are
+    rewritten and their assets fetched, everything else with
+    download_resources(), which resumes leftover .tmp files. URLs come from
+    the link graph where it has them. Fixed paths are added to
+    report.repaired; returns the number of problems no URL was found for.
+    """
+    known = {}
+    if link_graph:
+        for url, is_page, local_path in link_graph.urls():
+            known[os.path.normpath(local_path or get_resource_path(url, base_url, base_folder))] = url
+    
+    pages, assets, unresolved = [], [], 0
+    empty = set(report.empty)
+    for path in list(report.missing) + report.empty:
+        url = known.get(path) or guess_mirror_url(path, base_url, base_folder)
+        if url is None:
+            logger.warning("No URL known for %s, cannot refetch it", path)
+            unresolved += 1
+            continue
+        if path in empty:
+            os.remove(path)
+            output.forget_file(path)
+        if path.lower().endswith(HTML_EXTENSIONS):
+            pages.append((url, path))
+        else:
+            assets.append((url, path))
+    for temp_path, url in report.leftovers:
+        path = temp_path[:-len('.tmp')]
+        if os.path.exists(path) and os.path.getsize(path):
+            # The download finished in a later attempt, only its staging file was left behind
+            discard_partial_download(temp_path, output)
+            report.repaired.add(temp_path)
+            continue
+        url = url or known.get(path) or guess_mirror_url(path, base_url, base_folder)
+        if url is None:
+            logger.warning("No URL known for %s, cannot resume it", temp_path)
+            unresolved += 1
+            continue
+        output.note_file(temp_path)
+        assets.append((url, path))
+    
+    for url, path in pages:
+        stats.add_url(url)
+        stats.update_status(f"Refetching page: {url}")
+        refresh_display(live, stats)
+        crawl_page(url, base_url, base_folder, rate_limiter, stats, live, output, link_graph)
+    if assets:
+        stats.update_status(f"Refetching {len(assets)} files")
+        refresh_display(live, stats)
+        saved = download_resources(assets, rate_limiter, stats, live, output)
+        if link_graph:
+            for url, path in assets:
+                link_graph.record_status(url, 200 if saved.get(path) else FETCH_FAILED)
+    
+    for path in list(report.missing) + report.empty:
+        if os.path.exists(path) and os.path.getsize(path):
+            report.repaired.add(path)
+    for temp_path, _ in report.leftovers:
+        path = temp_path[:-len('.tmp')]
+        if not os.path.exists(temp_path) and os.path.exists(path):
+            report.repaired.add(temp_path)
+    return unresolved
+
+def verify_website(base_url, base_folder, repair=False, workers=None, report_path=None, link_graph_path=None,
+                   min_delay=1.0, max_delay=3.0, debug=False, headless=False, log_format='text'):
+    """
+    Check a mirror saved by clone_website() into base_folder (--verify,
+    --verify-only): every relative reference in its HTML and CSS files is
+    resolved against the filesystem in a process pool of `workers`, and
+    zero-byte files and unfinished .tmp downloads are listed (see
+    mirror_check.py). With repair=True just those files are refetched.
+    Problems are written to report_path as JSON lines when given.
+    Returns the WebsiteStats for the run.
+    """
+    global logger
+    logger = setup_logging(debug=debug, log_format=log_format)
+    install_dns_cache(dns_cache)
+    logger.info("Checking mirror in %s", base_folder)
+    
+    stats = WebsiteStats()
+    base_folder = os.path.normpath(base_folder)
+    proper_base_folder = os.path.normpath(get_base_folder_from_url(base_url, base_folder))
+    if not os.path.isdir(base_folder):
+        logger.error("Nothing to check, %s is not a directory", base_folder)
+        stats.failure = f"Nothing to check, {base_folder} is not a directory"
+        return stats
+    
+    started = time.time()
+    report = verify_mirror(base_folder, workers)
+    stats.mirror_report = report
+    logger.info("Checked %s references in %s HTML and CSS files (%s files) in %.1fs", report.references,
+                report.documents, report.files, time.time() - started)
+    
+    if repair and report.problems:
+        rate_limiter = RateLimiter(min_delay=min_delay, max_delay=max_delay, debug=debug)
+        output = create_output('dir', base_folder)
+        link_graph = None
+        if link_graph_path and os.path.exists(link_graph_path):
+            try:
+                link_graph = LinkGraph(link_graph_path)
+            except sqlite3.Error as e:
+                logger.error("Failed to open link graph %s: %s", link_graph_path, e)
+        if not headless:
+            from rich.live import Live
+        live_display = NullLive() if headless else Live(get_stats_panel(stats), console=get_console(),
+                                                        refresh_per_second=10)
+        with live_display as live:
+            try:
+                stats.mirror_unresolved = repair_mirror(report, base_url, proper_base_folder, rate_limiter, stats,
+                                                        live, output, link_graph)
+            except Exception as e:
+                stats.failure = f"Unexpected error: {e}"
+                logger.error("Unexpected error: %s", e)
+            finally:
+                output.close()
+                if link_graph:
+                    link_graph.close()
+    
+    if report_path and (report.problems or os.path.exists(report_path)):
+        try:
+            report.write(report_path)
+            stats.mirror_report_path = report_path
+        except OSError as e:
+            logger.error("Failed to write mirror report %s: %s", report_path, e)
+    
+    if not headless:
+        get_console().print(get_completion_panel(stats))
+    logger.info("Mirror check completed: %s missing targets, %s empty files, %s unfinished downloads%s",
+                len(report.missing), len(report.empty), len(report.leftovers),
+                f", {len(report.repaired)} repaired" if repair else "")
+    unrepaired = sorted(target for target in report.missing if target not in report.repaired)
+    for target in unrepaired[:20]:
+        count, document = report.missing[target]
+        logger.info("Missing %s (%s references, first in %s)", target, count, document)
+    return stats
+
+def load_batch_jobs(jobs_file):
+    """
+    Read a batch file of "URL [OUTPUT_FOLDER]" lines.
+    Blank lines and lines starting with # are ignored. When no output folder
+    is given, one is derived from the URL's host name.
+    """
+    jobs = []
+    with open(jobs_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split(None, 1)
+            url = parts[0]
+            if len(parts) > 1:
+                output_folder = parts[1].strip()
+            else:
+                output_folder = os.path.join('cloned_websites', urlparse(url).netloc.replace(':', '_') or 'site')
+            jobs.append((url, output_folder))
+    return jobs
+
+def clone_batch(jobs, max_sites=4, max_connections=32, per_host=6, manifest_path='batch_manifest.jsonl',
+                min_delay=1.0, max_delay=3.0, debug=False, output_format='dir', log_format='text', http2=False,
+                link_graph=True):
+    """
+    Clone many websites concurrently in one process.
+    All jobs share the session's connection pools and the request scheduler,
+    so max_connections and per_host apply across the whole batch.
+    A JSON line with the outcome of each site is appended to manifest_path.
+    With link_graph, each site's link graph is written to <output>.links.sqlite.
+    Batch runs are headless and report progress through the logger only.
+    """
+    setup_logging(debug=debug, log_format=log_format)
+    install_dns_cache(dns_cache)
+    configure_connection_pool(max_connections, http2)
+    scheduler.configure(max_concurrent=max_connections, per_host=per_host, adaptive=concurrency_settings['adaptive'])
+    
+    manifest_lock = threading.Lock()
+    results = []
+    
+    def run_job(url, output_folder):
+        started = time.time()
+        try:
+            stats = clone_website(url, output_folder, min_delay, max_delay, debug, headless=True,
+                                  output_format=output_format, log_format=log_format,
+                                  link_graph_path=f"{output_folder}.links.sqlite" if link_graph else None,
+                                  retry_report_path=f"{output_folder}.failed.jsonl")
+            failure = stats.failure
+        except Exception as e:
+            stats = None
+            failure = f"Unexpected error: {e}"
+        return {
+            'url': url,
+            'output': output_folder,
+            'status': 'failed' if failure else 'ok',
+            'error': failure,
+            'pages_processed': stats.pages_processed if stats else 0,
+            'resources_downloaded': stats.resources_downloaded if stats else 0,
+            'errors': stats.errors if stats else 0,
+            'skipped': stats.skipped if stats else 0,
+            'bytes_downloaded': stats.downloaded_size if stats else 0,
+            'duplicate_pages': stats.duplicates_exact + stats.duplicates_near if stats else 0,
+            'trap_urls_skipped': stats.trap_urls_skipped if stats else 0,
+            'unrecoverable_urls': len(stats.unrecoverable) if stats else 0,
+            'elapsed_seconds': round(time.time() - started, 2),
+        }
+    
+    logger.info("Batch clone: %s sites, %s at a time, %s connections (%s per host)",
+                len(jobs), max_sites, max_connections, per_host)
+    
+    with open(manifest_path, 'a', encoding='utf-8') as manifest:
+        with ThreadPoolExecutor(max_workers=max_sites) as executor:
+            futures = [executor.submit(run_job, url, output_folder) for url, output_folder in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                with manifest_lock:
+                    manifest.write(json.dumps(result) + '\n')
+                    manifest.flush()
+                logger.info("%s %s (%s pages, %s resources, %ss)", result['status'].upper(), result['url'],
+                            result['pages_processed'], result['resources_downloaded'], result['elapsed_seconds'])
+    
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    logger.info("Batch complete: %s succeeded, %s failed. Manifest: %s", len(results) - failed, failed, manifest_path)
+    return results
 
 def parse_arguments():
     """
     Parse command line arguments.
     """
     parser = argparse.ArgumentParser(description="Clone a website by downloading all its resources.")
-    parser.add_argument("url", help="The URL of the website to clone")
+    parser.add_argument("url", nargs="?", help="The URL of the website to clone")
     parser.add_argument("-o", "--output", dest="output_folder", default="cloned_website", 
                         help="The folder where the cloned website will be saved")
     parser.add_argument("--min-delay", type=float, default=1.0,
@@ -1189,27 +3392,219 @@ def parse_arguments():
     parser.add_argument("--max-delay", type=float, default=3.0,
                         help="Maximum delay between requests in seconds (default: 3.0)")
     parser.add_argument("--debug", action="store_true", help="Enable debug output")
-    
-    return parser.parse_args()
+    parser.add_argument("--headless", action="store_true",
+                        help="Run without the live display; progress goes to the log only and rich is never imported")
+    parser.add_argument("--log-format", choices=["text", "json"], default="text",
+                        help="Write the log file as plain text or JSON lines (default: text)")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default="dir",
+                        help="Write loose files (dir) or a single zip, tar.zst or warc archive (default: dir)")
+    parser.add_argument("--images", choices=["largest", "smallest", "all"], default="largest",
+                        help="Which srcset candidates of responsive images to download (default: largest)")
+    parser.add_argument("--max-image-width", type=int, default=None,
+                        help="With --images largest, pick the widest srcset candidate up to this many pixels")
+    parser.add_argument("--http2", action="store_true",
+                        help="Fetch https:// URLs over HTTP/2, multiplexing requests per host (needs httpx[http2])")
+    parser.add_argument("--no-dns-cache", action="store_true",
+                        help="Resolve host names through the system resolver on every new connection")
+    parser.add_argument("--chunk-size", type=int, default=8192,
+                        help="Read size in bytes for streamed downloads (default: 8192)")
+    parser.add_argument("--write-buffer", type=float, default=32,
+                        help="MB of downloaded data queued for the disk before fetchers are held back (default: 32)")
+    parser.add_argument("--write-size", type=int, default=1024,
+                        help="KB collected per file before each disk write (default: 1024)")
+    parser.add_argument("--fsync", choices=FSYNC_POLICIES, default="never",
+                        help="Sync downloads to disk: never (leave it to the OS), per file, or in batches (default: never)")
+    parser.add_argument("--segments", type=int, default=4,
+                        help="Parallel byte-range connections for large files, 1 disables (default: 4)")
+    parser.add_argument("--segment-threshold", type=float, default=32,
+                        help="File size in MB above which segmented downloading is used (default: 32)")
+    parser.add_argument("--stream-html-threshold", type=float, default=16,
+                        help="Page size in MB above which HTML is rewritten while streaming instead of parsed whole (default: 16)")
+    parser.add_argument("--dedup", choices=["exact", "near", "off"], default="exact",
+                        help="Store duplicate pages as references and skip their links: exact copies only, near duplicates too, or off (default: exact)")
+    parser.add_argument("--simhash-distance", type=int, default=3,
+                        help="Maximum differing SimHash bits for two pages to count as near duplicates (default: 3)")
+    parser.add_argument("--pattern-budget", type=int, default=500,
+                        help="Distinct URLs fetched per URL template that looks like a trap (its pages keep linking to the next "
+                             "page of the same template, or are mostly duplicates) before it is throttled, 0 for no limit (default: 500)")
+    parser.add_argument("--max-path-depth", type=int, default=32,
+                        help="Skip URLs with more path segments than this (default: 32)")
+    parser.add_argument("--link-graph", metavar="PATH",
+                        help="SQLite file that receives the crawl's link graph (default: OUTPUT_FOLDER.links.sqlite)")
+    parser.add_argument("--no-link-graph", action="store_true",
+                        help="Do not write a link graph")
+    parser.add_argument("--size-sample", type=int, default=8,
+                        help="Assets per page sized with a HEAD request before downloading, for progress and ETA (default: 8)")
+    parser.add_argument("--disk-reserve", type=float, default=256,
+                        help="Stop the crawl when the expected remaining download would leave less than this many MB free (default: 256)")
+    parser.add_argument("--no-disk-check", action="store_true",
+                        help="Do not stop the crawl when the disk looks too small for it")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Maximum concurrent requests per host; above 1 a page's assets are fetched in parallel "
+                             "with the limit adapted up to this (default: 1, one at a time)")
+    parser.add_argument("--no-adaptive", action="store_true",
+                        help="Keep the per-host concurrency fixed instead of adapting it to latency and 429/5xx responses")
+    parser.add_argument("--circuit-failures", type=int, default=5,
+                        help="Consecutive failures (network errors, timeouts, 429, 5xx) that stop requests to a host "
+                             "for a while, 0 to never stop (default: 5)")
+    parser.add_argument("--circuit-open", type=float, default=30,
+                        help="Seconds requests to a failing host stay stopped before a probe, doubling while probes "
+                             "fail (default: 30)")
+    parser.add_argument("--http-cache", metavar="DIR", default=default_cache_dir(),
+                        help="Directory of the HTTP cache shared by every run (default: %(default)s)")
+    parser.add_argument("--http-cache-size", type=float, default=1024,
+                        help="Size budget of the HTTP cache in MB, least recently used entries are evicted beyond it (default: 1024)")
+    parser.add_argument("--no-http-cache", action="store_true",
+                        help="Neither read nor fill the HTTP cache")
+    parser.add_argument("--retry", action="append", metavar="CLASS=ATTEMPTS[:DELAY]",
+                        help="Deferred retries for failures of one status class (429, 5xx, network or 4xx), "
+                             "e.g. 5xx=5:10; may be repeated (default: 429=5:30 5xx=3:5 network=3:5 4xx=0)")
+    parser.add_argument("--retry-report", metavar="PATH",
+                        help="JSON lines file listing the URLs that failed every retry (default: OUTPUT_FOLDER.failed.jsonl)")
+    parser.add_argument("--frontier-memory", type=float, default=64,
+                        help="MB of queued and seen URLs kept in memory, the rest goes to a temporary database (default: 64)")
+    parser.add_argument("--spill-dir", metavar="DIR",
+                        help="Directory of the temporary frontier database (default: the system temp directory)")
+    parser.add_argument("--map-only", action="store_true",
+                        help="Only map the site: crawl its pages, size assets with HEAD requests and write a URL inventory, "
+                             "downloading and saving nothing")
+    parser.add_argument("--inventory", metavar="PATH",
+                        help="JSON lines URL inventory written by --map-only (default: OUTPUT_FOLDER.urls.jsonl)")
+    parser.add_argument("--seeds", metavar="FILE",
+                        help="Also start the crawl from the pages of a --map-only inventory, or a file of URLs one per line")
+    parser.add_argument("--verify", action="store_true",
+                        help="After cloning, check that every local reference in the saved HTML and CSS files resolves "
+                             "and that no file is empty or an unfinished download")
+    parser.add_argument("--verify-only", action="store_true",
+                        help="Check an existing mirror in OUTPUT_FOLDER as --verify does, without crawling")
+    parser.add_argument("--repair", action="store_true",
+                        help="Refetch the missing, empty and unfinished files the mirror check finds")
+    parser.add_argument("--verify-workers", type=int, default=None,
+                        help="Processes checking the mirror in parallel (default: one per CPU)")
+    parser.add_argument("--verify-report", metavar="PATH",
+                        help="JSON lines file listing the problems the mirror check finds (default: OUTPUT_FOLDER.verify.jsonl)")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="Clone every site listed in FILE (one \"URL [OUTPUT_FOLDER]\" per line)")
+    parser.add_argument("--parallel-sites", type=int, default=4,
+                        help="Number of sites cloned concurrently in batch mode (default: 4)")
+    parser.add_argument("--max-connections", type=int, default=32,
+                        help="Maximum concurrent requests across the whole batch (default: 32)")
+    parser.add_argument("--per-host", type=int, default=6,
+                        help="Maximum concurrent requests to a single host in batch mode (default: 6)")
+    parser.add_argument("--manifest", default="batch_manifest.jsonl",
+                        help="File that receives one JSON result line per site in batch mode")
+    
+    args = parser.parse_args()
+    try:
+        parse_retry_policy(args.retry)
+    except ValueError as e:
+        parser.error(str(e))
+    args.seed_urls = None
+    if args.seeds:
+        try:
+            args.seed_urls = load_seed_urls(args.seeds)
+        except (OSError, ValueError, KeyError) as e:
+            parser.error(f"Cannot read --seeds file {args.seeds}: {e}")
+    return args
 
 if __name__ == "__main__":
+    log_settings['console'] = True
     # Parse command line arguments if provided, otherwise use defaults
+    batch_file = None
     try:
         args = parse_arguments()
+        batch_file = args.batch
+        dns_cache.enabled = not args.no_dns_cache
+        http2 = args.http2
+        image_settings['policy'] = args.images
+        image_settings['max_width'] = args.max_image_width
+        download_settings['chunk_size'] = args.chunk_size
+        download_settings['segments'] = args.segments
+        disk_settings['buffer'] = int(args.write_buffer * 1024 * 1024)
+        disk_settings['write_size'] = args.write_size * 1024
+        disk_settings['fsync'] = args.fsync
+        download_settings['segment_threshold'] = int(args.segment_threshold * 1024 * 1024)
+        html_settings['stream_threshold'] = int(args.stream_html_threshold * 1024 * 1024)
+        dedup_settings['mode'] = args.dedup
+        dedup_settings['max_distance'] = args.simhash_distance
+        trap_settings['budget'] = args.pattern_budget
+        trap_settings['max_depth'] = args.max_path_depth
+        size_settings['head_sample'] = args.size_sample
+        size_settings['disk_reserve'] = int(args.disk_reserve * 1024 * 1024)
+        size_settings['disk_check'] = not args.no_disk_check
+        concurrency_settings['max'] = args.concurrency
+        concurrency_settings['adaptive'] = not args.no_adaptive
+        circuit_settings['failures'] = args.circuit_failures
+        circuit_settings['open_seconds'] = args.circuit_open
+        cache_settings['enabled'] = not args.no_http_cache
+        frontier_settings['memory'] = int(args.frontier_memory * 1024 * 1024)
+        frontier_settings['spill_dir'] = args.spill_dir
+        cache_settings['path'] = args.http_cache
+        cache_settings['max_bytes'] = int(args.http_cache_size * 1024 * 1024)
+        retry_settings['policy'] = parse_retry_policy(args.retry)
+        if not args.url and not batch_file:
+            raise ValueError("No URL provided")
         target_url = args.url
         folder_name = args.output_folder
         min_delay = args.min_delay
         max_delay = args.max_delay
         debug = args.debug
-    except:
+        output_format = args.output_format
+        log_format = args.log_format
+        headless = args.headless
+        link_graph = not args.no_link_graph
+        link_graph_path = (args.link_graph or f"{folder_name}.links.sqlite") if link_graph else None
+        retry_report_path = args.retry_report or f"{folder_name}.failed.jsonl"
+        map_only = args.map_only
+        inventory_path = args.inventory or f"{folder_name}.urls.jsonl"
+        seeds = args.seed_urls
+        verify = args.verify or args.repair
+        verify_only = args.verify_only
+        repair = args.repair
+        verify_workers = args.verify_workers
+        verify_report_path = args.verify_report or f"{folder_name}.verify.jsonl"
+    except Exception:
         # Default values if no command line arguments are provided
         target_url = "https://html.hixstudio.net/heiko-prev/heiko/index.html"
         folder_name = "cloned_website"
         min_delay = 1.0
         max_delay = 3.0
         debug = False
-        console.print("[yellow]No command line arguments provided, using default values.[/yellow]")
-        console.print("[yellow]To customize, run: python website_cloner.py [URL] -o [OUTPUT_FOLDER] --min-delay [MIN] --max-delay [MAX][/yellow]")
-    
-    # Use the unified website cloner which automatically detects site type
-    clone_website(target_url, folder_name, min_delay, max_delay, debug)
+        output_format = 'dir'
+        log_format = 'text'
+        headless = False
+        http2 = False
+        link_graph = True
+        link_graph_path = f"{folder_name}.links.sqlite"
+        retry_report_path = f"{folder_name}.failed.jsonl"
+        map_only = False
+        seeds = None
+        verify = verify_only = repair = False
+        verify_workers = None
+        verify_report_path = f"{folder_name}.verify.jsonl"
+        get_console().print("[yellow]No command line arguments provided, using default values.[/yellow]")
+        get_console().print("[yellow]To customize, run: python website_cloner.py [URL] -o [OUTPUT_FOLDER] --min-delay [MIN] --max-delay [MAX][/yellow]")
+    
+    if batch_file:
+        # Clone every site from the batch file in this one process
+        clone_batch(load_batch_jobs(batch_file), args.parallel_sites, args.max_connections,
+                    args.per_host, args.manifest, min_delay, max_delay, debug, output_format, log_format, http2,
+                    link_graph)
+    else:
+        if http2:
+            configure_connection_pool(http2=True)
+        scheduler.configure(per_host=concurrency_settings['max'], adaptive=concurrency_settings['adaptive'])
+        if map_only:
+            map_website(target_url, inventory_path, min_delay, max_delay, debug, headless=headless,
+                        log_format=log_format, seeds=seeds)
+        elif not verify_only:
+            # Use the unified website cloner which automatically detects site type
+            clone_website(target_url, folder_name, min_delay, max_delay, debug, headless=headless,
+                          output_format=output_format, log_format=log_format, link_graph_path=link_graph_path,
+                          retry_report_path=retry_report_path, seeds=seeds)
+        if (verify or verify_only) and not map_only:
+            if output_format != 'dir' and not verify_only:
+                get_console().print("[yellow]The mirror check only reads --output-format dir, skipping it[/yellow]")
+            else:
+                verify_website(target_url, folder_name, repair, verify_workers, verify_report_path, link_graph_path,
+                               min_delay, max_delay, debug, headless=headless, log_format=log_format)